@@ -1,136 +1,112 @@
--- MySQL dump 10.13  Distrib 8.0.41, for Win64 (x86_64)
---
--- Host: localhost    Database: dbpy
--- ------------------------------------------------------
--- Server version	8.0.41
-
-/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;
-/*!40101 SET @OLD_CHARACTER_SET_RESULTS=@@CHARACTER_SET_RESULTS */;
-/*!40101 SET @OLD_COLLATION_CONNECTION=@@COLLATION_CONNECTION */;
-/*!50503 SET NAMES utf8mb4 */;
-/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;
-/*!40103 SET TIME_ZONE='+00:00' */;
-/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;
-/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
-/*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;
-/*!40111 SET @OLD_SQL_NOTES=@@SQL_NOTES, SQL_NOTES=0 */;
-
---
--- Table structure for table `stock_notes`
---
-
-DROP TABLE IF EXISTS `stock_notes`;
-/*!40101 SET @saved_cs_client     = @@character_set_client */;
-/*!50503 SET character_set_client = utf8mb4 */;
-CREATE TABLE `stock_notes` (
-  `user_id` int NOT NULL,
-  `stock_ticker` varchar(10) NOT NULL,
-  `note` text,
-  PRIMARY KEY (`user_id`,`stock_ticker`),
-  CONSTRAINT `stock_notes_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `user` (`user_id`) ON DELETE CASCADE
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
-/*!40101 SET character_set_client = @saved_cs_client */;
-
---
--- Dumping data for table `stock_notes`
---
-
-LOCK TABLES `stock_notes` WRITE;
-/*!40000 ALTER TABLE `stock_notes` DISABLE KEYS */;
-/*!40000 ALTER TABLE `stock_notes` ENABLE KEYS */;
-UNLOCK TABLES;
-
---
--- Table structure for table `transaction`
---
-
-DROP TABLE IF EXISTS `transaction`;
-/*!40101 SET @saved_cs_client     = @@character_set_client */;
-/*!50503 SET character_set_client = utf8mb4 */;
-CREATE TABLE `transaction` (
-  `transaction_id` int NOT NULL AUTO_INCREMENT,
-  `user_id` int NOT NULL,
-  `stock_ticker` varchar(10) NOT NULL,
-  `action` enum('buy','sell') NOT NULL,
-  `quantity` int NOT NULL,
-  `price` decimal(10,2) NOT NULL,
-  `total_price` decimal(15,2) GENERATED ALWAYS AS ((`quantity` * `price`)) STORED,
-  `timestamp` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
-  PRIMARY KEY (`transaction_id`),
-  KEY `user_id` (`user_id`),
-  CONSTRAINT `transaction_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `user` (`user_id`) ON DELETE CASCADE,
-  CONSTRAINT `transaction_chk_1` CHECK ((`quantity` > 0)),
-  CONSTRAINT `transaction_chk_2` CHECK ((`price` > 0))
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
-/*!40101 SET character_set_client = @saved_cs_client */;
-
---
--- Dumping data for table `transaction`
---
-
-LOCK TABLES `transaction` WRITE;
-/*!40000 ALTER TABLE `transaction` DISABLE KEYS */;
-/*!40000 ALTER TABLE `transaction` ENABLE KEYS */;
-UNLOCK TABLES;
-
---
--- Table structure for table `user`
---
-
-DROP TABLE IF EXISTS `user`;
-/*!40101 SET @saved_cs_client     = @@character_set_client */;
-/*!50503 SET character_set_client = utf8mb4 */;
-CREATE TABLE `user` (
-  `user_id` int NOT NULL AUTO_INCREMENT,
-  `username` varchar(50) NOT NULL,
-  `password` varchar(255) NOT NULL,
-  `total_assets` decimal(15,2) NOT NULL DEFAULT '100000.00',
-  `profit_loss` decimal(15,2) NOT NULL DEFAULT '0.00',
-  PRIMARY KEY (`user_id`),
-  UNIQUE KEY `username` (`username`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
-/*!40101 SET character_set_client = @saved_cs_client */;
-
---
--- Dumping data for table `user`
---
-
-LOCK TABLES `user` WRITE;
-/*!40000 ALTER TABLE `user` DISABLE KEYS */;
-/*!40000 ALTER TABLE `user` ENABLE KEYS */;
-UNLOCK TABLES;
-
---
--- Table structure for table `watchlist`
---
-
-DROP TABLE IF EXISTS `watchlist`;
-/*!40101 SET @saved_cs_client     = @@character_set_client */;
-/*!50503 SET character_set_client = utf8mb4 */;
-CREATE TABLE `watchlist` (
-  `user_id` int NOT NULL,
-  `stock_ticker` varchar(10) NOT NULL,
-  PRIMARY KEY (`user_id`,`stock_ticker`),
-  CONSTRAINT `watchlist_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `user` (`user_id`) ON DELETE CASCADE
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
-/*!40101 SET character_set_client = @saved_cs_client */;
-
---
--- Dumping data for table `watchlist`
---
-
-LOCK TABLES `watchlist` WRITE;
-/*!40000 ALTER TABLE `watchlist` DISABLE KEYS */;
-/*!40000 ALTER TABLE `watchlist` ENABLE KEYS */;
-UNLOCK TABLES;
-/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
-
-/*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
-/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;
-/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;
-/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
-/*!40101 SET CHARACTER_SET_RESULTS=@OLD_CHARACTER_SET_RESULTS */;
-/*!40101 SET COLLATION_CONNECTION=@OLD_COLLATION_CONNECTION */;
-/*!40111 SET SQL_NOTES=@OLD_SQL_NOTES */;
-
--- Dump completed on 2025-04-20 14:15:22
+-- SQLite schema of portfolio.db (schema version 6)
+--
+-- Reference only: the database is created and upgraded by stock/migrations.py
+-- when the app starts. Regenerate this file after adding a migration.
+
+PRAGMA journal_mode = WAL;
+
+CREATE TABLE schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE user (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    total_assets REAL DEFAULT 0,
+    profit_loss REAL DEFAULT 0
+);
+
+CREATE TABLE stock_transactions (
+    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    stock_ticker TEXT NOT NULL,
+    action TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    transaction_date TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user(user_id)
+);
+
+CREATE TABLE stock_notes (
+    user_id INTEGER NOT NULL,
+    stock_ticker TEXT NOT NULL,
+    note TEXT,
+    PRIMARY KEY (user_id, stock_ticker),
+    FOREIGN KEY (user_id) REFERENCES user (user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE watchlist (
+    watchlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    stock_ticker TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(user_id),
+    UNIQUE(user_id, stock_ticker)
+);
+
+CREATE TABLE favorites (
+    favorite_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    stock_ticker TEXT NOT NULL,
+    added_date TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user(user_id),
+    UNIQUE(user_id, stock_ticker)
+);
+
+CREATE TABLE holdings (
+    user_id INTEGER NOT NULL,
+    stock_ticker TEXT NOT NULL,
+    shares INTEGER NOT NULL DEFAULT 0,
+    cost_basis REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, stock_ticker),
+    FOREIGN KEY (user_id) REFERENCES user(user_id)
+);
+
+CREATE INDEX idx_transactions_user_ticker_date ON stock_transactions (user_id, stock_ticker, transaction_date);
+
+CREATE INDEX idx_transactions_user_date ON stock_transactions (user_id, transaction_date, transaction_id);
+
+CREATE INDEX idx_favorites_user_date ON favorites (user_id, added_date);
+
+CREATE TABLE lots (
+    lot_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    stock_ticker TEXT NOT NULL,
+    transaction_id INTEGER NOT NULL,
+    acquired_date TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    remaining INTEGER NOT NULL,
+    price REAL NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(user_id),
+    FOREIGN KEY (transaction_id) REFERENCES stock_transactions(transaction_id)
+);
+
+CREATE INDEX idx_lots_open ON lots (user_id, stock_ticker, lot_id) WHERE remaining > 0;
+
+CREATE TABLE realized_gains (
+    gain_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    stock_ticker TEXT NOT NULL,
+    transaction_id INTEGER NOT NULL,
+    sale_date TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    proceeds REAL NOT NULL,
+    cost REAL NOT NULL,
+    pnl REAL NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(user_id),
+    FOREIGN KEY (transaction_id) REFERENCES stock_transactions(transaction_id)
+);
+
+CREATE INDEX idx_realized_gains_user_date ON realized_gains (user_id, sale_date);
+
+CREATE TABLE portfolio_daily (
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    cash REAL NOT NULL,
+    market_value REAL NOT NULL,
+    nav REAL NOT NULL,
+    PRIMARY KEY (user_id, date),
+    FOREIGN KEY (user_id) REFERENCES user(user_id)
+) WITHOUT ROWID;
@@ -22,6 +22,7 @@ from PyQt6.QtGui import QFont, QCursor, QPixmap
 from PyQt6.QtCore import Qt, QTimer
 
 from stock.ui.portfolio_window import PortfolioWindow  
+from stock.session import session
 from stock.ui.news_page import NewsWindow
 
 themes = {
@@ -472,11 +473,14 @@ class StockAdvisorApp(QMainWindow):
     def launch_stock_dashboard(self):
         try:
             script_path = os.path.join(os.path.dirname(__file__), 'stock', 'run_stock_dashboard.py')
-            subprocess.Popen([sys.executable, script_path])
+            # The dashboard process trades for the same user
+            subprocess.Popen([sys.executable, script_path], env=session.child_environment())
         except Exception as e:
             print(f"Error launching stock dashboard: {e}")
 
 if __name__ == "__main__":
+    from stock.db_manager import init
+    init()
     app = QApplication(sys.argv)
     window = StockAdvisorApp()
     window.showMaximized()
@@ -0,0 +1,242 @@
+"""
+Vectorized backtester for the predict_stock scoring rules
+
+Scores, signals, positions and P&L are computed as whole-matrix operations
+(dates x symbols) over cached bars, so there is no per-bar Python loop.
+"""
+import time
+import numpy as np
+import pandas as pd
+from stock.stockapi import load_ohlcv_matrices, DEFAULT_UNIVERSE, PERIOD_OFFSETS
+from stock.stock_prediction import SCORING_PARAMS, score_matrix, components_from_indicators
+from stock.scoring_rules import load_profile
+from stock.feature_store import load_feature_matrix, FEATURE_PARAMS
+
+TRADING_DAYS = 252
+
+def generate_signals(scores, entry_threshold=None, exit_threshold=None, allow_short=False):
+    """Turn a score matrix into target positions (+1 long, -1 short, 0 flat)
+
+    A long is opened when the score reaches entry_threshold (the "Buy" cutoff
+    by default) and held until the score falls to exit_threshold (the "Sell"
+    cutoff). With allow_short the exit signal opens a short instead, which is
+    covered by the next entry signal.
+    """
+    if entry_threshold is None:
+        entry_threshold = SCORING_PARAMS['buy_cutoff']
+    if exit_threshold is None:
+        exit_threshold = -SCORING_PARAMS['buy_cutoff']
+
+    values = scores.to_numpy(dtype=float)
+    target = np.full(values.shape, np.nan)
+    target[values <= exit_threshold] = -1.0 if allow_short else 0.0
+    target[values >= entry_threshold] = 1.0
+
+    positions = pd.DataFrame(target, index=scores.index, columns=scores.columns).ffill().fillna(0.0)
+    return positions.where(scores.notna(), 0.0)
+
+def simulate(close, positions, cost_bps=10.0, slippage_bps=5.0):
+    """Apply positions to close-to-close returns with costs and slippage
+
+    Positions decided on a bar's close are held from the next bar, so there
+    is no look-ahead. Every unit of turnover pays cost_bps + slippage_bps.
+    Returns (strategy returns per symbol, positions actually held).
+    """
+    asset_returns = close.pct_change(fill_method=None).fillna(0.0)
+    held = positions.shift(1).fillna(0.0)
+    turnover = held.diff().abs()
+    turnover.iloc[0] = held.iloc[0].abs()
+
+    friction = (cost_bps + slippage_bps) / 10000.0
+    strategy_returns = held * asset_returns - turnover * friction
+    return strategy_returns.where(close.notna(), 0.0), held
+
+def equal_weight_returns(strategy_returns, close):
+    """Portfolio returns with capital split equally across the symbols trading each day"""
+    active = close.notna().sum(axis=1).replace(0, np.nan)
+    return (strategy_returns.sum(axis=1) / active).fillna(0.0)
+
+def warmup_bars(params):
+    """Bars of history the slowest indicator needs before its first value"""
+    return max(params['bb_window'], params['rsi_window'], params['ma_fast'],
+               params['ma_slow'], params['volume_window']) + 1
+
+def performance_metrics(returns, periods_per_year=TRADING_DAYS):
+    """CAGR, annualized Sharpe and max drawdown for each column of returns"""
+    values = np.asarray(returns, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    values = np.nan_to_num(values)
+
+    equity = np.cumprod(1.0 + values, axis=0)
+    years = max(len(values) / periods_per_year, 1e-9)
+    final = np.clip(equity[-1], 0.0, None) if len(values) else np.ones(values.shape[1])
+    cagr = final ** (1.0 / years) - 1.0
+
+    std = values.std(axis=0, ddof=1) if len(values) > 1 else np.zeros(values.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, values.mean(axis=0) / std * np.sqrt(periods_per_year), 0.0)
+
+    peaks = np.maximum.accumulate(equity, axis=0)
+    max_drawdown = (equity / peaks - 1.0).min(axis=0) if len(values) else np.zeros(values.shape[1])
+
+    return {
+        'cagr': cagr,
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+    }
+
+def trade_statistics(strategy_returns, held):
+    """Per-symbol trade count and hit rate (share of trades with positive P&L)
+
+    Trades are identified vectorized: a new trade starts whenever the held
+    position changes to a non-zero value, and the exit bar (whose cost is
+    charged when the position goes flat) is attributed to the closing trade.
+    """
+    positions = held.to_numpy(dtype=float)
+    log_returns = np.log1p(strategy_returns.to_numpy(dtype=float))
+    rows, cols = positions.shape
+
+    previous = np.vstack([np.zeros((1, cols)), positions[:-1]])
+    new_trade = (positions != 0) & (positions != previous)
+    in_trade = (positions != 0) | (previous != 0)
+
+    trade_ids = np.cumsum(new_trade, axis=0) + np.arange(cols) * (rows + 1)
+    ids = trade_ids[in_trade]
+    if ids.size == 0:
+        zeros = np.zeros(cols)
+        return {'trades': zeros.astype(int), 'hit_rate': zeros, 'total_trades': 0, 'total_hit_rate': 0.0}
+
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    trade_pnl = np.bincount(inverse, weights=log_returns[in_trade])
+    trade_symbol = unique_ids // (rows + 1)
+
+    trades = np.bincount(trade_symbol, minlength=cols)
+    wins = np.bincount(trade_symbol, weights=(trade_pnl > 0).astype(float), minlength=cols)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit_rate = np.where(trades > 0, wins / trades, 0.0)
+
+    return {
+        'trades': trades,
+        'hit_rate': hit_rate,
+        'total_trades': int(trades.sum()),
+        'total_hit_rate': float(wins.sum() / trades.sum()) if trades.sum() else 0.0,
+    }
+
+def feature_scores(symbols, period=None, params=None):
+    """Default-rule scores straight from the feature store (no recomputation)
+
+    Covers the last `period` of bars (a CACHED_PERIODS name; None for all
+    stored history). Symbols without stored features are scored from their
+    cached bars instead; symbols with neither are left out, as in
+    load_ohlcv_matrices. Returns (close, scores), or (None, None) when
+    there is nothing to score.
+    """
+    columns = {name: load_feature_matrix(symbols, name)
+               for name in ('close', 'bb_upper', 'bb_lower', 'rsi', 'sma_50', 'sma_200', 'volume_ratio')}
+    closes, scores = [], []
+    close = columns['close']
+    if not close.empty:
+        columns = {name: frame.reindex_like(close) for name, frame in columns.items()}
+        components = components_from_indicators(close, columns['bb_upper'], columns['bb_lower'], columns['rsi'],
+                                                columns['sma_50'], columns['sma_200'], columns['volume_ratio'], params)
+        closes.append(close)
+        scores.append(sum(components.values()).where(close.notna()))
+
+    missing = [symbol for symbol in symbols if symbol not in close.columns]
+    if missing:
+        matrices = load_ohlcv_matrices(missing, period)
+        if not matrices['Close'].empty:
+            closes.append(matrices['Close'])
+            scores.append(score_matrix(matrices['Close'], matrices['Volume'], params))
+    if not closes:
+        return None, None
+
+    close, scores = pd.concat(closes, axis=1).sort_index(), pd.concat(scores, axis=1).sort_index()
+    if period is not None:
+        keep = close.index > close.index[-1] - PERIOD_OFFSETS[period]
+        close, scores = close[keep], scores[keep]
+    return close, scores
+
+def _uses_stored_features(params, profile):
+    if profile is not None:
+        return False
+    p = dict(SCORING_PARAMS, **(params or {}))
+    return (p['ma_fast'], p['ma_slow']) == (50, 200) and all(p[name] == value for name, value in FEATURE_PARAMS.items())
+
+def run_backtest(symbols=None, period="5y", params=None, close=None, volume=None,
+                 entry_threshold=None, exit_threshold=None, allow_short=False,
+                 cost_bps=10.0, slippage_bps=5.0, scores=None, profile=None):
+    """Backtest the predict_stock rules over the cached history
+
+    close/volume matrices (dates x symbols) can be passed directly, otherwise
+    they are loaded from the stockapi cache without touching the network.
+    A scoring profile (see scoring_rules) replaces the built-in rules.
+    Capital is split equally across the symbols trading on each day.
+    """
+    matrices = None
+    if close is None and scores is None and _uses_stored_features(params, profile):
+        close, scores = feature_scores(symbols or DEFAULT_UNIVERSE, period, params)
+    if close is None:
+        matrices = load_ohlcv_matrices(symbols or DEFAULT_UNIVERSE, period)
+        close, volume = matrices['Close'], matrices['Volume']
+    if close.empty:
+        return None
+
+    if profile is not None:
+        profile = load_profile(profile)
+        p = dict(profile.params, **(params or {}))
+    else:
+        p = dict(SCORING_PARAMS, **(params or {}))
+    if entry_threshold is None:
+        entry_threshold = p['buy_cutoff']
+    if exit_threshold is None:
+        exit_threshold = -p['buy_cutoff']
+
+    if scores is None and profile is not None:
+        scores = profile.score(close, volume, bars=matrices)
+    elif scores is None:
+        scores = score_matrix(close, volume, p)
+    positions = generate_signals(scores, entry_threshold, exit_threshold, allow_short)
+    strategy_returns, held = simulate(close, positions, cost_bps, slippage_bps)
+
+    portfolio_returns = equal_weight_returns(strategy_returns, close)
+
+    symbol_metrics = performance_metrics(strategy_returns)
+    trade_stats = trade_statistics(strategy_returns, held)
+    per_symbol = pd.DataFrame({
+        'cagr': symbol_metrics['cagr'],
+        'sharpe': symbol_metrics['sharpe'],
+        'max_drawdown': symbol_metrics['max_drawdown'],
+        'trades': trade_stats['trades'],
+        'hit_rate': trade_stats['hit_rate'],
+    }, index=close.columns)
+
+    portfolio_metrics = performance_metrics(portfolio_returns)
+    metrics = {
+        'cagr': float(portfolio_metrics['cagr'][0]),
+        'sharpe': float(portfolio_metrics['sharpe'][0]),
+        'max_drawdown': float(portfolio_metrics['max_drawdown'][0]),
+        'hit_rate': trade_stats['total_hit_rate'],
+        'trades': trade_stats['total_trades'],
+        'exposure': float((held != 0).to_numpy().mean()),
+    }
+
+    return {
+        'metrics': metrics,
+        'per_symbol': per_symbol,
+        'returns': portfolio_returns,
+        'equity': (1.0 + portfolio_returns).cumprod(),
+        'positions': held,
+        'scores': scores,
+    }
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    result = run_backtest(DEFAULT_UNIVERSE, period="5y")
+    if result is None:
+        print("No cached bars found; open the stocks once in the dashboard to fill the cache")
+    else:
+        print(result['metrics'])
+        print(result['per_symbol'].sort_values('sharpe', ascending=False).head(10))
+        print(f"Backtest finished in {time.perf_counter() - start:.2f}s")
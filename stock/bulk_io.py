@@ -0,0 +1,277 @@
+"""
+Bulk import and export of the transaction ledger
+
+Importing a brokerage history row by row through record_transaction costs
+a commit and a lot update per trade. import_transactions instead streams
+the CSV, inserts the rows in large executemany batches inside a single
+transaction and rebuilds holdings, lots and realized P&L once at the end,
+so a failed import leaves nothing behind. Broker formats are told apart by
+their header (see BROKER_FORMATS).
+
+Exports stream the ledger or the holdings batch by batch to CSV, or to
+Parquet with pyarrow installed, so memory stays flat however long the
+history is. A ledger export imports back unchanged.
+"""
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from stock import db_manager
+from stock.db_manager import TRANSACTION_COLUMNS
+from stock.lots import rebuild as rebuild_lots
+from stock.session import current_user_id
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+BATCH_SIZE = 50000
+
+# Rough size of a CSV row, to tell from the file size whether an import is
+# large next to the ledger
+BYTES_PER_ROW = 64
+
+# Below this many rows the ledger indexes are simply updated as rows go in
+REINDEX_MIN_ROWS = 100000
+
+# Header names of each supported format, keyed by the ledger field they
+# fill; 'date' may list several columns (the first present one is used).
+# 'exchange', if present, maps to a Yahoo Finance suffix via EXCHANGE_SUFFIXES.
+BROKER_FORMATS = {
+    # Our own export (export_transactions)
+    'ledger': {
+        'user_id': 'user_id', 'ticker': 'stock_ticker', 'action': 'action',
+        'quantity': 'quantity', 'price': 'price', 'date': ('transaction_date',),
+    },
+    # Zerodha Console tradebook
+    'zerodha': {
+        'ticker': 'symbol', 'action': 'trade_type', 'quantity': 'quantity', 'price': 'price',
+        'date': ('order_execution_time', 'trade_date'), 'exchange': 'exchange',
+    },
+    # Contract note trade table (most Indian brokers)
+    'contract_note': {
+        'ticker': 'Security', 'action': 'Buy/Sell', 'quantity': 'Quantity', 'price': 'Rate',
+        'date': ('Trade Date', 'Date'), 'exchange': 'Exchange',
+    },
+}
+
+EXCHANGE_SUFFIXES = {'NSE': '.NS', 'BSE': '.BO'}
+
+ACTIONS = {'buy': 'buy', 'b': 'buy', 'sell': 'sell', 's': 'sell'}
+
+DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S',
+                '%d-%m-%Y', '%d/%m/%Y', '%d-%b-%Y', '%Y/%m/%d')
+
+HOLDINGS_COLUMNS = "user_id, stock_ticker, shares, cost_basis"
+
+INSERT_TRANSACTION = ("INSERT INTO stock_transactions (user_id, stock_ticker, action, quantity, price, transaction_date) "
+                      "VALUES (?, ?, ?, ?, ?, ?)")
+
+def detect_format(header):
+    """Name of the broker format whose required columns are all in header (or None)"""
+    present = set(header)
+    for name, columns in BROKER_FORMATS.items():
+        required = [columns[field] for field in ('ticker', 'action', 'quantity', 'price')]
+        if all(column in present for column in required) and any(column in present for column in columns['date']):
+            return name
+    return None
+
+@lru_cache(maxsize=4096)
+def normalize_date(value):
+    """A broker date as 'YYYY-MM-DD HH:MM:SS' (the ledger's format), or None"""
+    value = value.strip()
+    if len(value) >= 10 and value[4] == '-' and value[7] == '-':
+        # Already ISO; only the separator and a missing time need fixing
+        time_of_day = value[11:19] if len(value) >= 19 else value[11:16] + ":00" if len(value) >= 16 else "00:00:00"
+        return f"{value[:10]} {time_of_day}"
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    return None
+
+def _row_parser(header, broker, user_id):
+    columns = BROKER_FORMATS[broker]
+    position = {name: i for i, name in enumerate(header)}
+    ticker, action = position[columns['ticker']], position[columns['action']]
+    quantity, price = position[columns['quantity']], position[columns['price']]
+    date = next(position[name] for name in columns['date'] if name in position)
+    exchange = position.get(columns.get('exchange'))
+    user = position.get(columns.get('user_id')) if user_id is None else None
+    if user is None and user_id is None:
+        user_id = current_user_id()
+
+    def parse(row):
+        symbol = row[ticker].strip().upper()
+        if exchange is not None and '.' not in symbol:
+            symbol += EXCHANGE_SUFFIXES.get(row[exchange].strip().upper(), '')
+        transaction_date = normalize_date(row[date])
+        if transaction_date is None:
+            raise ValueError(f"Unrecognized date {row[date]!r}")
+        return (int(row[user]) if user is not None else user_id, symbol,
+                ACTIONS[row[action].strip().lower()], int(float(row[quantity])),
+                float(row[price].replace(',', '')), transaction_date)
+    return parse
+
+def _parsed_batches(path, broker, user_id, batch_size, stats):
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader, [])]
+        broker = broker or detect_format(header)
+        if broker is None:
+            raise ValueError(f"Unrecognized CSV header in {path}: {header}")
+        parse = _row_parser(header, broker, user_id)
+        batch = []
+        for line, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                batch.append(parse(row))
+            except (KeyError, ValueError, IndexError):
+                stats['skipped'] += 1
+                if stats['skipped'] <= 10:
+                    print(f"Skipping line {line} of {path}: {row}")
+                continue
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def _drop_ledger_indexes(connection):
+    """Drop the stock_transactions indexes; returns their SQL to recreate them"""
+    indexes = connection.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                                 "AND tbl_name = 'stock_transactions' AND sql IS NOT NULL").fetchall()
+    for name, _ in indexes:
+        connection.execute(f"DROP INDEX {name}")
+    return [sql for _, sql in indexes]
+
+def import_transactions(path, user_id=None, broker=None, batch_size=BATCH_SIZE, database=None):
+    """Append a broker CSV to the ledger and rebuild the affected users once
+
+    broker names a BROKER_FORMATS entry (detected from the header if None).
+    Rows go to user_id; with None, to the users named in a ledger export's
+    user_id column, or else the session's user. Balances are left alone:
+    the history is assumed to be paid for already. Returns the number of
+    imported rows; unparseable rows are skipped and reported.
+
+    Everything is one transaction, so on error the database is unchanged
+    and the error is raised. The transaction holds the single writer
+    thread for the whole import (seconds for a million rows): trades and
+    other writes from the app wait until it commits, so run large imports
+    while nobody is trading. Reads are not blocked.
+    """
+    from stock.portfolio_history import clear_history
+
+    database = database or db_manager.db
+    stats = {'rows': 0, 'skipped': 0}
+    first_dates = {}
+    estimated_rows = os.path.getsize(path) // BYTES_PER_ROW
+
+    with database.transaction():
+        # Sorting a large import into the indexes once at the end is much
+        # faster than updating them row by row
+        ledger_rows = database.execute_query("SELECT MAX(transaction_id) AS last FROM stock_transactions",
+                                             fetch=True)[0]['last'] or 0
+        indexes = []
+        if estimated_rows >= max(REINDEX_MIN_ROWS, ledger_rows):
+            indexes = database.connections.write(_drop_ledger_indexes)
+
+        for batch in _parsed_batches(path, broker, user_id, batch_size, stats):
+            database.connections.write(lambda connection: connection.executemany(INSERT_TRANSACTION, batch))
+            stats['rows'] += len(batch)
+            for row in batch:
+                if row[0] not in first_dates or row[5] < first_dates[row[0]]:
+                    first_dates[row[0]] = row[5]
+        for sql in indexes:
+            database.execute_query(sql)
+        # One replay of the ledger for the whole file (of everyone's, when
+        # it holds several users)
+        rebuilt_user = next(iter(first_dates)) if len(first_dates) == 1 else None
+        database.connections.write(lambda connection: rebuild_lots(connection, rebuilt_user, database.cost_method))
+        database.invalidate_user_cache(rebuilt_user)
+        for user, first_date in first_dates.items():
+            # Stored daily values from the first imported day on are stale
+            clear_history(user, first_date, database=database)
+
+    print(f"Imported {stats['rows']} transactions from {path}"
+          + (f" ({stats['skipped']} rows skipped)" if stats['skipped'] else ""))
+    return stats['rows']
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, batch_size)), [])
+
+def _export(query, params, columns, path, batch_size, database):
+    """Stream a query to CSV or Parquet (by extension); returns the row count"""
+    database = database or db_manager.db
+    columns = [name.strip() for name in columns.split(',')]
+    rows = database.iter_query(query, params, row_type="tuple", batch_size=batch_size)
+    count = 0
+    if path.endswith('.parquet'):
+        if pa is None:
+            raise ValueError("pyarrow is required to export Parquet files")
+        temp_path = path + ".tmp"
+        writer = None
+        try:
+            for batch in _batches(rows, batch_size):
+                table = pa.Table.from_arrays([pa.array(values) for values in zip(*batch)], names=columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(temp_path, table.schema)
+                writer.write_table(table)
+                count += len(batch)
+            if writer is None:
+                writer = pq.ParquetWriter(temp_path, pa.schema([(name, pa.null()) for name in columns]))
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(temp_path, path)
+        return count
+
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for batch in _batches(rows, batch_size):
+            writer.writerows(batch)
+            count += len(batch)
+    os.replace(temp_path, path)
+    return count
+
+def export_transactions(path, user_id=None, batch_size=BATCH_SIZE, database=None):
+    """Write the ledger (one user's, or everyone's) oldest first to .csv or .parquet"""
+    if user_id is None:
+        query, params = f"SELECT {TRANSACTION_COLUMNS} FROM stock_transactions ORDER BY transaction_date, transaction_id", ()
+    else:
+        query = (f"SELECT {TRANSACTION_COLUMNS} FROM stock_transactions WHERE user_id = ? "
+                 "ORDER BY transaction_date, transaction_id")
+        params = (user_id,)
+    return _export(query, params, TRANSACTION_COLUMNS, path, batch_size, database)
+
+def export_holdings(path, user_id=None, batch_size=BATCH_SIZE, database=None):
+    """Write current positions (one user's, or everyone's) to .csv or .parquet"""
+    where, params = ("WHERE user_id = ? AND shares != 0", (user_id,)) if user_id is not None else ("WHERE shares != 0", ())
+    query = f"SELECT {HOLDINGS_COLUMNS} FROM holdings {where} ORDER BY user_id, stock_ticker"
+    return _export(query, params, HOLDINGS_COLUMNS, path, batch_size, database)
+
+if __name__ == "__main__":
+    commands = ("import", "export-transactions", "export-holdings")
+    if len(sys.argv) < 3 or sys.argv[1] not in commands:
+        print("Usage: python -m stock.bulk_io import <file.csv> [user_id]\n"
+              "       python -m stock.bulk_io export-transactions|export-holdings <file.csv|file.parquet> [user_id]")
+        sys.exit(1)
+    command, path = sys.argv[1], sys.argv[2]
+    user_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    start = time.perf_counter()
+    if command == "import":
+        import_transactions(path, user_id)
+    else:
+        export = export_transactions if command == "export-transactions" else export_holdings
+        print(f"Exported {export(path, user_id)} rows to {path}")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,207 @@
+"""
+Confidence calibration of the predict_stock scores
+
+Every bar of the cached history is scored once (score_components over the
+whole dates x symbols matrix) and compared with the return over the
+following HORIZON bars. Hit rates and average forward returns are grouped by
+prediction bucket and by the combination of rules that fired, for all
+symbols and per volatility class, and written to a JSON lookup table.
+The indicators are those of the feature store, over the long history, so
+predict_stock looks up its rule combination only when it scored the stored
+feature row; otherwise it falls back to the prediction bucket.
+Rebuild it in batch (e.g. nightly with `python -m stock.calibration`);
+predict_stock only does dictionary lookups in the loaded table.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from stock.stockapi import CACHE_DIR, DEFAULT_UNIVERSE, load_ohlcv_matrices
+from stock.stock_prediction import SCORING_PARAMS, score_components, classify_scores
+
+CALIBRATION_PATH = os.path.join(CACHE_DIR, 'calibration.json')
+
+HORIZON = 5
+
+# A Hold is a hit when the price moves less than this over the horizon
+HOLD_BAND = 0.02
+
+# Groups with fewer samples fall back to a coarser group
+MIN_SAMPLES = 30
+
+COMPONENTS = ('bollinger', 'rsi', 'ma_cross', 'volume')
+
+# Volatility classes by tercile of annualized volatility across the universe
+VOLATILITY_CLASSES = ('low_volatility', 'medium_volatility', 'high_volatility')
+
+_table = None
+_table_mtime = None
+_table_lock = threading.Lock()
+
+def combination_key(signals):
+    """Rule combination as a string such as 'bollinger+ ma_cross-'
+
+    signals maps a component name to its contribution (or sign); rules that
+    did not fire are left out, and 'none' means no rule fired.
+    """
+    parts = [f"{name}{'+' if signals[name] > 0 else '-'}" for name in COMPONENTS if signals.get(name)]
+    return " ".join(parts) or "none"
+
+def _combination_codes(components):
+    """Integer code per bar encoding the sign of every component (base 3)"""
+    codes = np.zeros(components[COMPONENTS[0]].shape, dtype=np.int64)
+    for i, name in enumerate(COMPONENTS):
+        codes += (np.sign(np.nan_to_num(components[name].to_numpy(dtype=float))).astype(np.int64) + 1) * 3 ** i
+    return codes
+
+def _code_key(code):
+    signals = {}
+    for name in COMPONENTS:
+        code, digit = divmod(code, 3)
+        signals[name] = digit - 1
+    return combination_key(signals)
+
+def volatility_classes(close):
+    """Volatility class per symbol from annualized volatility terciles"""
+    volatility = close.pct_change(fill_method=None).std() * np.sqrt(252)
+    volatility = volatility.dropna()
+    if volatility.empty:
+        return {}
+    edges = np.nanpercentile(volatility, [100 / 3, 200 / 3])
+    bins = np.searchsorted(edges, volatility.to_numpy(), side='right')
+    return {symbol: VOLATILITY_CLASSES[b] for symbol, b in zip(volatility.index, bins)}
+
+def _summarize(samples, key):
+    return samples.groupby(['class', key], sort=False).agg(
+        hit_rate=('hit', 'mean'), avg_return=('forward', 'mean'), samples=('hit', 'size'))
+
+def _nest(stats):
+    """{class: {key: {hit_rate, avg_return, samples}}} from a (class, key) index"""
+    table = {}
+    for (cls, key), row in stats.iterrows():
+        table.setdefault(cls, {})[key] = {
+            'hit_rate': round(float(row['hit_rate']), 4),
+            'avg_return': round(float(row['avg_return']), 5),
+            'samples': int(row['samples']),
+        }
+    return table
+
+def build_table(symbols=None, period=None, params=None, horizon=HORIZON, matrices=None):
+    """Calibration table from the cached history (see module docstring)
+
+    Uses each symbol's longest cached history unless a period is given.
+    Returns the table as a dict, or None without cached bars.
+    """
+    p = dict(SCORING_PARAMS, **(params or {}))
+    if matrices is None:
+        matrices = load_ohlcv_matrices(symbols or DEFAULT_UNIVERSE, period)
+    close = matrices['Close']
+    if close.empty:
+        return None
+    volume = matrices['Volume'].reindex_like(close) if not matrices['Volume'].empty else None
+
+    components = score_components(close, volume, p)
+    score = sum(components.values()).where(close.notna())
+    labels = classify_scores(score, p)
+    codes = _combination_codes(components)
+    forward = (close.shift(-horizon) / close - 1).to_numpy()
+
+    classes = volatility_classes(close)
+    symbol_classes = np.array([classes.get(symbol, "unknown") for symbol in close.columns], dtype=object)
+
+    valid = ~np.isnan(score.to_numpy()) & ~np.isnan(forward)
+    rows, cols = np.nonzero(valid)
+    label = labels[rows, cols]
+    change = forward[rows, cols]
+    hit = np.select([np.isin(label, ["Strong Buy", "Buy"]), np.isin(label, ["Strong Sell", "Sell"])],
+                    [change > 0, change < 0], default=np.abs(change) < HOLD_BAND)
+
+    samples = pd.DataFrame({
+        'class': symbol_classes[cols],
+        'label': label,
+        'code': codes[rows, cols],
+        'hit': hit.astype(float),
+        'forward': change,
+    })
+    everything = samples.assign(**{'class': 'all'})
+
+    buckets = pd.concat([_summarize(frame, 'label') for frame in (everything, samples)])
+    combinations = pd.concat([_summarize(frame, 'code') for frame in (everything, samples)])
+    combinations.index = pd.MultiIndex.from_tuples([(cls, _code_key(code)) for cls, code in combinations.index])
+
+    return {
+        'built': datetime.now().isoformat(timespec='seconds'),
+        'horizon': horizon,
+        'params': p,
+        'symbols': len(close.columns),
+        'start': str(close.index[0])[:10],
+        'end': str(close.index[-1])[:10],
+        'classes': classes,
+        'buckets': _nest(buckets),
+        'combinations': _nest(combinations),
+    }
+
+def save_table(table, path=CALIBRATION_PATH):
+    """Write the table atomically so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(table, f)
+    os.replace(temp_path, path)
+
+def load_table(path=CALIBRATION_PATH):
+    """The saved table, read once and again only after it is rebuilt (or None)"""
+    global _table, _table_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _table_lock:
+        if _table is None or mtime != _table_mtime:
+            try:
+                with open(path, 'r') as f:
+                    _table = json.load(f)
+                _table_mtime = mtime
+            except (OSError, ValueError) as e:
+                print(f"Error loading calibration table: {e}")
+                return None
+        return _table
+
+def confidence(symbol, prediction, signals=None):
+    """Historical hit rate and average return for a prediction (or None)
+
+    Looks up the rule combination (signals as for combination_key) within
+    the symbol's volatility class first, then the prediction bucket, then
+    the same across all symbols; the first group with at least MIN_SAMPLES
+    samples is used.
+    """
+    table = load_table()
+    if table is None:
+        return None
+
+    cls = table['classes'].get(symbol)
+    combination = combination_key(signals) if signals is not None else None
+    candidates = []
+    for group in ([cls, 'all'] if cls else ['all']):
+        if combination is not None:
+            candidates.append(('combination', group, table['combinations'].get(group, {}).get(combination)))
+        candidates.append(('bucket', group, table['buckets'].get(group, {}).get(prediction)))
+
+    for basis, group, stats in candidates:
+        if stats and stats['samples'] >= MIN_SAMPLES:
+            return dict(stats, basis=basis, group=group, horizon=table['horizon'])
+    return None
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    table = build_table(DEFAULT_UNIVERSE)
+    if table is None:
+        print("No cached bars found; open the stocks once in the dashboard to fill the cache")
+    else:
+        save_table(table)
+        for label, stats in table['buckets']['all'].items():
+            print(f"{label:<12} hit rate {stats['hit_rate']:.1%}  avg return {stats['avg_return']:+.2%}  ({stats['samples']} bars)")
+        print(f"Calibrated {table['symbols']} symbols in {time.perf_counter() - start:.1f}s -> {CALIBRATION_PATH}")
@@ -0,0 +1,192 @@
+"""
+Rolling correlation and covariance of daily returns
+
+Each (universe, window) pair keeps running sums of the returns and of their
+outer products over the last `window` days. When a new day is appended only
+that day and the one leaving the window are added and subtracted (O(n²)),
+instead of recomputing every pair over the whole window (O(n²·T)). Estimates
+are shrunk towards a scaled identity with the Ledoit-Wolf intensity, which
+keeps them well conditioned when there are many symbols and few days.
+"""
+import threading
+import numpy as np
+import pandas as pd
+from stock.stockapi import DEFAULT_UNIVERSE
+from stock.feature_store import ensure_features, load_feature_matrix
+
+DEFAULT_WINDOW = 252
+
+_states = {}  # (universe, window) -> RollingCovariance
+_states_lock = threading.Lock()
+
+class RollingCovariance:
+    """Running first and second moments of a fixed-length window of returns"""
+
+    def __init__(self, returns, window=DEFAULT_WINDOW):
+        """returns is a (dates x symbols) DataFrame; missing returns count as 0"""
+        self.window = window
+        self.symbols = list(returns.columns)
+        self.rebuild(returns)
+
+    def rebuild(self, returns):
+        recent = returns.iloc[-self.window:]
+        self.dates = recent.index
+        self.buffer = np.nan_to_num(recent.to_numpy(dtype=float))
+        self.sum = self.buffer.sum(axis=0)
+        self.cross = self.buffer.T @ self.buffer
+        self.updates = 0
+        self._estimates = {}
+
+    def matches(self, returns):
+        """Whether the held rows still equal those days of returns
+
+        A day first seen while some symbols had no bars yet holds 0 for
+        them; once their bars arrive the window has to be rebuilt.
+        """
+        held = np.nan_to_num(returns.reindex(self.dates).to_numpy(dtype=float))
+        return np.allclose(held, self.buffer, rtol=1e-9, atol=0.0)
+
+    def append(self, returns):
+        """Slide the window over new rows (dates after the last one held)"""
+        new_rows = np.nan_to_num(returns.to_numpy(dtype=float))
+        if len(new_rows) == 0:
+            return
+        combined = np.vstack([self.buffer, new_rows])
+        leaving = combined[:max(0, len(combined) - self.window)]
+
+        self.sum += new_rows.sum(axis=0) - leaving.sum(axis=0)
+        self.cross += new_rows.T @ new_rows - leaving.T @ leaving
+        self.buffer = combined[len(leaving):]
+        self.dates = self.dates.append(returns.index)[-len(self.buffer):]
+        self._estimates = {}
+
+        # Adding and subtracting accumulates rounding error; start afresh
+        # once every row of the window has been replaced
+        self.updates += len(new_rows)
+        if self.updates >= self.window:
+            self.rebuild(pd.DataFrame(self.buffer, index=self.dates, columns=self.symbols))
+
+    def covariance(self, shrink=True):
+        """Daily covariance matrix as an array (n x n)"""
+        key = ('covariance', shrink)
+        if key in self._estimates:
+            return self._estimates[key]
+
+        count = len(self.buffer)
+        mean = self.sum / count
+        sample = self.cross / count - np.outer(mean, mean)
+        if shrink:
+            intensity = self.shrinkage(sample, mean)
+            target = np.trace(sample) / len(mean)
+            sample = (1 - intensity) * sample + intensity * target * np.eye(len(mean))
+        self._estimates[key] = sample
+        return sample
+
+    def shrinkage(self, sample, mean):
+        """Ledoit-Wolf intensity for shrinking towards a scaled identity"""
+        if 'shrinkage' in self._estimates:
+            return self._estimates['shrinkage']
+
+        count, n = self.buffer.shape
+        target = np.trace(sample) / n
+        # Dispersion of the per-day outer products around the sample
+        # covariance, via the fourth moments of the centred rows (O(n·T))
+        squared_norms = ((self.buffer - mean) ** 2).sum(axis=1)
+        beta = (squared_norms ** 2).sum() / count - (sample ** 2).sum()
+        beta /= n * count
+        delta = ((sample - target * np.eye(n)) ** 2).sum() / n
+        intensity = 0.0 if delta <= 0 else float(min(max(beta, 0.0), delta) / delta)
+        self._estimates['shrinkage'] = intensity
+        return intensity
+
+    def correlation(self, shrink=True):
+        """Correlation matrix as an array (n x n)"""
+        key = ('correlation', shrink)
+        if key not in self._estimates:
+            cov = self.covariance(shrink)
+            std = np.sqrt(np.diag(cov))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = cov / np.outer(std, std)
+            corr[~np.isfinite(corr)] = 0.0
+            np.fill_diagonal(corr, 1.0)
+            self._estimates[key] = corr
+        return self._estimates[key]
+
+def load_returns(symbols):
+    """Aligned daily returns (dates x symbols) from the feature store"""
+    for symbol in symbols:
+        ensure_features(symbol)
+    returns = load_feature_matrix(symbols, 'return_1d')
+    return returns.reindex(columns=[s for s in symbols if s in returns.columns])
+
+def rolling_state(symbols=None, window=DEFAULT_WINDOW, returns=None):
+    """Shared rolling state for a universe, brought up to date with the returns"""
+    symbols = tuple(symbols or DEFAULT_UNIVERSE)
+    if returns is None:
+        returns = load_returns(symbols)
+    if returns.empty:
+        return None
+
+    key = (symbols, window)
+    with _states_lock:
+        state = _states.get(key)
+        if (state is not None and state.symbols == list(returns.columns) and state.dates[-1] in returns.index
+                and state.matches(returns)):
+            state.append(returns[returns.index > state.dates[-1]])
+        else:
+            state = RollingCovariance(returns, window)
+            _states[key] = state
+        return state
+
+def covariance_matrix(symbols=None, window=DEFAULT_WINDOW, shrink=True, annualize=False):
+    """Covariance of daily returns over the last `window` days (DataFrame)"""
+    state = rolling_state(symbols, window)
+    if state is None:
+        return pd.DataFrame(dtype=float)
+    cov = state.covariance(shrink) * (252 if annualize else 1)
+    return pd.DataFrame(cov, index=state.symbols, columns=state.symbols)
+
+def correlation_matrix(symbols=None, window=DEFAULT_WINDOW, shrink=True):
+    """Correlation of daily returns over the last `window` days (DataFrame)"""
+    state = rolling_state(symbols, window)
+    if state is None:
+        return pd.DataFrame(dtype=float)
+    corr = state.correlation(shrink)
+    return pd.DataFrame(corr, index=state.symbols, columns=state.symbols)
+
+def diversification(weights, window=DEFAULT_WINDOW, shrink=True):
+    """Risk summary for a portfolio given {symbol: weight}
+
+    Returns annualized volatility, average pairwise correlation and the
+    diversification ratio (weighted average volatility / portfolio
+    volatility; 1 means no diversification benefit), or None.
+    """
+    symbols = [symbol for symbol, weight in weights.items() if weight and weight > 0]
+    state = rolling_state(symbols, window) if symbols else None
+    if state is None:
+        return None
+
+    w = np.array([weights[symbol] for symbol in state.symbols], dtype=float)
+    w = w / w.sum()
+    cov = state.covariance(shrink) * 252
+    corr = state.correlation(shrink)
+    vols = np.sqrt(np.diag(cov))
+    portfolio_vol = float(np.sqrt(w @ cov @ w))
+
+    n = len(w)
+    off_diagonal = corr[~np.eye(n, dtype=bool)]
+    return {
+        'symbols': state.symbols,
+        'volatility': portfolio_vol,
+        'average_correlation': float(off_diagonal.mean()) if n > 1 else 1.0,
+        'diversification_ratio': float(w @ vols / portfolio_vol) if portfolio_vol > 0 else 1.0,
+        'correlation': pd.DataFrame(corr, index=state.symbols, columns=state.symbols),
+    }
+
+def clear_correlation_cache():
+    """Drop all cached rolling states"""
+    with _states_lock:
+        _states.clear()
+
+if __name__ == "__main__":
+    print(correlation_matrix(DEFAULT_UNIVERSE).round(2))
@@ -0,0 +1,117 @@
+"""
+Check that the portfolio views stay responsive with many users in one file
+
+Builds (or reuses) a database with N users and M transactions, then times
+the calls a window makes when it opens for a random user: balance and
+holdings (cold, then from the per-user cache), a page of history, realized
+P&L and a trade. The same reads are then timed again while another thread
+keeps recording trades, as when several dashboard processes share the file.
+
+    python -m stock.db_benchmark [db_file] [users] [transactions]
+"""
+import os
+import sys
+import threading
+import time
+import numpy as np
+from stock.db_manager import DatabaseManager
+from stock.lots import rebuild as rebuild_lots
+
+DB_FILE = "benchmark.db"
+USERS = 10000
+TRANSACTIONS = 2000000
+TICKERS = 500
+SAMPLES = 2000
+BATCH_SIZE = 100000
+
+def build(database, users=USERS, transactions=TRANSACTIONS, seed=0):
+    """Fill an empty database with random users and trades, oldest first"""
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:03d}.NS" for i in range(TICKERS)]
+    start = np.datetime64('2016-01-01T09:15:00')
+    seconds = np.sort(rng.integers(0, 10 * 365 * 86400, transactions))
+
+    with database.transaction():
+        database.connections.write(lambda connection: connection.executemany(
+            "INSERT INTO user (user_id, username, password, total_assets) VALUES (?, ?, ?, ?)",
+            ((user, f"user{user}", "password", 100000.0) for user in range(1, users + 1))))
+        for first in range(0, transactions, BATCH_SIZE):
+            count = min(BATCH_SIZE, transactions - first)
+            dates = (start + seconds[first:first + count].astype('timedelta64[s]')).astype(str)
+            rows = list(zip(rng.integers(1, users + 1, count).tolist(),
+                            [tickers[i] for i in rng.integers(0, TICKERS, count)],
+                            np.where(rng.random(count) < 0.7, 'buy', 'sell').tolist(),
+                            rng.integers(1, 100, count).tolist(),
+                            np.round(rng.uniform(10, 1000, count), 2).tolist(),
+                            np.char.replace(dates, 'T', ' ').tolist()))
+            database.connections.write(lambda connection: connection.executemany(
+                "INSERT INTO stock_transactions (user_id, stock_ticker, action, quantity, price, transaction_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows))
+        database.connections.write(lambda connection: rebuild_lots(connection, None, database.cost_method))
+
+def _timed(timings, name, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+def open_window(database, user_id, timings):
+    """The calls a portfolio window makes for one user"""
+    _timed(timings, "balance (cold)", database.get_user_balance, user_id)
+    _timed(timings, "holdings (cold)", database.get_user_holdings, user_id)
+    _timed(timings, "balance (cached)", database.get_user_balance, user_id)
+    _timed(timings, "holdings (cached)", database.get_user_holdings, user_id)
+    _timed(timings, "realized P&L", database.get_realized_pnl, user_id)
+    _timed(timings, "history page", database.get_transactions_page, user_id, 50)
+
+def report(title, timings):
+    print(title)
+    for name, values in timings.items():
+        p50, p99 = np.percentile(values, [50, 99])
+        print(f"  {name:<20} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+def run(db_file=DB_FILE, users=USERS, transactions=TRANSACTIONS, samples=SAMPLES, seed=0):
+    database = DatabaseManager(db_file)
+    database.init()
+    rows = database.execute_query("SELECT COUNT(*) AS n FROM stock_transactions", fetch=True)[0]['n']
+    if not rows:
+        start = time.perf_counter()
+        build(database, users, transactions, seed)
+        print(f"Built {users} users and {transactions} transactions in {time.perf_counter() - start:.1f}s")
+    users = database.execute_query("SELECT MAX(user_id) AS n FROM user", fetch=True)[0]['n']
+    rng = np.random.default_rng(seed + 1)
+
+    database.invalidate_user_cache()
+    timings = {}
+    for user_id in rng.integers(1, users + 1, samples).tolist():
+        open_window(database, user_id, timings)
+        _timed(timings, "trade", database.record_transaction, user_id, "T000.NS", "buy", 1, 100.0)
+    report(f"{samples} random users:", timings)
+
+    # Reads while another thread keeps writing
+    stop = threading.Event()
+    writer_rng = np.random.default_rng(seed + 2)
+
+    def trade():
+        while not stop.is_set():
+            database.record_transaction(int(writer_rng.integers(1, users + 1)), "T001.NS", "buy", 1, 100.0)
+
+    database.invalidate_user_cache()
+    writer = threading.Thread(target=trade, daemon=True)
+    writer.start()
+    timings = {}
+    try:
+        for user_id in rng.integers(1, users + 1, samples).tolist():
+            open_window(database, user_id, timings)
+    finally:
+        stop.set()
+        writer.join()
+    report("Same reads during concurrent trades:", timings)
+    database.close()
+
+if __name__ == "__main__":
+    db_file = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else USERS
+    transactions = int(sys.argv[3]) if len(sys.argv) > 3 else TRANSACTIONS
+    if not os.path.exists(db_file):
+        print(f"Creating {db_file}...")
+    run(db_file, users, transactions)
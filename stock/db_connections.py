@@ -0,0 +1,278 @@
+"""
+Thread-safe SQLite access: a read connection per thread, one writer thread
+
+A sqlite3 connection must not be shared between threads, and SQLite allows
+only one writer at a time anyway. Every thread that reads gets its own
+connection, so reads run concurrently (with WAL they never wait for the
+writer). All writes run on a single writer thread that owns the only write
+connection and takes work from a queue, so writers never contend for the
+database lock; callers get a Future back, or wait on it for the result.
+
+A transaction() block on any thread becomes a session on the writer thread:
+the block's statements (reads included, so they see its own uncommitted
+writes) are forwarded there in order and committed once when it ends.
+
+A read connection lives as long as its thread: it is closed when the thread
+exits, so short-lived threads do not accumulate open connections.
+"""
+import queue
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+_STOP = object()
+_COMMIT = object()
+_ROLLBACK = object()
+
+def _run(func, future):
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(func())
+    except BaseException as e:
+        future.set_exception(e)
+
+class _Session:
+    """Statements of one caller's transaction, executed in order by the writer"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.started = Future()
+        self.depth = 1
+
+    def call(self, func):
+        future = Future()
+        self.queue.put((func, future))
+        return future.result()
+
+class _ThreadReader:
+    """A thread's read connection, dropped with the thread's locals when it exits"""
+
+    __slots__ = ('connection', 'generation', '__weakref__')
+
+    def __init__(self, connection, generation):
+        self.connection = connection
+        self.generation = generation
+
+class ConnectionManager:
+    """Per-thread read connections and a queue-fed writer thread for one database"""
+
+    def __init__(self, database, on_connect=None, uri=False):
+        self.database = database
+        self.uri = uri
+        self.on_connect = on_connect
+        self._local = threading.local()
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+        self._generation = 0
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._write_connection = None
+        self._writer_depth = 0
+
+    def _connect(self):
+        # Each connection is only used by one thread; check_same_thread is
+        # off so close() can close them all from the thread shutting down
+        connection = sqlite3.connect(self.database, uri=self.uri, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        if self.on_connect:
+            self.on_connect(connection)
+        return connection
+
+    def _reader(self):
+        reader = getattr(self._local, 'reader', None)
+        if reader is None or reader.generation != self._generation:
+            connection = self._connect()
+            with self._readers_lock:
+                self._readers.add(connection)
+            reader = _ThreadReader(connection, self._generation)
+            weakref.finalize(reader, self._release_reader, connection)
+            self._local.reader = reader
+        return reader.connection
+
+    def _release_reader(self, connection):
+        """Close a reader whose thread has exited (unless close() already did)"""
+        with self._readers_lock:
+            if connection not in self._readers:
+                return
+            self._readers.discard(connection)
+        connection.close()
+
+    def reader_count(self):
+        """Open read connections (one per live thread that has read)"""
+        with self._readers_lock:
+            return len(self._readers)
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                ready = Future()
+                self._writer = threading.Thread(target=self._run_writer, args=(ready,),
+                                                name="db-writer", daemon=True)
+                self._writer.start()
+                ready.result()
+
+    def _run_writer(self, ready):
+        try:
+            self._write_connection = self._connect()
+        except BaseException as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(True)
+
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            _run(*item)
+        self._write_connection.close()
+        self._write_connection = None
+
+    def _run_session(self, session):
+        """Writer side of a transaction(): run the caller's statements until it ends"""
+        connection = self._write_connection
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+        except BaseException as e:
+            session.started.set_exception(e)
+            return
+        session.started.set_result(True)
+
+        self._writer_depth = 1
+        try:
+            while True:
+                func, future = session.queue.get()
+                if func is _COMMIT:
+                    connection.commit()
+                    return
+                if func is _ROLLBACK:
+                    connection.rollback()
+                    return
+                _run(func, future)
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            self._writer_depth = 0
+
+    def _apply(self, func):
+        result = func(self._write_connection)
+        if not self._writer_depth:
+            self._write_connection.commit()
+        return result
+
+    def is_writer_thread(self):
+        return self._writer is not None and threading.current_thread() is self._writer
+
+    def in_transaction(self):
+        """Whether the calling thread is inside a transaction() block"""
+        if self.is_writer_thread():
+            return self._writer_depth > 0
+        return getattr(self._local, 'session', None) is not None
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the writer thread; returns a Future
+
+        Database calls made by func run directly on the write connection.
+        Do not wait on the Future inside a transaction() block: the writer
+        is busy with that block until it ends.
+        """
+        future = Future()
+        if self.is_writer_thread():
+            _run(lambda: func(*args, **kwargs), future)
+            return future
+        self._ensure_writer()
+        self._queue.put((lambda: func(*args, **kwargs), future))
+        return future
+
+    def write(self, func):
+        """Run func(connection) on the writer and return its result
+
+        Committed straight away, or with the enclosing transaction() block.
+        """
+        if self.is_writer_thread():
+            return self._apply(func)
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            return session.call(lambda: self._apply(func))
+        return self.submit(self._apply, func).result()
+
+    def read(self, func):
+        """Run func(connection) on this thread's read connection
+
+        Inside a transaction() the read goes to the writer instead, so it
+        sees the block's own uncommitted writes.
+        """
+        if self.is_writer_thread():
+            return func(self._write_connection)
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            return session.call(lambda: func(self._write_connection))
+        return func(self._reader())
+
+    @contextmanager
+    def transaction(self):
+        """Group every statement in the block into one commit on the writer
+
+        The write lock is taken up front (BEGIN IMMEDIATE), so values read
+        inside cannot change before the commit. Nested blocks join the
+        outermost one; an exception rolls everything back and is re-raised.
+        """
+        if self.is_writer_thread():
+            if self._writer_depth:
+                self._writer_depth += 1
+                try:
+                    yield
+                finally:
+                    self._writer_depth -= 1
+                return
+            self._write_connection.execute("BEGIN IMMEDIATE")
+            self._writer_depth = 1
+            try:
+                yield
+            except BaseException:
+                self._write_connection.rollback()
+                raise
+            else:
+                self._write_connection.commit()
+            finally:
+                self._writer_depth = 0
+            return
+
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            session.depth += 1
+            try:
+                yield
+            finally:
+                session.depth -= 1
+            return
+
+        session = _Session()
+        finished = self.submit(self._run_session, session)
+        session.started.result()
+        self._local.session = session
+        committed = False
+        try:
+            yield
+            committed = True
+        finally:
+            self._local.session = None
+            session.queue.put((_COMMIT if committed else _ROLLBACK, None))
+            finished.result()
+
+    def close(self):
+        """Stop the writer thread and close every connection"""
+        with self._writer_lock:
+            if self._writer is not None and self._writer.is_alive():
+                self._queue.put(_STOP)
+                self._writer.join()
+            self._writer = None
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers = set()
+            self._generation += 1
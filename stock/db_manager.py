@@ -1,205 +1,388 @@
 import os
 import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
+from stock.migrations import migrate, apply_pragmas
+from stock.db_connections import ConnectionManager
+from stock.lots import COST_METHOD, apply_trade, rebuild as rebuild_lots
+from stock.session import current_user_id
 
 try:
     load_dotenv()
 except ImportError:
     print("Warning: python-dotenv not found, using default values")
 
+TRANSACTION_COLUMNS = "transaction_id, user_id, stock_ticker, action, quantity, price, transaction_date"
+
+@lru_cache(maxsize=None)
+def _row_class(columns):
+    return namedtuple('Row', columns)
+
+DEFAULT_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'portfolio.db')
+
+# Private in-memory database with the real schema, for tests and benchmarks
+MEMORY = ":memory:"
+
+def _memory_pragmas(connection):
+    connection.execute("PRAGMA temp_store = MEMORY")
+
+class UserCache:
+    """Per-user results (balance, holdings, ...) kept until that user's data changes
+
+    Bounded to the max_users most recently used users. Every invalidation
+    bumps the user's generation, and a value loaded while it changed is not
+    stored, so a read racing a commit can never leave a stale entry. None
+    (a failed query) is never stored.
+    """
+
+    def __init__(self, max_users=1024):
+        self.max_users = max_users
+        self._entries = OrderedDict()   # user_id -> {kind: value}
+        self._generations = {}
+        self._epoch = 0                 # bumped when everyone is invalidated
+        self._lock = threading.Lock()
+
+    def get(self, user_id, kind, load):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and kind in entry:
+                self._entries.move_to_end(user_id)
+                return entry[kind]
+            generation = (self._epoch, self._generations.get(user_id, 0))
+        value = load()
+        if value is None:
+            return None
+        with self._lock:
+            if (self._epoch, self._generations.get(user_id, 0)) == generation:
+                self._entries.setdefault(user_id, {})[kind] = value
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, user_id=None):
+        """Drop one user's entries (everyone's for None)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                self._entries.pop(user_id, None)
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
 
 class DatabaseManager:
-    def __init__(self, fallback_mode=False):
-        self.connection = None
-        self.fallback_mode = fallback_mode
-        self.simulated_holdings = {}
-        self.db_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'portfolio.db')
+    """Portfolio database, opened and migrated on first use (or by init())
+
+    cost_method ("fifo" or "average", see stock.lots) decides the cost of
+    each sale; rebuild_holdings after changing it for an existing ledger.
+    Methods taking user_id=None act for the session's user (stock.session).
+    """
+
+    def __init__(self, db_file=None, cost_method=COST_METHOD):
+        self.db_file = db_file or DEFAULT_DB_FILE
+        self.cost_method = cost_method
         self.db_path = self.db_file
+        self._connections = None
+        self._init_lock = threading.Lock()
+        self.user_cache = UserCache()
+        # Users changed by the calling thread's open transaction
+        self._changed_users = threading.local()
+
+    @property
+    def connections(self):
+        if self._connections is None:
+            self.init()
+        return self._connections
+
+    def init(self, db_file=None):
+        """Connect and bring the schema up to date; later calls are no-ops
+
+        Entry points call this at startup so errors surface early; otherwise
+        the first query does it. db_file switches databases before the first
+        use, e.g. db.init(MEMORY) for a throwaway in-memory database.
+        """
+        with self._init_lock:
+            if self._connections is not None:
+                return self
+            if db_file is not None:
+                self.db_file = self.db_path = db_file
+            self.connect()
+            self.create_database_schema()
+        return self
 
     def connect(self):
-        if self.fallback_mode:
-            print("Using fallback mode without database connection")
-            return True
-
         try:
-            self.connection = sqlite3.connect(self.db_file)
-            self.connection.row_factory = sqlite3.Row
+            if self.db_file == MEMORY:
+                # Every thread's connection must reach the same in-memory
+                # database: a named memdb file (SQLite 3.36+), which locks
+                # like a file database, so readers never see uncommitted rows.
+                # Without WAL a reader waits for a commit instead of reading
+                # the last committed state.
+                database = f"file:/portfolio_{id(self)}?vfs=memdb"
+                self._connections = ConnectionManager(database, on_connect=_memory_pragmas, uri=True)
+            else:
+                # Reads use a connection per thread, writes go through one writer thread
+                self._connections = ConnectionManager(self.db_file, on_connect=apply_pragmas)
+            self._connections.read(lambda connection: connection.execute("SELECT 1"))
             print(f"Connected to SQLite database at {self.db_file}")
             return True
         except Exception as e:
             print(f"Error connecting to database: {e}")
-            self.fallback_mode = True
-            return False
+            self._connections = None
+            raise
 
     def create_database_schema(self):
-        if self.fallback_mode:
-            return True
-
-        cursor = self.connection.cursor()
+        """Bring the database up to the latest schema version (see migrations)"""
         try:
-            # Create user table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS user (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                total_assets REAL DEFAULT 0,
-                profit_loss REAL DEFAULT 0
-            )''')
-
-            # Create stock_transactions table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS stock_transactions (
-                transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                stock_ticker TEXT NOT NULL,
-                action TEXT NOT NULL,
-                quantity INTEGER NOT NULL,
-                price REAL NOT NULL,
-                transaction_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES user(user_id)
-            )''')
-            cursor.execute( '''CREATE TABLE IF NOT EXISTS stock_notes (
-                user_id INTEGER NOT NULL,
-                stock_ticker TEXT NOT NULL,
-                note TEXT,
-                PRIMARY KEY (user_id, stock_ticker),
-                FOREIGN KEY (user_id) REFERENCES user (user_id) ON DELETE CASCADE
-                 )''')
-
-            # Create watchlist table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS watchlist (
-                watchlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                stock_ticker TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES user(user_id),
-                UNIQUE(user_id, stock_ticker)
-            )''')
-            
-            # Create favorites table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS favorites (
-                favorite_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                stock_ticker TEXT NOT NULL,
-                added_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES user(user_id),
-                UNIQUE(user_id, stock_ticker)
-            )''')
-
-            self.connection.commit()
-            print("SQLite database schema created successfully")
+            version = self._connections.write(migrate)
+            print(f"SQLite database schema at version {version}")
             return True
         except Exception as e:
             print(f"Error creating SQLite database schema: {e}")
             return False
 
-    def close(self):
-        if not self.fallback_mode and self.connection:
-            self.connection.close()
-            print("Database connection closed")
+    @contextmanager
+    def transaction(self):
+        """Unit of work: every statement inside is committed once, or not at all
 
-    def execute_query(self, query, params=None, fetch=False):
-        if self.fallback_mode:
-            return self._simulate_query_result(query, params, fetch)
+        with db.transaction():
+            balance = db.get_user_balance(user_id)
+            db.record_transaction(user_id, ticker, "buy", quantity, price)
+            db.update_user_balance(user_id, balance - quantity * price)
 
+        Safe to use from any thread; see ConnectionManager.transaction.
+        """
+        outermost = not self.connections.in_transaction()
         try:
-            cursor = self.connection.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            with self.connections.transaction():
+                yield self
+        finally:
+            if outermost:
+                # Readers may have cached the old values until the commit
+                for user_id in getattr(self._changed_users, 'users', ()):
+                    self.user_cache.invalidate(user_id)
+                self._changed_users.users = set()
+
+    def invalidate_user_cache(self, user_id=None):
+        """Forget cached values of a user (everyone for None) after changing their data"""
+        self.user_cache.invalidate(user_id)
+        if self._connections is not None and self._connections.in_transaction():
+            if not hasattr(self._changed_users, 'users'):
+                self._changed_users.users = set()
+            self._changed_users.users.add(user_id)
+
+    def _cached(self, user_id, kind, load):
+        # Inside a transaction reads must see its uncommitted writes, and
+        # must not be cached in case it rolls back
+        if self.connections.in_transaction():
+            return load()
+        return self.user_cache.get(user_id, kind, load)
+
+    def submit(self, method, *args, **kwargs):
+        """Run a database call on the writer thread without waiting; returns a Future
+
+        e.g. db.submit(db.record_transaction, user_id, ticker, "buy", 5, price)
+        Use future.add_done_callback (or a Qt signal emitted from it) to act
+        on the result.
+        """
+        return self.connections.submit(method, *args, **kwargs)
 
-            self.connection.commit()
+    def close(self):
+        if self._connections:
+            self._connections.close()
+            self._connections = None
+            print("Database connection closed")
 
+    def execute_query(self, query, params=None, fetch=False):
+        try:
             if fetch:
-                return [dict(row) for row in cursor.fetchall()]
+                return self.connections.read(
+                    lambda connection: [dict(row) for row in connection.execute(query, params or ())])
+            # Committed at once, or when the enclosing transaction() ends
+            self.connections.write(lambda connection: connection.execute(query, params or ()))
             return True
         except Exception as e:
+            if self._connections is not None and self._connections.in_transaction():
+                raise
             print(f"Error executing query: {e}")
             print(f"Query: {query}")
             print(f"Params: {params}")
             return None
 
-    def _simulate_query_result(self, query, params=None, fetch=False):
-        if not fetch:
-            return None
+    def iter_query(self, query, params=None, row_type="namedtuple", batch_size=1000):
+        """Stream the rows of a SELECT instead of building a list of dicts
 
-        if "SELECT * FROM user WHERE username" in query:
-            return [{'user_id': 1, 'username': 'demo_user', 'password': 'password123',
-                     'total_assets': 100000.00, 'profit_loss': 0.00}]
-        elif "SELECT total_assets FROM user" in query:
-            return [{'total_assets': 100000.00}]
-        elif "SELECT * FROM stock_transactions" in query:
-            return []
-        elif "SELECT stock_ticker, SUM" in query:
-            return [{'stock_ticker': ticker, 'shares': shares}
-                    for ticker, shares in self.simulated_holdings.items()]
-        elif "SELECT stock_ticker FROM watchlist" in query:
-            return []
+        Rows are fetched batch_size at a time, so memory stays constant
+        however many rows match. row_type is "namedtuple" (attribute access),
+        "tuple" (cheapest) or "dict". Consume the iterator on the thread
+        that created it.
+        """
+        def open_cursor(connection):
+            cursor = connection.cursor()
+            cursor.row_factory = None
+            cursor.execute(query, params or ())
+            return cursor
+
+        if self.connections.in_transaction():
+            # The block's connection belongs to the writer thread; fetch there
+            description, rows = self.connections.read(
+                lambda connection: (lambda cursor: (cursor.description, cursor.fetchall()))(open_cursor(connection)))
+            batches = iter([rows])
         else:
-            return []
-
-    def get_user_balance(self, user_id=1):
-        if self.fallback_mode:
-            return 100000.00  # Default balance in fallback mode
+            cursor = self.connections.read(open_cursor)
+            description = cursor.description
+            batches = iter(lambda: cursor.fetchmany(batch_size), [])
+
+        columns = tuple(column[0] for column in description)
+        if row_type == "tuple":
+            convert = None
+        elif row_type == "dict":
+            convert = lambda row: dict(zip(columns, row))
+        else:
+            convert = _row_class(columns)._make
+        for batch in batches:
+            if convert is None:
+                yield from batch
+            else:
+                yield from map(convert, batch)
 
+    def get_user_balance(self, user_id=None):
+        user_id = current_user_id() if user_id is None else user_id
         query = "SELECT total_assets FROM user WHERE user_id = ?"
-        result = self.execute_query(query, (user_id,), fetch=True)
 
-        if result and len(result) > 0:
-            return result[0]['total_assets']
-        return 0.0
+        def load():
+            result = self.execute_query(query, (user_id,), fetch=True)
+            if result is None:
+                return None
+            return result[0]['total_assets'] if result else 0.0
+        balance = self._cached(user_id, 'balance', load)
+        return balance if balance is not None else 0.0
 
     def update_user_balance(self, user_id, new_balance):
-        if self.fallback_mode:
-            print(f"Simulated balance update: {new_balance}")
-            return True
-
         query = "UPDATE user SET total_assets = ? WHERE user_id = ?"
-        return self.execute_query(query, (new_balance, user_id))
+        result = self.execute_query(query, (new_balance, user_id))
+        self.invalidate_user_cache(user_id)
+        return result
 
     def record_transaction(self, user_id, stock_ticker, action, quantity, price):
-        if self.fallback_mode:
-            if action == 'buy':
-                if stock_ticker in self.simulated_holdings:
-                    self.simulated_holdings[stock_ticker] += quantity
-                else:
-                    self.simulated_holdings[stock_ticker] = quantity
-            else:
-                if stock_ticker in self.simulated_holdings:
-                    self.simulated_holdings[stock_ticker] -= quantity
-                    if self.simulated_holdings[stock_ticker] <= 0:
-                        del self.simulated_holdings[stock_ticker]
+        query = "INSERT INTO stock_transactions (user_id, stock_ticker, action, quantity, price, transaction_date) VALUES (?, ?, ?, ?, ?, ?)"
+        transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        params = (user_id, stock_ticker, action, quantity, price, transaction_date)
+
+        def apply(connection):
+            transaction_id = connection.execute(query, params).lastrowid
+            apply_trade(connection, user_id, stock_ticker, action, quantity, price,
+                        transaction_id, transaction_date, self.cost_method)
 
-            print(f"Simulated transaction: {action} {quantity} shares of {stock_ticker} at ₹{price}")
+        try:
+            # The ledger row, its lots, holdings and realized P&L are
+            # committed together
+            with self.transaction():
+                self.connections.write(apply)
+                self.invalidate_user_cache(user_id)
             return True
+        except Exception as e:
+            if self._connections is not None and self._connections.in_transaction():
+                raise
+            print(f"Error recording transaction: {e}")
+            return None
 
-        query = "INSERT INTO stock_transactions (user_id, stock_ticker, action, quantity, price, transaction_date) VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))"
-        params = (user_id, stock_ticker, action, quantity, price)
-        return self.execute_query(query, params)
+    def rebuild_holdings(self, user_id=None):
+        """Recompute holdings, lots and realized P&L from the full transaction log"""
+        try:
+            with self.transaction():
+                lots, sales = self.connections.write(
+                    lambda connection: rebuild_lots(connection, user_id, self.cost_method))
+                self.invalidate_user_cache(user_id)
+            print(f"Holdings rebuilt from transaction history ({lots} lots, {sales} sales)")
+            return True
+        except Exception as e:
+            print(f"Error rebuilding holdings: {e}")
+            return False
 
-    def get_user_transactions(self, user_id=1):
-        query = "SELECT * FROM stock_transactions WHERE user_id = ? ORDER BY transaction_date DESC"
+    def get_user_transactions(self, user_id=None):
+        user_id = current_user_id() if user_id is None else user_id
+        query = "SELECT * FROM stock_transactions WHERE user_id = ? ORDER BY transaction_date DESC, transaction_id DESC"
         return self.execute_query(query, (user_id,), fetch=True)
 
-    def get_user_holdings(self, user_id=1):
-        if self.fallback_mode:
-            return [{'stock_ticker': ticker, 'shares': shares}
-                    for ticker, shares in self.simulated_holdings.items()]
-
-        query = """
-        SELECT stock_ticker, 
-               SUM(CASE WHEN action = 'buy' THEN quantity ELSE -quantity END) as shares,
-               SUM(CASE WHEN action = 'buy' THEN quantity * price ELSE -quantity * price END) as cost_basis
-        FROM stock_transactions 
-        WHERE user_id = ? 
-        GROUP BY stock_ticker 
-        HAVING shares > 0
+    def iter_transactions(self, user_id=None, row_type="namedtuple", batch_size=1000):
+        """Stream the ledger (one user's, or everyone's) oldest first"""
+        if user_id is None:
+            query = f"SELECT {TRANSACTION_COLUMNS} FROM stock_transactions ORDER BY transaction_date, transaction_id"
+            params = ()
+        else:
+            query = (f"SELECT {TRANSACTION_COLUMNS} FROM stock_transactions WHERE user_id = ? "
+                     "ORDER BY transaction_date, transaction_id")
+            params = (user_id,)
+        return self.iter_query(query, params, row_type, batch_size)
+
+    def get_transactions_page(self, user_id=None, limit=50, before=None):
+        """One page of a user's history, newest first
+
+        Returns (rows, next_cursor). Pass next_cursor as `before` to get the
+        following page; it is None after the last page. The cursor is the
+        (transaction_date, transaction_id) of the last row, so each page is
+        a short range scan of the (user_id, transaction_date,
+        transaction_id) index however deep into the history it is, unlike
+        OFFSET, which has to skip every earlier row.
         """
-        return self.execute_query(query, (user_id,), fetch=True)
+        user_id = current_user_id() if user_id is None else user_id
+        if before is None:
+            condition, params = "user_id = ?", (user_id, limit)
+        else:
+            condition, params = "user_id = ? AND (transaction_date, transaction_id) < (?, ?)", (user_id, *before, limit)
+        query = (f"SELECT {TRANSACTION_COLUMNS} FROM stock_transactions WHERE {condition} "
+                 "ORDER BY transaction_date DESC, transaction_id DESC LIMIT ?")
+        rows = list(self.iter_query(query, params, batch_size=limit))
+        next_cursor = (rows[-1].transaction_date, rows[-1].transaction_id) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def get_user_holdings(self, user_id=None):
+        user_id = current_user_id() if user_id is None else user_id
+        # Fully sold positions keep their row (shares = 0) so the table
+        # always equals a rebuild from the transaction log
+        query = "SELECT stock_ticker, shares, cost_basis FROM holdings WHERE user_id = ? AND shares > 0"
+        holdings = self._cached(user_id, 'holdings',
+                                lambda: self.execute_query(query, (user_id,), fetch=True))
+        # Copies, so callers cannot change the cached rows
+        return [dict(row) for row in holdings] if holdings is not None else None
+
+    def get_open_lots(self, user_id=None, stock_ticker=None):
+        """Lots still (partly) held, oldest first"""
+        user_id = current_user_id() if user_id is None else user_id
+        query = ("SELECT lot_id, stock_ticker, acquired_date, quantity, remaining, price FROM lots "
+                 "WHERE user_id = ? AND remaining > 0")
+        params = (user_id,)
+        if stock_ticker is not None:
+            query += " AND stock_ticker = ?"
+            params += (stock_ticker,)
+        return self.execute_query(query + " ORDER BY stock_ticker, lot_id", params, fetch=True)
+
+    def get_realized_pnl(self, user_id=None):
+        """Total realized profit or loss of a user's sales"""
+        user_id = current_user_id() if user_id is None else user_id
+
+        def load():
+            result = self.execute_query("SELECT profit_loss FROM user WHERE user_id = ?", (user_id,), fetch=True)
+            if result is None:
+                return None
+            return (result[0]['profit_loss'] or 0.0) if result else 0.0
+        pnl = self._cached(user_id, 'realized_pnl', load)
+        return pnl if pnl is not None else 0.0
+
+    def get_realized_gains(self, user_id=None, limit=50):
+        """A user's most recent sales with their cost and realized P&L"""
+        user_id = current_user_id() if user_id is None else user_id
+        query = ("SELECT stock_ticker, sale_date, quantity, proceeds, cost, pnl FROM realized_gains "
+                 "WHERE user_id = ? ORDER BY sale_date DESC, gain_id DESC LIMIT ?")
+        return self.execute_query(query, (user_id, limit), fetch=True)
 
     def get_user_by_id(self, user_id):
-        if self.fallback_mode:
-            return {'user_id': 1, 'username': 'demo_user', 'total_assets': 100000.00}
-
         query = "SELECT * FROM user WHERE user_id = ?"
         result = self.execute_query(query, (user_id,), fetch=True)
 
@@ -222,6 +405,19 @@ class DatabaseManager:
         except Exception as e:
             print(f"Error registering user: {e}")
             return False
+
+    def create_user(self, username, initial_balance=100000.0, password="", user_id=None):
+        """Create a user with a starting balance; returns the new user_id (or None)
+
+        user_id picks the id (e.g. the session's); by default the next free one.
+        """
+        try:
+            query = "INSERT INTO user (user_id, username, password, total_assets) VALUES (?, ?, ?, ?)"
+            return self.connections.write(
+                lambda connection: connection.execute(query, (user_id, username, password, initial_balance)).lastrowid)
+        except Exception as e:
+            print(f"Error creating user {username}: {e}")
+            return None
         
     def save_stock_note(self, user_id, stock_ticker, note):
             """Save a note for a specific stock."""
@@ -280,8 +476,9 @@ class DatabaseManager:
             print(f"Error checking favorite status for {stock_ticker}: {e}")
             return False
             
-    def get_user_favorites(self, user_id=1):
+    def get_user_favorites(self, user_id=None):
         """Get all favorite stocks for a user."""
+        user_id = current_user_id() if user_id is None else user_id
         try:
             query = "SELECT stock_ticker FROM favorites WHERE user_id = ? ORDER BY added_date DESC"
             result = self.execute_query(query, (user_id,), fetch=True)
@@ -290,12 +487,16 @@ class DatabaseManager:
             print(f"Error getting favorites: {e}")
             return []
 
-# Initialize database manager
+# Shared database manager; nothing is opened until it is first used
 db = DatabaseManager()
 
-try:
-    db.connect()
-    db.create_database_schema()
-    print("Database initialized successfully.")
-except Exception as e:
-    print(f"Error initializing database: {e}")
\ No newline at end of file
+def init(db_file=None):
+    """Open and migrate the shared database (for application entry points)"""
+    return db.init(db_file)
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:2] == ["rebuild-holdings"]:
+        db.rebuild_holdings(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    else:
+        print("Usage: python -m stock.db_manager rebuild-holdings [user_id]")
@@ -0,0 +1,245 @@
+"""
+Persistent per-symbol indicator store
+
+Indicator columns are saved next to the cached bars as one .npy matrix per
+symbol (bars x FEATURE_COLUMNS) plus a small JSON sidecar with the dates.
+Matrices are memory-mapped on load, so readers (predict_stock, the
+backtester, the screener) get the indicators without copying or
+recomputing them. When bars arrive only the new or changed rows (today's
+bar keeps changing during the session) are computed, from a tail of stored
+history long enough for the widest rolling window.
+
+Every write goes to a new, numbered matrix file and the sidecar is switched
+to it last. A file still mapped by a reader is never replaced (Windows
+refuses that); superseded files are deleted once nothing maps them.
+"""
+import json
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from stock import indicators
+from stock.stockapi import (CACHE_DIR, CACHED_PERIODS, fetch_stock_data, load_cached_bars,
+                            load_cached_data, to_ohlcv_frame)
+from stock.stock_prediction import SCORING_PARAMS
+
+FEATURE_DIR = os.path.join(CACHE_DIR, 'features')
+
+FEATURE_COLUMNS = [
+    'close', 'volume', 'sma_20', 'sma_50', 'sma_200', 'rsi',
+    'bb_upper', 'bb_middle', 'bb_lower', 'volume_ratio',
+    'return_1d', 'return_5d', 'return_20d',
+]
+
+# Windows the stored columns depend on; a change forces a rebuild
+FEATURE_PARAMS = {name: SCORING_PARAMS[name] for name in ('bb_window', 'bb_std', 'rsi_window', 'volume_window')}
+
+# Stored rows needed to extend every rolling column exactly
+LOOKBACK = 200 + 5
+
+_store_lock = threading.Lock()
+_loaded = {}  # symbol -> (sidecar mtime, DataFrame backed by a memmap)
+
+def _meta_path(symbol):
+    return os.path.join(FEATURE_DIR, f"{symbol}.json")
+
+def _matrix_path(symbol, version):
+    return os.path.join(FEATURE_DIR, f"{symbol}.{version}.npy")
+
+def _remove_old_matrices(symbol, version):
+    """Delete superseded matrix files; ones still mapped are left for the next write"""
+    pattern = re.compile(re.escape(symbol) + r"\.(\d+)\.npy")
+    for filename in os.listdir(FEATURE_DIR):
+        match = pattern.fullmatch(filename)
+        if match and int(match.group(1)) != version:
+            try:
+                os.remove(os.path.join(FEATURE_DIR, filename))
+            except OSError:
+                pass
+
+def compute_features(close, volume):
+    """Feature columns for a daily close/volume history (Series)"""
+    upper, lower = indicators.bollinger_bands(close, FEATURE_PARAMS['bb_window'], FEATURE_PARAMS['bb_std'])
+    return pd.DataFrame({
+        'close': close,
+        'volume': volume,
+        'sma_20': indicators.sma(close, 20),
+        'sma_50': indicators.sma(close, 50),
+        'sma_200': indicators.sma(close, 200),
+        'rsi': indicators.rsi(close, FEATURE_PARAMS['rsi_window']),
+        'bb_upper': upper,
+        'bb_middle': indicators.sma(close, FEATURE_PARAMS['bb_window']),
+        'bb_lower': lower,
+        'volume_ratio': indicators.volume_ratio(volume, FEATURE_PARAMS['volume_window']),
+        'return_1d': indicators.returns(close, 1),
+        'return_5d': indicators.returns(close, 5),
+        'return_20d': indicators.returns(close, 20),
+    }, index=close.index)[FEATURE_COLUMNS]
+
+def _read_meta(symbol):
+    meta_path = _meta_path(symbol)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading feature metadata for {symbol}: {e}")
+        return None
+
+def _write(symbol, frame):
+    os.makedirs(FEATURE_DIR, exist_ok=True)
+    meta_path = _meta_path(symbol)
+    matrix = np.ascontiguousarray(frame[FEATURE_COLUMNS].to_numpy(dtype=np.float64))
+
+    previous = _read_meta(symbol) or {}
+    version = previous.get('version', 0) + 1
+    # A fresh file: the previous one may still be memory-mapped
+    np.save(_matrix_path(symbol, version), matrix)
+    meta = {
+        'columns': FEATURE_COLUMNS,
+        'params': FEATURE_PARAMS,
+        'version': version,
+        'dates': [d.strftime('%Y-%m-%d') for d in frame.index],
+    }
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+
+    with _store_lock:
+        _loaded.pop(symbol, None)
+    _remove_old_matrices(symbol, version)
+
+def load_features(symbol):
+    """Stored features as a DataFrame backed by a read-only memmap (or None)"""
+    meta_path = _meta_path(symbol)
+    if not os.path.exists(meta_path):
+        return None
+
+    mtime = os.path.getmtime(meta_path)
+    with _store_lock:
+        entry = _loaded.get(symbol)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+    meta = _read_meta(symbol)
+    if (meta is None or 'version' not in meta or meta.get('columns') != FEATURE_COLUMNS
+            or meta.get('params') != FEATURE_PARAMS):
+        return None
+    try:
+        matrix = np.load(_matrix_path(symbol, meta['version']), mmap_mode='r')
+    except Exception as e:
+        print(f"Error loading features for {symbol}: {e}")
+        return None
+    if len(matrix) != len(meta['dates']):
+        return None
+
+    frame = pd.DataFrame(matrix, index=pd.DatetimeIndex(meta['dates']), columns=FEATURE_COLUMNS, copy=False)
+    with _store_lock:
+        _loaded[symbol] = (mtime, frame)
+    return frame
+
+def update_features(symbol, bars):
+    """Bring the stored features up to date with a daily OHLCV frame
+
+    Only rows from the first bar that is new or whose close or volume
+    changed (e.g. today's bar, still forming during the session) are
+    computed; the store is rebuilt from scratch when the new bars reach
+    further back, disagree with every stored close they overlap (an
+    adjusted history), or the indicator windows changed. Bars that start after
+    the last stored date are not spliced on across the gap: the longest
+    cached history is used instead when it closes the gap, otherwise the
+    store is rebuilt from the bars alone.
+    """
+    if bars is None or bars.empty or 'Close' not in bars:
+        return None
+
+    stored = load_features(symbol)
+    if stored is not None and len(stored) and bars.index[0] > stored.index[-1]:
+        cached = load_cached_bars(symbol)
+        if (cached is not None and 'Close' in cached and cached.index[0] <= stored.index[-1]
+                and cached.index[-1] >= bars.index[-1]):
+            bars = cached
+        else:
+            stored = None
+    close = bars['Close']
+    volume = bars['Volume'] if 'Volume' in bars else close * np.nan
+    if stored is not None and len(stored) and bars.index[-1] < stored.index[-1]:
+        # Older bars than the store's (e.g. a long history fetched earlier)
+        return stored
+    if stored is not None and len(stored) >= LOOKBACK and bars.index[0] >= stored.index[0]:
+        overlap = stored.index.intersection(bars.index)
+        close_changed = ~np.isclose(stored.loc[overlap, 'close'].to_numpy(), close.loc[overlap].to_numpy(),
+                                    rtol=1e-6, equal_nan=True)
+        volume_changed = ~np.isclose(stored.loc[overlap, 'volume'].to_numpy(), volume.loc[overlap].to_numpy(),
+                                     rtol=1e-6, equal_nan=True)
+        consistent = len(overlap) > 0 and not (close_changed.all() and len(overlap) > 1)
+        changed = overlap[close_changed | volume_changed]
+        start = changed[0] if len(changed) else bars.index[bars.index > stored.index[-1]].min()
+        if consistent and pd.isna(start):
+            return stored
+
+        kept = stored[stored.index < start] if consistent else stored.iloc[:0]
+        if len(kept) >= LOOKBACK:
+            tail = kept.iloc[-LOOKBACK:]
+            recent = bars.index >= start
+            history_close = pd.concat([tail['close'], close[recent]])
+            history_volume = pd.concat([tail['volume'], volume[recent]])
+            fresh = compute_features(history_close, history_volume).iloc[LOOKBACK:]
+            _write(symbol, pd.concat([pd.DataFrame(np.asarray(kept), index=kept.index, columns=FEATURE_COLUMNS), fresh]))
+            return load_features(symbol)
+
+    if stored is not None and bars.index[0] > stored.index[0]:
+        # Keep the older stored history and rebuild over the union
+        older = stored[stored.index < bars.index[0]]
+        close = pd.concat([older['close'], close])
+        volume = pd.concat([older['volume'], volume])
+
+    _write(symbol, compute_features(close, volume))
+    return load_features(symbol)
+
+def update_from_cache(symbol):
+    """Update a symbol's features from the longest cached bar history"""
+    for period in CACHED_PERIODS:
+        bars = to_ohlcv_frame(load_cached_data(symbol, period))
+        if bars is not None and not bars.empty:
+            return update_features(symbol, bars)
+    return load_features(symbol)
+
+def ensure_features(symbol, fetch_missing=False):
+    """Stored features, filled from the bar cache (or the network) if absent"""
+    frame = load_features(symbol)
+    if frame is None:
+        frame = update_from_cache(symbol)
+    if frame is None and fetch_missing and fetch_stock_data(symbol):
+        frame = load_features(symbol)
+    return frame
+
+def load_feature_matrix(symbols, column):
+    """One feature column for many symbols as a (dates x symbols) DataFrame"""
+    series = {}
+    for symbol in symbols:
+        frame = load_features(symbol)
+        if frame is not None:
+            series[symbol] = frame[column]
+    if not series:
+        return pd.DataFrame(dtype=float)
+    return pd.DataFrame(series).sort_index()
+
+def latest_features(symbol):
+    """Most recent feature row as a dict (or None)"""
+    frame = load_features(symbol)
+    if frame is None or frame.empty:
+        return None
+    row = frame.iloc[-1]
+    values = {name: (None if np.isnan(row[name]) else float(row[name])) for name in FEATURE_COLUMNS}
+    values['date'] = frame.index[-1].strftime('%Y-%m-%d')
+    return values
+
+if __name__ == "__main__":
+    from stock.stockapi import DEFAULT_UNIVERSE
+    for symbol in DEFAULT_UNIVERSE:
+        features = update_from_cache(symbol)
+        print(f"{symbol}: {0 if features is None else len(features)} rows")
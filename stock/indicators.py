@@ -0,0 +1,90 @@
+"""
+Vectorized technical indicators
+
+Every function accepts either a Series (one symbol) or a DataFrame with one
+column per symbol and returns the full indicator history, so the same code
+serves a single chart and a whole-universe backtest.
+"""
+import numpy as np
+import pandas as pd
+
+def sma(prices, window):
+    """Simple moving average over the full history"""
+    return prices.rolling(window=window).mean()
+
+def bollinger_bands(prices, window=20, num_std=2):
+    """Upper and lower Bollinger Bands over the full history"""
+    middle = prices.rolling(window=window).mean()
+    std = prices.rolling(window=window).std()
+    return middle + (num_std * std), middle - (num_std * std)
+
+def rsi(prices, window=14):
+    """RSI over the full history (simple rolling averages, as in stockapi)"""
+    delta = prices.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=window).mean()
+    loss = -delta.where(delta < 0, 0).rolling(window=window).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+def volume_ratio(volumes, window=10):
+    """Latest volume divided by the average of the last `window` volumes
+
+    The average includes the current bar, and the ratio is only defined once
+    more than `window` bars are available (matching predict_stock).
+    """
+    avg_volume = volumes.rolling(window=window).mean()
+    ratio = volumes / avg_volume.replace(0, np.nan)
+    enough_history = volumes.notna().cumsum() > window
+    return ratio.where(enough_history)
+
+def returns(prices, periods=1):
+    """Simple returns over `periods` bars"""
+    return prices.pct_change(periods=periods, fill_method=None)
+
+# Period aliases used to bucket daily bars into higher timeframes
+TIMEFRAME_PERIODS = {
+    'weekly': 'W-FRI',
+    'monthly': 'M',
+}
+
+def period_keys(index, timeframe):
+    if timeframe not in TIMEFRAME_PERIODS:
+        raise ValueError(f"Unknown timeframe '{timeframe}'")
+    return pd.DatetimeIndex(index).to_period(TIMEFRAME_PERIODS[timeframe])
+
+def resample_ohlcv(frame, timeframe):
+    """Aggregate daily OHLCV bars (Open/High/Low/Close/Volume columns)
+
+    Each weekly/monthly bar is labelled with the last trading day it
+    contains, so the current, still-open period appears as the latest bar.
+    """
+    if timeframe == 'daily' or frame.empty:
+        return frame
+    keys = period_keys(frame.index, timeframe)
+    grouped = frame.groupby(keys)
+    resampled = pd.DataFrame({
+        'Open': grouped['Open'].first(),
+        'High': grouped['High'].max(),
+        'Low': grouped['Low'].min(),
+        'Close': grouped['Close'].last(),
+        'Volume': grouped['Volume'].sum(),
+    })
+    resampled.index = pd.DatetimeIndex(frame.index.to_series().groupby(keys).last().to_numpy())
+    return resampled
+
+def resample_last(matrix, timeframe):
+    """Last value per period for a (dates x symbols) matrix such as closes"""
+    if timeframe == 'daily':
+        return matrix
+    keys = period_keys(matrix.index, timeframe)
+    resampled = matrix.groupby(keys).last()
+    resampled.index = pd.DatetimeIndex(matrix.index.to_series().groupby(keys).last().to_numpy())
+    return resampled
+
+def align_to_daily(resampled, daily_index):
+    """Forward-fill a higher-timeframe series back onto daily bars
+
+    A daily bar only sees periods that ended on or before it, so there is no
+    look-ahead when higher-timeframe indicators feed daily scoring.
+    """
+    return resampled.reindex(resampled.index.union(daily_index)).ffill().reindex(daily_index)
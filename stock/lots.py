@@ -0,0 +1,171 @@
+"""
+Tax lots and realized P&L
+
+Every buy opens a lot. A sell closes the oldest open lots first (FIFO) and
+books the difference between its proceeds and their cost as realized P&L,
+both per sale (realized_gains) and as a running total (user.profit_loss).
+With the average-cost method the lots are still consumed oldest first, so
+they keep quantities and acquisition dates, but the cost of a sale is the
+position's average cost (holdings.cost_basis / holdings.shares).
+
+apply_trade does the work for one trade inside the caller's transaction,
+touching only the lots it closes. rebuild replays the ledger to recompute
+lots, holdings, realized gains and profit_loss from scratch, with exactly
+the same arithmetic, so the two always agree.
+"""
+from collections import deque
+
+COST_METHODS = ("fifo", "average")
+COST_METHOD = "fifo"
+
+# Applies one trade to the holdings table: shares and cost_basis are signed
+# (negative for a sell). A closed position is reset to exactly zero cost so
+# rounding never leaves a residue behind.
+HOLDINGS_UPSERT = """
+INSERT INTO holdings (user_id, stock_ticker, shares, cost_basis) VALUES (?, ?, ?, ?)
+ON CONFLICT(user_id, stock_ticker) DO UPDATE SET
+    shares = shares + excluded.shares,
+    cost_basis = CASE WHEN shares + excluded.shares = 0 THEN 0
+                      ELSE cost_basis + excluded.cost_basis END
+"""
+
+INSERT_LOT = """
+INSERT INTO lots (user_id, stock_ticker, transaction_id, acquired_date, quantity, remaining, price)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_GAIN = """
+INSERT INTO realized_gains (user_id, stock_ticker, transaction_id, sale_date, quantity, proceeds, cost, pnl)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Open lots are read a few at a time, so a sell only reads the lots it closes
+_LOT_BATCH = 16
+
+def _check_method(method):
+    method = method or COST_METHOD
+    if method not in COST_METHODS:
+        raise ValueError(f"Unknown cost method {method!r}; expected one of {COST_METHODS}")
+    return method
+
+def _sale_cost(method, matched, lot_cost, shares, cost_basis):
+    if method == "average":
+        return cost_basis / shares * matched if shares > 0 else 0.0
+    return lot_cost
+
+def apply_trade(connection, user_id, stock_ticker, action, quantity, price,
+                transaction_id, transaction_date, method=None):
+    """Update lots, holdings and realized P&L for one recorded trade
+
+    Runs on the caller's connection and transaction. Returns the realized
+    P&L of a sell (0.0 for a buy). Shares sold beyond the open lots (e.g.
+    bought before an imported history starts) have no known cost: they are
+    left out of holdings and the realized P&L, so holdings.shares always
+    equals the shares of the open lots.
+    """
+    method = _check_method(method)
+    if action == 'buy':
+        connection.execute(INSERT_LOT, (user_id, stock_ticker, transaction_id, transaction_date,
+                                        quantity, quantity, price))
+        connection.execute(HOLDINGS_UPSERT, (user_id, stock_ticker, quantity, quantity * price))
+        return 0.0
+
+    row = connection.execute("SELECT shares, cost_basis FROM holdings WHERE user_id = ? AND stock_ticker = ?",
+                             (user_id, stock_ticker)).fetchone()
+    shares, cost_basis = (row[0], row[1]) if row else (0, 0.0)
+
+    wanted, lot_cost = quantity, 0.0
+    while wanted > 0:
+        lots = connection.execute(
+            "SELECT lot_id, remaining, price FROM lots "
+            "WHERE user_id = ? AND stock_ticker = ? AND remaining > 0 ORDER BY lot_id LIMIT ?",
+            (user_id, stock_ticker, _LOT_BATCH)).fetchall()
+        if not lots:
+            break
+        for lot_id, remaining, lot_price in lots:
+            take = min(wanted, remaining)
+            connection.execute("UPDATE lots SET remaining = ? WHERE lot_id = ?", (remaining - take, lot_id))
+            lot_cost += take * lot_price
+            wanted -= take
+            if wanted == 0:
+                break
+    matched = quantity - wanted
+
+    cost = _sale_cost(method, matched, lot_cost, shares, cost_basis)
+    connection.execute(HOLDINGS_UPSERT, (user_id, stock_ticker, -matched, -cost))
+    if not matched:
+        return 0.0
+    proceeds = matched * price
+    pnl = proceeds - cost
+    connection.execute(INSERT_GAIN, (user_id, stock_ticker, transaction_id, transaction_date,
+                                     matched, proceeds, cost, pnl))
+    connection.execute("UPDATE user SET profit_loss = profit_loss + ? WHERE user_id = ?", (pnl, user_id))
+    return pnl
+
+def rebuild(connection, user_id=None, method=None):
+    """Recompute lots, holdings, realized gains and profit_loss from the ledger
+
+    One pass over the ledger (one user's, or everyone's) in trade order,
+    with the open lots of each position held in memory; the results are
+    written back with executemany. Runs in the caller's transaction.
+    """
+    method = _check_method(method)
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    positions = {}   # (user_id, ticker) -> [shares, cost_basis, deque of open lots]
+    lots = []        # [user_id, ticker, transaction_id, date, quantity, remaining, price]
+    gains = []
+    pnl_by_user = {}
+
+    # Plain tuples: much cheaper than sqlite3.Row over a long ledger
+    ledger = connection.cursor()
+    ledger.row_factory = None
+    ledger.execute(
+        "SELECT transaction_id, user_id, stock_ticker, action, quantity, price, transaction_date "
+        f"FROM stock_transactions {where} ORDER BY transaction_date, transaction_id", params)
+    for transaction_id, user, ticker, action, quantity, price, date in ledger:
+        position = positions.get((user, ticker))
+        if position is None:
+            position = positions[(user, ticker)] = [0, 0.0, deque()]
+        shares, cost_basis, open_lots = position
+
+        if action == 'buy':
+            lot = [user, ticker, transaction_id, date, quantity, quantity, price]
+            lots.append(lot)
+            open_lots.append(lot)
+            delta_cost = quantity * price
+        else:
+            wanted, lot_cost = quantity, 0.0
+            while wanted > 0 and open_lots:
+                lot = open_lots[0]
+                take = min(wanted, lot[5])
+                lot[5] -= take
+                lot_cost += take * lot[6]
+                wanted -= take
+                if lot[5] == 0:
+                    open_lots.popleft()
+            matched = quantity - wanted
+            cost = _sale_cost(method, matched, lot_cost, shares, cost_basis)
+            delta_cost = -cost
+            quantity = -matched
+            if matched:
+                proceeds = matched * price
+                pnl = proceeds - cost
+                gains.append((user, ticker, transaction_id, date, matched, proceeds, cost, pnl))
+                pnl_by_user[user] = pnl_by_user.get(user, 0.0) + pnl
+
+        position[0] = shares + quantity
+        position[1] = 0 if position[0] == 0 else cost_basis + delta_cost
+
+    for table in ("lots", "realized_gains", "holdings"):
+        connection.execute(f"DELETE FROM {table} {where}", params)
+    connection.executemany(INSERT_LOT, lots)
+    connection.executemany(INSERT_GAIN, gains)
+    connection.executemany(
+        "INSERT INTO holdings (user_id, stock_ticker, shares, cost_basis) VALUES (?, ?, ?, ?)",
+        ((user, ticker, shares, cost_basis) for (user, ticker), (shares, cost_basis, _) in positions.items()))
+    connection.execute(f"UPDATE user SET profit_loss = 0 {where}", params)
+    connection.executemany("UPDATE user SET profit_loss = ? WHERE user_id = ?",
+                           ((pnl, user) for user, pnl in pnl_by_user.items()))
+    return len(lots), len(gains)
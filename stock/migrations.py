@@ -0,0 +1,197 @@
+"""
+Versioned schema migrations for the SQLite portfolio database
+
+Migrations are applied in order, each in its own transaction together with
+its row in schema_version, so a database is always at a well-defined
+version. Add new migrations to the end of MIGRATIONS; never edit one that
+has shipped. The statements of the first migrations use IF NOT EXISTS so
+databases created before versioning are brought in line without changes.
+A statement may also be a function of the connection, for data migrations
+that are easier to write in Python.
+"""
+from collections import namedtuple
+from stock.lots import rebuild as rebuild_lots
+
+# transactional=False for statements SQLite refuses inside a transaction
+# (such as changing the journal mode)
+Migration = namedtuple('Migration', ['version', 'description', 'statements', 'transactional'],
+                       defaults=[True])
+
+MIGRATIONS = [
+    Migration(1, "Base tables", [
+        '''CREATE TABLE IF NOT EXISTS user (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            total_assets REAL DEFAULT 0,
+            profit_loss REAL DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS stock_transactions (
+            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            stock_ticker TEXT NOT NULL,
+            action TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            transaction_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES user(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS stock_notes (
+            user_id INTEGER NOT NULL,
+            stock_ticker TEXT NOT NULL,
+            note TEXT,
+            PRIMARY KEY (user_id, stock_ticker),
+            FOREIGN KEY (user_id) REFERENCES user (user_id) ON DELETE CASCADE
+        )''',
+        '''CREATE TABLE IF NOT EXISTS watchlist (
+            watchlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            stock_ticker TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES user(user_id),
+            UNIQUE(user_id, stock_ticker)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS favorites (
+            favorite_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            stock_ticker TEXT NOT NULL,
+            added_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES user(user_id),
+            UNIQUE(user_id, stock_ticker)
+        )''',
+    ]),
+    Migration(2, "Materialized holdings", [
+        # Current position per user and ticker, kept in step with
+        # stock_transactions by record_transaction
+        '''CREATE TABLE IF NOT EXISTS holdings (
+            user_id INTEGER NOT NULL,
+            stock_ticker TEXT NOT NULL,
+            shares INTEGER NOT NULL DEFAULT 0,
+            cost_basis REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, stock_ticker),
+            FOREIGN KEY (user_id) REFERENCES user(user_id)
+        )''',
+        '''INSERT INTO holdings (user_id, stock_ticker, shares, cost_basis)
+        SELECT user_id, stock_ticker,
+               SUM(CASE WHEN action = 'buy' THEN quantity ELSE -quantity END),
+               SUM(CASE WHEN action = 'buy' THEN quantity * price ELSE -quantity * price END)
+        FROM stock_transactions
+        WHERE NOT EXISTS (SELECT 1 FROM holdings)
+        GROUP BY user_id, stock_ticker''',
+    ]),
+    Migration(3, "Indexes for per-user history and favorites", [
+        # Serves per-ticker history (and holdings rebuilds) for a user
+        '''CREATE INDEX IF NOT EXISTS idx_transactions_user_ticker_date
+        ON stock_transactions (user_id, stock_ticker, transaction_date)''',
+        # Serves a user's full history newest first
+        '''CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+        ON stock_transactions (user_id, transaction_date, transaction_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_favorites_user_date
+        ON favorites (user_id, added_date)''',
+    ]),
+    Migration(4, "Write-ahead logging", [
+        # Persistent: readers no longer block the writer and each commit
+        # appends to the log instead of rewriting pages in place
+        "PRAGMA journal_mode = WAL",
+    ], transactional=False),
+    Migration(5, "Tax lots and realized gains", [
+        # Open and closed lots per buy; sells consume them (see stock.lots)
+        '''CREATE TABLE IF NOT EXISTS lots (
+            lot_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            stock_ticker TEXT NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            acquired_date TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            remaining INTEGER NOT NULL,
+            price REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES user(user_id),
+            FOREIGN KEY (transaction_id) REFERENCES stock_transactions(transaction_id)
+        )''',
+        # Only open lots are ever searched, oldest first
+        '''CREATE INDEX IF NOT EXISTS idx_lots_open
+        ON lots (user_id, stock_ticker, lot_id) WHERE remaining > 0''',
+        '''CREATE TABLE IF NOT EXISTS realized_gains (
+            gain_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            stock_ticker TEXT NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            sale_date TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            proceeds REAL NOT NULL,
+            cost REAL NOT NULL,
+            pnl REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES user(user_id),
+            FOREIGN KEY (transaction_id) REFERENCES stock_transactions(transaction_id)
+        )''',
+        '''CREATE INDEX IF NOT EXISTS idx_realized_gains_user_date
+        ON realized_gains (user_id, sale_date)''',
+        # Lots for the existing ledger; also replaces the approximate cost
+        # basis of migration 2 with the cost of the open lots
+        rebuild_lots,
+    ]),
+    Migration(6, "Daily portfolio snapshots", [
+        # One row per user and business day (see stock.portfolio_history)
+        '''CREATE TABLE IF NOT EXISTS portfolio_daily (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            cash REAL NOT NULL,
+            market_value REAL NOT NULL,
+            nav REAL NOT NULL,
+            PRIMARY KEY (user_id, date),
+            FOREIGN KEY (user_id) REFERENCES user(user_id)
+        ) WITHOUT ROWID''',
+    ]),
+]
+
+# Per-connection settings applied by DatabaseManager.connect
+CONNECTION_PRAGMAS = {
+    'synchronous': 'NORMAL',   # with WAL, durable at checkpoints; never corrupts
+    'cache_size': -64000,      # 64 MB page cache (negative values are KiB)
+    'mmap_size': 268435456,    # read up to 256 MB through memory mapping
+    'temp_store': 'MEMORY',    # sorts and temporary indexes stay in memory
+    'busy_timeout': 5000,      # wait up to 5 s for another writer
+}
+
+def apply_pragmas(connection, pragmas=None):
+    for name, value in (pragmas or CONNECTION_PRAGMAS).items():
+        connection.execute(f"PRAGMA {name} = {value}")
+
+def current_version(connection):
+    """Highest applied migration version (0 for an unversioned database)"""
+    connection.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    row = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def migrate(connection, migrations=None):
+    """Apply every migration newer than the database; returns the new version"""
+    version = current_version(connection)
+    for migration in migrations or MIGRATIONS:
+        if migration.version <= version:
+            continue
+        if migration.transactional:
+            connection.execute("BEGIN")
+            try:
+                for statement in migration.statements:
+                    if callable(statement):
+                        statement(connection)
+                    else:
+                        connection.execute(statement)
+                connection.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                                   (migration.version, migration.description))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        else:
+            for statement in migration.statements:
+                connection.execute(statement)
+            with connection:
+                connection.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                                   (migration.version, migration.description))
+        print(f"Applied migration {migration.version}: {migration.description}")
+        version = migration.version
+    return version
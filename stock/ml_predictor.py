@@ -0,0 +1,295 @@
+"""
+Optional trainable predictor alongside the rule-based score
+
+Trained offline on the feature store: each (symbol, day) row becomes a
+scale-free feature vector labelled by whether the close `horizon` days later
+is higher. The default model is an L2-regularized logistic regression solved
+with NumPy; with scikit-learn installed a small gradient-boosting model can
+be used instead. Models are saved as versioned artifacts under MODEL_DIR
+and loaded lazily on first use, so nothing is imported or read at startup;
+a model saved later is picked up on the next prediction.
+"""
+import json
+import os
+import pickle
+import threading
+from datetime import datetime
+import numpy as np
+from stock.stockapi import CACHE_DIR, DEFAULT_UNIVERSE
+from stock.feature_store import load_features
+
+MODEL_DIR = os.path.join(CACHE_DIR, 'models')
+
+MODEL_FEATURES = [
+    'dist_sma_20', 'dist_sma_50', 'dist_sma_200', 'rsi', 'bb_position',
+    'log_volume_ratio', 'return_1d', 'return_5d', 'return_20d',
+]
+
+DEFAULT_HORIZON = 5
+
+# Feature rows older than this many business days are not scored: the
+# prediction would describe a market that has moved on
+MAX_ROW_AGE = 3
+
+_predictor = None  # (artifact, model, meta); artifact as returned by _latest_artifact
+_predictor_lock = threading.Lock()
+
+def feature_rows(frame):
+    """Model inputs for every row of a feature-store frame (rows x MODEL_FEATURES)"""
+    close = frame['close'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        band_width = frame['bb_upper'].to_numpy() - frame['bb_lower'].to_numpy()
+        columns = [
+            close / frame['sma_20'].to_numpy() - 1.0,
+            close / frame['sma_50'].to_numpy() - 1.0,
+            close / frame['sma_200'].to_numpy() - 1.0,
+            frame['rsi'].to_numpy() / 100.0,
+            np.where(band_width > 0, (close - frame['bb_lower'].to_numpy()) / band_width, np.nan),
+            np.log(frame['volume_ratio'].to_numpy()),
+            frame['return_1d'].to_numpy(),
+            frame['return_5d'].to_numpy(),
+            frame['return_20d'].to_numpy(),
+        ]
+    rows = np.column_stack(columns)
+    rows[~np.isfinite(rows)] = np.nan
+    return rows
+
+def build_dataset(symbols, horizon=DEFAULT_HORIZON):
+    """Stack labelled rows from the feature store: (X, y, dates)"""
+    features, labels, dates = [], [], []
+    for symbol in symbols:
+        frame = load_features(symbol)
+        if frame is None or len(frame) <= horizon:
+            continue
+        rows = feature_rows(frame)
+        close = frame['close'].to_numpy(dtype=float)
+        forward = np.full(len(close), np.nan)
+        forward[:-horizon] = close[horizon:] / close[:-horizon] - 1.0
+
+        usable = np.isfinite(forward) & ~np.isnan(rows).any(axis=1)
+        features.append(rows[usable])
+        labels.append((forward[usable] > 0).astype(float))
+        dates.append(frame.index.to_numpy()[usable])
+
+    if not features:
+        return None, None, None
+    return np.vstack(features), np.concatenate(labels), np.concatenate(dates)
+
+class LogisticModel:
+    """L2-regularized logistic regression fitted by Newton's method (IRLS)"""
+
+    kind = 'logistic'
+
+    def __init__(self, l2=1.0):
+        self.l2 = l2
+        self.weights = None
+        self.mean = None
+        self.scale = None
+
+    def _design(self, X):
+        standardized = (X - self.mean) / self.scale
+        standardized = np.nan_to_num(standardized)  # missing inputs sit at the mean
+        return np.column_stack([np.ones(len(standardized)), standardized])
+
+    def fit(self, X, y, iterations=25):
+        self.mean = np.nanmean(X, axis=0)
+        self.scale = np.nanstd(X, axis=0)
+        self.scale[self.scale == 0] = 1.0
+        design = self._design(X)
+
+        weights = np.zeros(design.shape[1])
+        penalty = np.full(design.shape[1], self.l2)
+        penalty[0] = 0.0  # the intercept is not regularized
+        for _ in range(iterations):
+            prob = 1.0 / (1.0 + np.exp(-design @ weights))
+            gradient = design.T @ (prob - y) + penalty * weights
+            hessian = (design * (prob * (1 - prob))[:, None]).T @ design + np.diag(penalty)
+            step = np.linalg.solve(hessian, gradient)
+            weights -= step
+            if np.abs(step).max() < 1e-8:
+                break
+        self.weights = weights
+        return self
+
+    def predict_proba(self, X):
+        return 1.0 / (1.0 + np.exp(-self._design(X) @ self.weights))
+
+class BoostingModel:
+    """scikit-learn gradient boosting (imported only when this model is used)"""
+
+    kind = 'boosting'
+
+    def __init__(self, **options):
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        options.setdefault('max_iter', 200)
+        options.setdefault('max_depth', 3)
+        options.setdefault('learning_rate', 0.05)
+        self.model = HistGradientBoostingClassifier(**options)
+
+    def fit(self, X, y):
+        self.model.fit(X, y)
+        return self
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)[:, 1]
+
+def _auc(y, scores):
+    order = np.argsort(scores)
+    ranks = np.empty(len(scores))
+    ranks[order] = np.arange(1, len(scores) + 1)
+    positives = y == 1
+    n_pos, n_neg = positives.sum(), (~positives).sum()
+    if n_pos == 0 or n_neg == 0:
+        return 0.5
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+def train(symbols=None, horizon=DEFAULT_HORIZON, model="logistic", holdout=0.2, **options):
+    """Fit a model on the feature store; returns (model, metrics) or (None, None)
+
+    The most recent `holdout` share of dates (after a `horizon` gap) is kept
+    out of training and used for the reported accuracy and AUC.
+    """
+    X, y, dates = build_dataset(symbols or DEFAULT_UNIVERSE, horizon)
+    if X is None or len(X) < 100:
+        print("Not enough feature-store history to train a model")
+        return None, None
+
+    unique_dates = np.unique(dates)
+    split = unique_dates[int(len(unique_dates) * (1 - holdout))]
+    gap_end = unique_dates[min(len(unique_dates) - 1, np.searchsorted(unique_dates, split) + horizon)]
+    train_rows = dates < split
+    test_rows = dates >= gap_end
+
+    estimator = BoostingModel(**options) if model == "boosting" else LogisticModel(**options)
+    estimator.fit(X[train_rows], y[train_rows])
+
+    metrics = {'train_rows': int(train_rows.sum()), 'test_rows': int(test_rows.sum())}
+    if test_rows.any():
+        prob = estimator.predict_proba(X[test_rows])
+        metrics['accuracy'] = float(((prob > 0.5) == (y[test_rows] == 1)).mean())
+        metrics['auc'] = _auc(y[test_rows], prob)
+        metrics['base_rate'] = float(y[test_rows].mean())
+
+    # Refit on everything for the saved artifact
+    estimator.fit(X, y)
+    return estimator, metrics
+
+def _versions():
+    if not os.path.isdir(MODEL_DIR):
+        return []
+    versions = []
+    for filename in os.listdir(MODEL_DIR):
+        if filename.startswith('predictor_v') and filename.endswith('.json'):
+            try:
+                versions.append(int(filename[len('predictor_v'):-len('.json')]))
+            except ValueError:
+                pass
+    return sorted(versions)
+
+def save_model(model, metrics, horizon=DEFAULT_HORIZON):
+    """Write the model as the next versioned artifact; returns the version"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    versions = _versions()
+    version = versions[-1] + 1 if versions else 1
+    base = os.path.join(MODEL_DIR, f"predictor_v{version}")
+
+    if model.kind == 'logistic':
+        np.savez(base + ".npz", weights=model.weights, mean=model.mean, scale=model.scale)
+    else:
+        with open(base + ".pkl", 'wb') as f:
+            pickle.dump(model, f)
+
+    meta = {
+        'version': version,
+        'kind': model.kind,
+        'features': MODEL_FEATURES,
+        'horizon': horizon,
+        'metrics': metrics,
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(base + ".json", 'w') as f:
+        json.dump(meta, f, indent=2)
+    return version
+
+def load_model(version=None):
+    """Load a saved model (latest by default); returns (model, meta) or (None, None)"""
+    versions = _versions()
+    if not versions:
+        return None, None
+    version = version or versions[-1]
+    base = os.path.join(MODEL_DIR, f"predictor_v{version}")
+    try:
+        with open(base + ".json", 'r') as f:
+            meta = json.load(f)
+        if meta.get('features') != MODEL_FEATURES:
+            print(f"Model v{version} was trained on different features; retrain it")
+            return None, None
+        if meta['kind'] == 'logistic':
+            arrays = np.load(base + ".npz")
+            model = LogisticModel()
+            model.weights, model.mean, model.scale = arrays['weights'], arrays['mean'], arrays['scale']
+        else:
+            with open(base + ".pkl", 'rb') as f:
+                model = pickle.load(f)
+        return model, meta
+    except Exception as e:
+        print(f"Error loading model v{version}: {e}")
+        return None, None
+
+def _latest_artifact():
+    """(version, mtime) of the newest saved model, or None"""
+    versions = _versions()
+    if not versions:
+        return None
+    try:
+        return versions[-1], os.path.getmtime(os.path.join(MODEL_DIR, f"predictor_v{versions[-1]}.json"))
+    except OSError:
+        return None
+
+def get_predictor():
+    """The latest saved model as (model, meta), or (None, None) if untrained
+
+    Loaded on first use and again only when a newer artifact is saved, so a
+    failed load is retried once a model is trained.
+    """
+    global _predictor
+    artifact = _latest_artifact()
+    with _predictor_lock:
+        if _predictor is None or _predictor[0] != artifact:
+            model, meta = load_model(artifact[0]) if artifact else (None, None)
+            _predictor = (artifact, model, meta)
+        return _predictor[1], _predictor[2]
+
+def predict_universe(symbols, as_of=None):
+    """Probability of a rise over the model horizon for many symbols at once
+
+    Latest feature rows are stacked into one matrix and scored in a single
+    call. Returns {symbol: probability}; symbols without features, or whose
+    latest row is more than MAX_ROW_AGE business days before as_of (today),
+    are skipped, and the result is empty when no model has been trained.
+    """
+    model, _ = get_predictor()
+    if model is None:
+        return {}
+
+    today = np.datetime64(as_of or datetime.now().date(), 'D')
+    names, rows = [], []
+    for symbol in symbols:
+        frame = load_features(symbol)
+        if frame is None or frame.empty:
+            continue
+        if np.busday_count(np.datetime64(frame.index[-1].date(), 'D'), today) > MAX_ROW_AGE:
+            continue
+        names.append(symbol)
+        rows.append(feature_rows(frame.iloc[-1:])[0])
+    if not rows:
+        return {}
+
+    probabilities = model.predict_proba(np.vstack(rows))
+    return {symbol: float(prob) for symbol, prob in zip(names, probabilities)}
+
+if __name__ == "__main__":
+    model, metrics = train(DEFAULT_UNIVERSE)
+    if model is not None:
+        version = save_model(model, metrics)
+        print(f"Saved predictor v{version}: {metrics}")
@@ -0,0 +1,124 @@
+"""
+Monte Carlo target-price distributions
+
+Forward price paths are simulated fully vectorized, either as geometric
+Brownian motion fitted to historical log returns or as a block bootstrap of
+those returns. Paths are generated in chunks so memory stays bounded
+(chunk_size x horizon floats), and symbols are spread over a process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DEFAULT_HORIZON = 20  # trading days, matching the SMA 20 based target
+DEFAULT_PATHS = 10000
+DEFAULT_CHUNK = 2000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+def _log_returns(prices):
+    prices = np.asarray(prices, dtype=float)
+    prices = prices[np.isfinite(prices) & (prices > 0)]
+    return np.diff(np.log(prices))
+
+def _gbm_chunk(rng, log_returns, size, horizon, volatility_scale=1.0):
+    mu = log_returns.mean()
+    sigma = log_returns.std(ddof=1) * volatility_scale
+    return rng.normal(mu, sigma, size=(size, horizon))
+
+def _bootstrap_chunk(rng, log_returns, size, horizon, block_size):
+    block_size = max(1, min(block_size, len(log_returns)))
+    n_blocks = -(-horizon // block_size)
+    starts = rng.integers(0, len(log_returns) - block_size + 1, size=(size, n_blocks))
+    index = (starts[:, :, None] + np.arange(block_size)).reshape(size, -1)[:, :horizon]
+    return log_returns[index]
+
+def simulate_paths(prices, horizon=DEFAULT_HORIZON, n_paths=DEFAULT_PATHS, method="gbm",
+                   block_size=5, chunk_size=DEFAULT_CHUNK, seed=None, volatility_scale=1.0):
+    """Yield (terminal prices, path maxima, path minima) chunk by chunk
+
+    prices is the historical close series; paths start from its last value.
+    volatility_scale stretches the return dispersion around its mean, e.g.
+    by the current volatility regime (see volatility.volatility_profile).
+    """
+    log_returns = _log_returns(prices)
+    if len(log_returns) < 2:
+        return
+    if method == "bootstrap" and volatility_scale != 1.0:
+        log_returns = log_returns.mean() + (log_returns - log_returns.mean()) * volatility_scale
+    last_price = float(np.asarray(prices, dtype=float)[-1])
+    rng = np.random.default_rng(seed)
+
+    remaining = n_paths
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        if method == "bootstrap":
+            steps = _bootstrap_chunk(rng, log_returns, size, horizon, block_size)
+        else:
+            steps = _gbm_chunk(rng, log_returns, size, horizon, volatility_scale)
+        paths = last_price * np.exp(np.cumsum(steps, axis=1))
+        yield paths[:, -1], paths.max(axis=1), paths.min(axis=1)
+        remaining -= size
+
+def target_distribution(prices, target_price, horizon=DEFAULT_HORIZON, n_paths=DEFAULT_PATHS,
+                        method="gbm", block_size=5, chunk_size=DEFAULT_CHUNK, seed=None,
+                        volatility_scale=1.0):
+    """Distribution of the price `horizon` days ahead and odds of reaching target
+
+    Returns None when there is not enough history. 'prob_hit' is the share of
+    paths that touch the target at any point within the horizon;
+    'prob_beyond' is the share that finish beyond it.
+    """
+    if prices is None or len(prices) < 3 or target_price is None:
+        return None
+
+    last_price = float(prices[-1])
+    upside = target_price >= last_price
+    terminals = []
+    hits = 0
+    beyond = 0
+    for terminal, path_max, path_min in simulate_paths(prices, horizon, n_paths, method,
+                                                        block_size, chunk_size, seed, volatility_scale):
+        terminals.append(terminal)
+        if upside:
+            hits += int((path_max >= target_price).sum())
+            beyond += int((terminal >= target_price).sum())
+        else:
+            hits += int((path_min <= target_price).sum())
+            beyond += int((terminal <= target_price).sum())
+
+    if not terminals:
+        return None
+    terminal = np.concatenate(terminals)
+
+    return {
+        'method': method,
+        'horizon': horizon,
+        'paths': len(terminal),
+        'target_price': float(target_price),
+        'percentiles': {p: float(v) for p, v in zip(PERCENTILES, np.percentile(terminal, PERCENTILES))},
+        'expected_price': float(terminal.mean()),
+        'prob_hit': hits / len(terminal),
+        'prob_beyond': beyond / len(terminal),
+    }
+
+def _distribution_task(args):
+    symbol, prices, target_price, options = args
+    return symbol, target_distribution(prices, target_price, **options)
+
+def simulate_universe(targets, max_workers=None, **options):
+    """Run target_distribution for many symbols across a process pool
+
+    targets maps symbol -> (historical prices, target price). Each symbol
+    gets an independent random stream. Returns {symbol: distribution}.
+    """
+    if not targets:
+        return {}
+    seeds = np.random.SeedSequence(options.pop('seed', None)).spawn(len(targets))
+    tasks = [(symbol, np.asarray(prices, dtype=float), target, dict(options, seed=child))
+             for (symbol, (prices, target)), child in zip(targets.items(), seeds)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(tasks) == 1:
+        return dict(map(_distribution_task, tasks))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return dict(pool.map(_distribution_task, tasks, chunksize=max(1, len(tasks) // (4 * max_workers))))
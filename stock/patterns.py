@@ -0,0 +1,157 @@
+"""
+Vectorized candlestick patterns and pivot support/resistance
+
+Like indicators.py, every function takes Series (one symbol) or DataFrames
+(dates x symbols) of Open/High/Low/Close and works on the whole history in a
+single pass: patterns are elementwise comparisons of the current and
+previous candle, and pivots use rolling max/min, so cost is linear in bars
+and a universe is handled as one matrix.
+"""
+import numpy as np
+import pandas as pd
+
+PATTERN_PARAMS = {
+    'doji_body': 0.1,        # body at most this share of the range
+    'shadow_ratio': 2.0,     # hammer shadow at least this multiple of the body
+    'trend_bars': 5,         # bars of prior move a hammer/shooting star needs
+    'pivot_bars': 5,         # bars on each side of a pivot high/low
+    'level_tolerance': 0.01, # pivots within 1% are merged into one level
+}
+
+# Pattern name -> +1 (bullish) / -1 (bearish) / 0 (indecision)
+PATTERN_DIRECTIONS = {
+    'bullish_engulfing': 1,
+    'bearish_engulfing': -1,
+    'hammer': 1,
+    'shooting_star': -1,
+    'doji': 0,
+}
+
+def _params(params):
+    return dict(PATTERN_PARAMS, **(params or {}))
+
+def fill_ohlc(close, open_=None, high=None, low=None):
+    """Open/High/Low, approximated from closes where they are missing
+
+    Missing opens become the previous close and highs/lows the larger and
+    smaller of open and close, so patterns degrade gracefully on close-only
+    data.
+    """
+    if open_ is None:
+        open_ = close.shift(1)
+    open_ = open_.fillna(close.shift(1)).fillna(close)
+    if high is None:
+        high = np.maximum(open_, close)
+    if low is None:
+        low = np.minimum(open_, close)
+    return open_, high, low
+
+def detect_patterns(open_, high, low, close, params=None):
+    """Boolean history of each pattern in PATTERN_DIRECTIONS"""
+    p = _params(params)
+    body = close - open_
+    body_size = body.abs()
+    candle_range = high - low
+    upper_shadow = high - np.maximum(open_, close)
+    lower_shadow = np.minimum(open_, close) - low
+
+    prev_open = open_.shift(1)
+    prev_close = close.shift(1)
+    prior_move = close.shift(1) - close.shift(p['trend_bars'] + 1)
+
+    small_upper = upper_shadow <= np.maximum(body_size, candle_range * p['doji_body'])
+    small_lower = lower_shadow <= np.maximum(body_size, candle_range * p['doji_body'])
+    real_body = body_size > candle_range * p['doji_body']
+
+    return {
+        'bullish_engulfing': (prev_close < prev_open) & (body > 0)
+                             & (open_ <= prev_close) & (close >= prev_open) & (body_size > (prev_open - prev_close)),
+        'bearish_engulfing': (prev_close > prev_open) & (body < 0)
+                             & (open_ >= prev_close) & (close <= prev_open) & (body_size > (prev_close - prev_open)),
+        'hammer': real_body & (lower_shadow >= p['shadow_ratio'] * body_size) & small_upper & (prior_move < 0),
+        'shooting_star': real_body & (upper_shadow >= p['shadow_ratio'] * body_size) & small_lower & (prior_move > 0),
+        'doji': (candle_range > 0) & (body_size <= candle_range * p['doji_body']),
+    }
+
+def candle_signal(patterns):
+    """Net candlestick signal per bar: bullish patterns minus bearish ones"""
+    signal = None
+    for name, direction in PATTERN_DIRECTIONS.items():
+        if direction:
+            term = patterns[name].astype(float) * direction
+            signal = term if signal is None else signal + term
+    return signal
+
+def pivots(high, low, params=None):
+    """Pivot highs and lows (local extremes over pivot_bars on each side)
+
+    Returns (pivot_high, pivot_low) holding the pivot price at the pivot bar
+    and NaN elsewhere. A pivot is only known pivot_bars bars later; see
+    support_resistance for the look-ahead-free levels.
+    """
+    window = 2 * _params(params)['pivot_bars'] + 1
+    is_high = high == high.rolling(window, center=True).max()
+    is_low = low == low.rolling(window, center=True).min()
+    return high.where(is_high), low.where(is_low)
+
+def support_resistance(high, low, params=None):
+    """Most recent confirmed pivot low (support) and high (resistance) per bar
+
+    Pivots become usable pivot_bars bars after they form, so the series can
+    be used as scoring inputs without look-ahead.
+    """
+    bars = _params(params)['pivot_bars']
+    pivot_high, pivot_low = pivots(high, low, params)
+    resistance = pivot_high.shift(bars).ffill()
+    support = pivot_low.shift(bars).ffill()
+    return support, resistance
+
+def price_levels(high, low, close, params=None, max_levels=3):
+    """Clustered support/resistance levels for one symbol's chart
+
+    Pivot prices closer than level_tolerance are merged (weighted by how
+    often they were touched). Returns {'support': [...], 'resistance': [...]}
+    with the levels nearest to the last close first.
+    """
+    p = _params(params)
+    pivot_high, pivot_low = pivots(pd.Series(np.asarray(high, dtype=float)),
+                                   pd.Series(np.asarray(low, dtype=float)), params)
+    prices = np.sort(np.concatenate([pivot_high.dropna().to_numpy(), pivot_low.dropna().to_numpy()]))
+    last = float(np.asarray(close, dtype=float)[-1])
+    if len(prices) == 0:
+        return {'support': [], 'resistance': []}
+
+    # A new cluster starts wherever the gap to the previous pivot is too wide
+    breaks = np.diff(prices) / prices[:-1] > p['level_tolerance']
+    cluster = np.concatenate([[0], np.cumsum(breaks)])
+    levels = np.bincount(cluster, weights=prices) / np.bincount(cluster)
+
+    support = sorted((level for level in levels if level < last), reverse=True)[:max_levels]
+    resistance = sorted(level for level in levels if level >= last)[:max_levels]
+    return {'support': [float(level) for level in support],
+            'resistance': [float(level) for level in resistance]}
+
+def chart_annotations(open_, high, low, close, params=None, max_levels=3):
+    """Pattern markers and price levels for StockChart, by bar position
+
+    Takes plain sequences (e.g. a payload's ohlc_data lists). Returns
+    {'patterns': [(position, name, direction), ...], 'support': [...],
+    'resistance': [...]}; indecision patterns (doji) are left out.
+    """
+    close = pd.Series(np.asarray(close, dtype=float))
+    open_, high, low = fill_ohlc(
+        close,
+        None if open_ is None else pd.Series(np.asarray(open_, dtype=float)),
+        None if high is None else pd.Series(np.asarray(high, dtype=float)),
+        None if low is None else pd.Series(np.asarray(low, dtype=float)))
+
+    found = detect_patterns(open_, high, low, close, params)
+    marks = []
+    for name, direction in PATTERN_DIRECTIONS.items():
+        if direction:
+            marks.extend((int(position), name, direction) for position in np.flatnonzero(found[name].to_numpy()))
+    marks.sort()
+
+    annotations = price_levels(high, low, close, params, max_levels)
+    annotations['patterns'] = marks
+    return annotations
@@ -0,0 +1,135 @@
+"""
+Daily portfolio value (NAV) history
+
+Positions per day are a dates x symbols matrix built from the transaction
+log, worked backwards from the current holdings: a day's position is
+today's minus the net quantity traded after that day, and cash likewise is
+today's balance minus the cash flows of later trades. Multiplied by the
+cached close matrix (trade prices where no bars are cached) and summed,
+plus cash, that gives the NAV of every business day at once.
+
+Days are stored in portfolio_daily. update_history only computes the days
+from the last stored one on, from the trades made since then, so charting
+years of history is one indexed read. Deposits are not in the ledger, so
+days computed for the first time carry later deposits as cash; days that
+are already stored keep the cash they had.
+"""
+import time
+import numpy as np
+import pandas as pd
+from stock import db_manager
+from stock.session import current_user_id
+from stock.stockapi import load_ohlcv_matrices
+
+HISTORY_COLUMNS = ('cash', 'market_value', 'nav')
+
+def _as_of(values, days):
+    """Running totals of a by-day frame (or series) carried onto `days`"""
+    totals = values.cumsum()
+    return totals.reindex(totals.index.union(days)).ffill().reindex(days).fillna(0.0)
+
+def _current_state(database, user_id, start):
+    """Shares held, cash and the trades since `start`, read in one snapshot"""
+    query = ("SELECT transaction_date, stock_ticker, action, quantity, price FROM stock_transactions "
+             "WHERE user_id = ? AND transaction_date >= ? ORDER BY transaction_date, transaction_id")
+    with database.transaction():
+        holdings = database.execute_query(
+            "SELECT stock_ticker, shares, cost_basis FROM holdings WHERE user_id = ? AND shares != 0",
+            (user_id,), fetch=True) or []
+        cash = database.get_user_balance(user_id)
+        trades = list(database.iter_query(query, (user_id, start or ""), row_type="tuple"))
+    return holdings, cash, trades
+
+def compute_nav(user_id=None, start=None, end=None, period=None, database=None):
+    """Daily cash, market value and NAV from `start` (default: first trade) to `end` (today)
+
+    Prices come from each symbol's longest cached history unless a period
+    is given. Returns a DataFrame indexed by business day with HISTORY_COLUMNS.
+    """
+    database = database or db_manager.db
+    user_id = current_user_id() if user_id is None else user_id
+    holdings, cash, trades = _current_state(database, user_id, start)
+    trades = pd.DataFrame(trades, columns=['date', 'symbol', 'action', 'quantity', 'price'])
+    trades['day'] = pd.to_datetime(trades['date'].str[:10])
+    trades['shares'] = np.where(trades['action'] == 'buy', trades['quantity'], -trades['quantity'])
+    trades['flow'] = -trades['shares'] * trades['price']
+
+    end = pd.Timestamp(end or pd.Timestamp.now()).normalize()
+    if start is None:
+        start = trades['day'].min() if len(trades) else end
+    days = pd.bdate_range(pd.Timestamp(start).normalize(), end)
+    if days.empty:
+        days = pd.DatetimeIndex([end])
+
+    held = pd.Series({row['stock_ticker']: row['shares'] for row in holdings}, dtype=float)
+    symbols = sorted(set(held.index) | set(trades['symbol']))
+
+    # Position on a day = current shares - net shares traded after it
+    traded = trades.pivot_table(index='day', columns='symbol', values='shares', aggfunc='sum')
+    traded = traded.reindex(columns=symbols, fill_value=0.0).fillna(0.0)
+    positions = held.reindex(symbols, fill_value=0.0) - (traded.sum() - _as_of(traded, days))
+
+    flows = trades.groupby('day')['flow'].sum()
+    cash = cash - (flows.sum() - _as_of(flows, days))
+
+    prices = pd.DataFrame(index=days, columns=symbols, dtype=float)
+    if symbols:
+        close = load_ohlcv_matrices(symbols, period)['Close']
+        traded_prices = trades.pivot_table(index='day', columns='symbol', values='price', aggfunc='last')
+        prices = close.combine_first(traded_prices).reindex(columns=symbols)
+        prices = prices.reindex(prices.index.union(days)).ffill().reindex(days)
+        # Last resort for a symbol with neither bars nor trades in range
+        average_cost = {row['stock_ticker']: row['cost_basis'] / row['shares'] for row in holdings}
+        prices = prices.fillna(pd.Series(average_cost, dtype=float))
+
+    market_value = (positions * prices).sum(axis=1)
+    return pd.DataFrame({'cash': cash, 'market_value': market_value, 'nav': cash + market_value}, index=days)
+
+def update_history(user_id=None, period=None, database=None):
+    """Store the days since the last snapshot (the last one is recomputed); returns their number"""
+    database = database or db_manager.db
+    user_id = current_user_id() if user_id is None else user_id
+    result = database.execute_query("SELECT MAX(date) AS last FROM portfolio_daily WHERE user_id = ?",
+                                    (user_id,), fetch=True)
+    last = result[0]['last'] if result else None
+    frame = compute_nav(user_id, start=last, period=period, database=database)
+
+    rows = [(user_id, day.strftime('%Y-%m-%d'), float(cash), float(value), float(nav))
+            for day, cash, value, nav in frame[list(HISTORY_COLUMNS)].itertuples()]
+    database.connections.write(lambda connection: connection.executemany(
+        "INSERT OR REPLACE INTO portfolio_daily (user_id, date, cash, market_value, nav) VALUES (?, ?, ?, ?, ?)",
+        rows))
+    return len(rows)
+
+def load_history(user_id=None, update=True, database=None):
+    """Stored daily history as a DataFrame indexed by date (brought up to date first)"""
+    database = database or db_manager.db
+    user_id = current_user_id() if user_id is None else user_id
+    if update:
+        update_history(user_id, database=database)
+    rows = list(database.iter_query(
+        "SELECT date, cash, market_value, nav FROM portfolio_daily WHERE user_id = ? ORDER BY date",
+        (user_id,), row_type="tuple"))
+    frame = pd.DataFrame(rows, columns=['date', *HISTORY_COLUMNS])
+    return frame.set_index(pd.DatetimeIndex(pd.to_datetime(frame.pop('date'))))
+
+def clear_history(user_id=None, since=None, database=None):
+    """Forget stored days (from `since` on), e.g. after back-dated trades were imported"""
+    database = database or db_manager.db
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if since is not None:
+        conditions.append("date >= ?")
+        params.append(str(since)[:10])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return database.execute_query(f"DELETE FROM portfolio_daily {where}", tuple(params))
+
+if __name__ == "__main__":
+    import sys
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    start = time.perf_counter()
+    history = load_history(user_id)
+    print(history.tail(10).to_string())
+    print(f"{len(history)} days of history in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,151 @@
+"""
+Relative strength against market and sector benchmarks
+
+Returns over several windows are computed for the whole (dates x symbols)
+close matrix at once, compared with an equal-weight benchmark (the whole
+universe, or each symbol's sector basket) and ranked cross-sectionally as
+percentiles. The cached history per universe is extended incrementally:
+only rows for new dates are computed, from a tail of closes as long as the
+widest window.
+"""
+import threading
+import numpy as np
+import pandas as pd
+from stock.stockapi import DEFAULT_UNIVERSE, SECTORS, fetch_stock_data
+from stock.feature_store import ensure_features, load_feature_matrix
+
+RS_WINDOWS = (20, 60, 120)
+
+# Weight of each window's percentile in the combined rating
+RS_WEIGHTS = {20: 0.4, 60: 0.3, 120: 0.3}
+
+# Equal-weight baskets standing in for the headline indices
+INDEX_BASKETS = {
+    "NIFTY 50": ["RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS", "ICICIBANK.NS"],
+    "SENSEX": ["HDFCBANK.NS", "INFY.NS", "ITC.NS", "KOTAKBANK.NS", "AXISBANK.NS"],
+    "NIFTY BANK": ["HDFCBANK.NS", "SBIN.NS", "ICICIBANK.NS", "KOTAKBANK.NS", "AXISBANK.NS"],
+}
+
+_cache = {}  # (universe, benchmark) -> {'close': DataFrame, 'result': dict of DataFrames}
+_cache_lock = threading.Lock()
+
+def benchmark_returns(window_returns, benchmark="market"):
+    """Equal-weight benchmark return for every cell of a returns matrix
+
+    benchmark is "market" (all symbols) or "sector" (the symbol's sector
+    basket from SECTORS; unknown symbols share an "Other" basket).
+    """
+    if benchmark == "sector":
+        sectors = [SECTORS.get(symbol, "Other") for symbol in window_returns.columns]
+        return window_returns.T.groupby(sectors).transform('mean').T
+    market = window_returns.mean(axis=1)
+    return pd.DataFrame(np.repeat(market.to_numpy()[:, None], window_returns.shape[1], axis=1),
+                        index=window_returns.index, columns=window_returns.columns)
+
+def relative_strength(close, windows=RS_WINDOWS, benchmark="market"):
+    """Excess returns and cross-sectional percentiles for every bar
+
+    Returns a dict of (dates x symbols) DataFrames: 'excess_<w>' (return
+    minus benchmark over w bars), 'rs_<w>' (percentile of the excess return
+    among all symbols that day, 0-100) and 'rs_rating' (RS_WEIGHTS blend).
+    """
+    result = {}
+    rating = None
+    total_weight = 0.0
+    for window in windows:
+        window_returns = close / close.shift(window) - 1
+        excess = window_returns - benchmark_returns(window_returns, benchmark)
+        percentile = excess.rank(axis=1, pct=True) * 100
+        result[f'excess_{window}'] = excess
+        result[f'rs_{window}'] = percentile
+
+        weight = RS_WEIGHTS.get(window, 1.0)
+        term = percentile.fillna(50.0) * weight
+        rating = term if rating is None else rating + term
+        total_weight += weight
+    result['rs_rating'] = (rating / total_weight).where(close.notna())
+    return result
+
+def _load_close(symbols, fetch_missing=False):
+    for symbol in symbols:
+        ensure_features(symbol, fetch_missing)
+    close = load_feature_matrix(symbols, 'close')
+    return close.reindex(columns=[s for s in symbols if s in close.columns])
+
+def universe_relative_strength(symbols=None, benchmark="market", close=None, fetch_missing=False):
+    """Relative strength history for a universe, extended incrementally
+
+    Cached per (universe, benchmark); when the close matrix gains new dates
+    only those rows are computed. Returns the relative_strength dict or None.
+    """
+    symbols = tuple(symbols or DEFAULT_UNIVERSE)
+    if close is None:
+        close = _load_close(symbols, fetch_missing)
+    if close.empty:
+        return None
+
+    key = (symbols, benchmark)
+    with _cache_lock:
+        entry = _cache.get(key)
+
+    lookback = max(RS_WINDOWS)
+    if entry is not None and list(entry['close'].columns) == list(close.columns):
+        cached_close = entry['close']
+        last_date = cached_close.index[-1]
+        if close.index[-1] == last_date and len(close) == len(cached_close):
+            return entry['result']
+
+        new_dates = close.index > last_date
+        overlap = close.index[~new_dates][-(lookback + 1):]
+        unchanged = (close.index[0] >= cached_close.index[0] and len(overlap) > 0
+                     and overlap.isin(cached_close.index).all()
+                     and np.allclose(cached_close.loc[overlap].to_numpy(), close.loc[overlap].to_numpy(),
+                                     equal_nan=True))
+        if unchanged and new_dates.any():
+            # Enough history before the new rows for the widest window
+            fresh = relative_strength(close.loc[overlap.append(close.index[new_dates])], benchmark=benchmark)
+            rows = close.index[new_dates]
+            result = {name: pd.concat([frame, fresh[name].loc[rows]]).reindex(close.index)
+                      for name, frame in entry['result'].items()}
+            with _cache_lock:
+                _cache[key] = {'close': close, 'result': result}
+            return result
+
+    result = relative_strength(close, benchmark=benchmark)
+    with _cache_lock:
+        _cache[key] = {'close': close, 'result': result}
+    return result
+
+def latest_relative_strength(symbols=None, benchmark="market", fetch_missing=False):
+    """Latest excess returns and percentiles per symbol as a DataFrame"""
+    result = universe_relative_strength(symbols, benchmark, fetch_missing=fetch_missing)
+    if result is None:
+        return pd.DataFrame(dtype=float)
+    return pd.DataFrame({name: frame.ffill().iloc[-1] for name, frame in result.items()})
+
+def basket_performance(symbols, windows=(1, 5, 20), fetch_missing=False, refresh=False):
+    """Equal-weight return of a basket over each window (e.g. an index proxy)
+
+    Returns {window: return} using the latest closes, or {} without data.
+    With refresh each symbol's quote is fetched first (at most once per
+    CACHE_DURATION), which writes the latest bar to the feature store, so
+    a live display follows the session instead of the last stored day.
+    """
+    if refresh:
+        for symbol in symbols:
+            fetch_stock_data(symbol)
+    close = _load_close(list(symbols), fetch_missing)
+    if close.empty:
+        return {}
+    performance = {}
+    for window in windows:
+        if len(close) > window:
+            change = close.iloc[-1] / close.iloc[-1 - window] - 1
+            if change.notna().any():
+                performance[window] = float(change.mean())
+    return performance
+
+def clear_relative_strength_cache():
+    """Drop all cached histories"""
+    with _cache_lock:
+        _cache.clear()
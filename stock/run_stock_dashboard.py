@@ -10,17 +10,16 @@ from stock.ui.dashboard import StockDashboard
 
 # Initialize database connection
 try:
-    from stock.db_manager import db
-    db.connect()
-    print("Connected to SQLite database at", db.db_path)
+    from stock.db_manager import db, init
+    from stock.session import session
+    # Connect and migrate the schema up front so problems show at startup
+    init()
     
-    # Create schema if not exists
-    db.create_database_schema()
-    print("SQLite database schema created successfully")
-    
-    # Create dummy user for testing if not exists
-    if not db.get_user_by_id(1):
-        db.create_user("Dummy User", 100000.0)  # 1 lakh initial balance
+    # Create dummy user for testing if not exists, under the session's id
+    # (usernames are unique, so other ids get their own name)
+    if not db.get_user_by_id(session.user_id):
+        username = "Dummy User" if session.user_id == 1 else f"Dummy User {session.user_id}"
+        db.create_user(username, 100000.0, user_id=session.user_id)  # 1 lakh initial balance
         print("Dummy user created")
     else:
         print("Dummy user already exists")
@@ -0,0 +1,409 @@
+"""
+Declarative scoring profiles compiled to vectorized NumPy expressions
+
+A profile is a list of rules such as "close <= bb_lower -> +0.3". Conditions
+are a small Python-expression subset over indicator names; they are parsed
+once with `ast` and compiled into closures that evaluate on whole
+(dates x symbols) indicator arrays, so a custom profile scores the entire
+universe as fast as the built-in rules.
+
+Profiles can be given as dicts, JSON files or (if PyYAML is installed) YAML
+files; PROFILE_DIR is searched for named profiles.
+"""
+import ast
+import json
+import os
+import numpy as np
+import pandas as pd
+from stock import indicators, patterns
+from stock.relative_strength import RS_WINDOWS, relative_strength
+from stock.stock_prediction import SCORING_PARAMS, classify_scores
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'profiles')
+
+# Mirrors predict_stock: rules in the same group behave like an if/elif chain
+DEFAULT_PROFILE = {
+    'name': 'default',
+    'rules': [
+        {'group': 'bollinger', 'when': 'close <= bb_lower', 'score': 'bb_weight'},
+        {'group': 'bollinger', 'when': 'close >= bb_upper', 'score': '-bb_weight'},
+        {'group': 'rsi', 'when': 'rsi < rsi_oversold', 'score': 'rsi_weight'},
+        {'group': 'rsi', 'when': 'rsi > rsi_overbought', 'score': '-rsi_weight'},
+        {'group': 'ma_cross', 'when': 'sma_fast > sma_slow', 'score': 'ma_weight'},
+        {'group': 'ma_cross', 'when': 'sma_fast < sma_slow', 'score': '-ma_weight'},
+        {'group': 'volume', 'when': 'volume_ratio > volume_multiplier', 'score': 'volume_weight'},
+    ],
+}
+
+# name -> function(context) returning a (dates x symbols) array
+INDICATORS = {}
+
+def register_indicator(name):
+    """Decorator adding an indicator that profile expressions can reference"""
+    def decorator(func):
+        INDICATORS[name] = func
+        return func
+    return decorator
+
+class IndicatorContext:
+    """Lazily computes and caches the indicators a profile refers to"""
+
+    def __init__(self, close, volume=None, params=None, extra=None, bars=None):
+        self.close = close
+        self.volume = volume
+        self.params = dict(SCORING_PARAMS, **(params or {}))
+        self.extra = extra or {}
+        self.bars = bars or {}
+        self._cache = {}
+
+    def ohlc(self):
+        """(open, high, low) aligned with close, approximated if not supplied"""
+        if '_ohlc' not in self._cache:
+            fields = []
+            for field in ('Open', 'High', 'Low'):
+                value = self.bars.get(field)
+                if isinstance(value, pd.Series):
+                    value = value.to_frame(self.close.columns[0])
+                fields.append(None if value is None else value.reindex_like(self.close))
+            self._cache['_ohlc'] = patterns.fill_ohlc(self.close, *fields)
+        return self._cache['_ohlc']
+
+    def frame(self, name):
+        """Indicator as a DataFrame aligned with close"""
+        if name not in self._cache:
+            if name in self.extra:
+                value = self.extra[name]
+            elif name in INDICATORS:
+                value = INDICATORS[name](self)
+            elif name in self.params:
+                value = self.params[name]
+            else:
+                raise ValueError(f"Unknown indicator or parameter '{name}'")
+            self._cache[name] = value
+        return self._cache[name]
+
+    def __getitem__(self, name):
+        value = self.frame(name)
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value.to_numpy(dtype=float)
+        return value
+
+@register_indicator('close')
+def _close(ctx):
+    return ctx.close
+
+@register_indicator('volume')
+def _volume(ctx):
+    if ctx.volume is None:
+        return ctx.close * np.nan
+    return ctx.volume
+
+@register_indicator('bb_upper')
+def _bb_upper(ctx):
+    upper, lower = indicators.bollinger_bands(ctx.close, ctx.params['bb_window'], ctx.params['bb_std'])
+    ctx._cache['bb_lower'] = lower
+    return upper
+
+@register_indicator('bb_lower')
+def _bb_lower(ctx):
+    upper, lower = indicators.bollinger_bands(ctx.close, ctx.params['bb_window'], ctx.params['bb_std'])
+    ctx._cache['bb_upper'] = upper
+    return lower
+
+@register_indicator('bb_middle')
+def _bb_middle(ctx):
+    return indicators.sma(ctx.close, ctx.params['bb_window'])
+
+@register_indicator('rsi')
+def _rsi(ctx):
+    return indicators.rsi(ctx.close, ctx.params['rsi_window'])
+
+@register_indicator('sma_fast')
+def _sma_fast(ctx):
+    # Missing SMAs fall back to the current price, as in predict_stock
+    return indicators.sma(ctx.close, ctx.params['ma_fast']).fillna(ctx.close)
+
+@register_indicator('sma_slow')
+def _sma_slow(ctx):
+    return indicators.sma(ctx.close, ctx.params['ma_slow']).fillna(ctx.close)
+
+for _window in (20, 50, 200):
+    register_indicator(f'sma_{_window}')(lambda ctx, w=_window: indicators.sma(ctx.close, w))
+
+@register_indicator('volume_ratio')
+def _volume_ratio(ctx):
+    return indicators.volume_ratio(ctx.frame('volume'), ctx.params['volume_window'])
+
+for _periods in (1, 5, 20):
+    register_indicator(f'return_{_periods}d')(lambda ctx, n=_periods: indicators.returns(ctx.close, n))
+
+for _timeframe in ('weekly', 'monthly'):
+    register_indicator(f'{_timeframe}_rsi')(
+        lambda ctx, tf=_timeframe: indicators.align_to_daily(
+            indicators.rsi(indicators.resample_last(ctx.close, tf), ctx.params['rsi_window']), ctx.close.index))
+    register_indicator(f'{_timeframe}_sma_20')(
+        lambda ctx, tf=_timeframe: indicators.align_to_daily(
+            indicators.sma(indicators.resample_last(ctx.close, tf), 20), ctx.close.index))
+
+def _candle_patterns(ctx):
+    if '_patterns' not in ctx._cache:
+        open_, high, low = ctx.ohlc()
+        ctx._cache['_patterns'] = patterns.detect_patterns(open_, high, low, ctx.close, ctx.params)
+    return ctx._cache['_patterns']
+
+for _pattern in patterns.PATTERN_DIRECTIONS:
+    register_indicator(_pattern)(lambda ctx, name=_pattern: _candle_patterns(ctx)[name].astype(float))
+
+@register_indicator('candle_signal')
+def _candle_signal(ctx):
+    return patterns.candle_signal(_candle_patterns(ctx))
+
+@register_indicator('support')
+def _support(ctx):
+    _, high, low = ctx.ohlc()
+    support, resistance = patterns.support_resistance(high, low, ctx.params)
+    ctx._cache['resistance'] = resistance
+    return support
+
+@register_indicator('resistance')
+def _resistance(ctx):
+    _, high, low = ctx.ohlc()
+    support, resistance = patterns.support_resistance(high, low, ctx.params)
+    ctx._cache['support'] = support
+    return resistance
+
+def _relative_strength(ctx):
+    # Percentiles are across the symbols being scored, so they only carry
+    # information when a whole universe is scored together
+    if '_relative_strength' not in ctx._cache:
+        ctx._cache['_relative_strength'] = relative_strength(ctx.close)
+    return ctx._cache['_relative_strength']
+
+for _name in ['rs_rating'] + [f'{kind}_{window}' for window in RS_WINDOWS for kind in ('rs', 'excess')]:
+    register_indicator(_name)(lambda ctx, name=_name: _relative_strength(ctx)[name])
+
+def _shift(values, periods=1):
+    periods = int(periods)
+    shifted = np.full(np.shape(values), np.nan)
+    if periods > 0:
+        shifted[periods:] = values[:-periods]
+    elif periods < 0:
+        shifted[:periods] = values[-periods:]
+    else:
+        shifted[...] = values
+    return shifted
+
+_COMPARISONS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+    ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_BINARY = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+}
+_FUNCTIONS = {
+    'abs': np.abs, 'min': np.minimum, 'max': np.maximum, 'shift': _shift,
+}
+
+def _compile_node(node, names):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda env: value
+
+    if isinstance(node, ast.Name):
+        names.add(node.id)
+        name = node.id
+        return lambda env: env[name]
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand, names)
+        if isinstance(node.op, ast.USub):
+            return lambda env: np.negative(operand(env))
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if isinstance(node.op, ast.Not):
+            return lambda env: np.logical_not(operand(env))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        func = _BINARY[type(node.op)]
+        left = _compile_node(node.left, names)
+        right = _compile_node(node.right, names)
+        return lambda env: func(left(env), right(env))
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(value, names) for value in node.values]
+        func = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda env: func.reduce([part(env) for part in parts])
+
+    if isinstance(node, ast.Compare):
+        operands = [_compile_node(node.left, names)] + [_compile_node(c, names) for c in node.comparators]
+        funcs = []
+        for op in node.ops:
+            if type(op) not in _COMPARISONS:
+                raise ValueError(f"Unsupported comparison '{type(op).__name__}'")
+            funcs.append(_COMPARISONS[type(op)])
+
+        def compare(env):
+            values = [operand(env) for operand in operands]
+            result = funcs[0](values[0], values[1])
+            for func, left, right in zip(funcs[1:], values[1:], values[2:]):
+                result = np.logical_and(result, func(left, right))
+            return result
+        return compare
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and not node.keywords:
+        func = _FUNCTIONS[node.func.id]
+        args = [_compile_node(arg, names) for arg in node.args]
+        return lambda env: func(*[arg(env) for arg in args])
+
+    raise ValueError(f"Unsupported expression element '{ast.dump(node)}'")
+
+def compile_expression(text):
+    """Compile an expression string; returns (function(env) -> array, names used)"""
+    try:
+        tree = ast.parse(str(text).strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression '{text}': {e.msg}")
+    names = set()
+    return _compile_node(tree.body, names), names
+
+def _parse_rule(rule, position):
+    """Normalize a rule given as a dict or as a "condition -> score" string"""
+    if isinstance(rule, str):
+        separator = '->' if '->' in rule else '→'
+        if separator not in rule:
+            raise ValueError(f"Rule '{rule}' must look like 'condition -> score'")
+        condition, score = rule.split(separator, 1)
+        rule = {'when': condition, 'score': score}
+    if 'when' not in rule or 'score' not in rule:
+        raise ValueError(f"Rule {position} needs 'when' and 'score'")
+    return {
+        'name': rule.get('name', f"rule_{position}"),
+        'group': rule.get('group', rule.get('name', f"rule_{position}")),
+        'when': str(rule['when']).strip(),
+        'score': str(rule['score']).strip(),
+    }
+
+def _truthy(values, shape):
+    """Boolean mask from a condition result; NaN counts as False"""
+    values = np.asarray(values)
+    if values.dtype != bool:
+        values = np.nan_to_num(values.astype(float)) != 0
+    return np.broadcast_to(values, shape)
+
+class ScoringProfile:
+    """A compiled set of scoring rules"""
+
+    def __init__(self, spec):
+        self.name = spec.get('name', 'custom')
+        self.params = dict(SCORING_PARAMS, **spec.get('params', {}))
+        self.rules = []
+        self.groups = []
+        for position, raw_rule in enumerate(spec.get('rules', [])):
+            rule = _parse_rule(raw_rule, position)
+            rule['condition'], condition_names = compile_expression(rule['when'])
+            rule['value'], value_names = compile_expression(rule['score'])
+            rule['names'] = condition_names | value_names
+            self.rules.append(rule)
+            if rule['group'] not in self.groups:
+                self.groups.append(rule['group'])
+        if not self.rules:
+            raise ValueError(f"Profile '{self.name}' has no rules")
+
+    @property
+    def indicator_names(self):
+        names = set()
+        for rule in self.rules:
+            names |= rule['names']
+        return names
+
+    def components(self, close, volume=None, extra=None, bars=None):
+        """Per-group score contribution over the full history (DataFrames)
+
+        bars optionally supplies 'Open'/'High'/'Low' matrices for the
+        candlestick and support/resistance indicators.
+        """
+        frame = close if isinstance(close, pd.DataFrame) else close.to_frame()
+        vol = volume if volume is None or isinstance(volume, pd.DataFrame) else volume.to_frame()
+        ctx = IndicatorContext(frame, vol, self.params, extra, bars)
+
+        shape = frame.shape
+        result = {}
+        for group in self.groups:
+            contribution = np.zeros(shape)
+            matched = np.zeros(shape, dtype=bool)
+            for rule in self.rules:
+                if rule['group'] != group:
+                    continue
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    hit = _truthy(rule['condition'](ctx), shape) & ~matched
+                    value = np.broadcast_to(rule['value'](ctx), shape)
+                contribution = np.where(hit, value, contribution)
+                matched |= hit
+            result[group] = pd.DataFrame(contribution, index=frame.index, columns=frame.columns)
+        return result
+
+    def score(self, close, volume=None, extra=None, bars=None):
+        """Total score for every bar (and symbol), NaN where there is no price"""
+        components = self.components(close, volume, extra, bars)
+        total = sum(components.values())
+        frame = close if isinstance(close, pd.DataFrame) else close.to_frame()
+        total = total.where(frame.notna())
+        return total if isinstance(close, pd.DataFrame) else total.iloc[:, 0]
+
+    def classify(self, scores):
+        """Prediction labels using this profile's cutoffs"""
+        return classify_scores(scores, self.params)
+
+def load_profile(profile=None):
+    """Load a ScoringProfile from a dict, a file path or a name in PROFILE_DIR"""
+    if profile is None or profile == 'default':
+        return ScoringProfile(DEFAULT_PROFILE)
+    if isinstance(profile, ScoringProfile):
+        return profile
+    if isinstance(profile, dict):
+        return ScoringProfile(profile)
+
+    path = profile
+    if not os.path.exists(path):
+        for extension in ('.json', '.yaml', '.yml'):
+            candidate = os.path.join(PROFILE_DIR, f"{profile}{extension}")
+            if os.path.exists(candidate):
+                path = candidate
+                break
+        else:
+            raise ValueError(f"Scoring profile '{profile}' not found")
+
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("PyYAML is required to load YAML scoring profiles")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    spec.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return ScoringProfile(spec)
+
+def list_profiles():
+    """Names of the profiles available in PROFILE_DIR (plus the default)"""
+    names = ['default']
+    if os.path.isdir(PROFILE_DIR):
+        for filename in sorted(os.listdir(PROFILE_DIR)):
+            name, extension = os.path.splitext(filename)
+            if extension in ('.json', '.yaml', '.yml') and name not in names:
+                names.append(name)
+    return names
+
+def score_universe(close, volume=None, profile=None, bars=None):
+    """Latest score and prediction per symbol for a whole universe at once"""
+    compiled = load_profile(profile)
+    scores = compiled.score(close, volume, bars=bars)
+    latest = scores.ffill().iloc[-1]
+    return pd.DataFrame({
+        'score': latest,
+        'prediction': compiled.classify(latest.to_numpy()),
+    })
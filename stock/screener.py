@@ -0,0 +1,181 @@
+"""
+Stock screener over a columnar snapshot of the latest indicators
+
+The snapshot holds one NumPy array per column (one entry per symbol), built
+from the last row of each symbol's feature store. Common columns also keep a
+sorted index, so a range filter is two binary searches instead of a scan,
+and top-k selection uses argpartition instead of sorting every match.
+"""
+import threading
+import time
+import numpy as np
+import pandas as pd
+from stock.stockapi import CACHE_DURATION, DEFAULT_UNIVERSE, SECTORS
+from stock.stock_prediction import SCORING_PARAMS, price_deviation, score_latest, target_price
+from stock.feature_store import ensure_features
+from stock.relative_strength import RS_WINDOWS, latest_relative_strength
+
+SNAPSHOT_COLUMNS = (
+    'price', 'volume', 'rsi', 'score', 'target_price', 'sma_20', 'sma_50', 'sma_200',
+    'volume_ratio', 'return_1d', 'return_5d', 'return_20d',
+    'rs_rating', *(f'rs_{window}' for window in RS_WINDOWS),
+)
+
+# Columns with a sorted index for range filters
+INDEXED_COLUMNS = ('price', 'volume', 'rsi', 'score', 'rs_rating')
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+class Snapshot:
+    """Latest indicator values for a universe, stored column by column"""
+
+    def __init__(self, symbols, columns, sectors, predictions, universe=None):
+        self.universe = list(universe if universe is not None else symbols)
+        self.symbols = np.asarray(symbols, dtype=object)
+        self.columns = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+        self.sectors = np.asarray(sectors, dtype=object)
+        self.predictions = np.asarray(predictions, dtype=object)
+        self.created = time.time()
+
+        # NaNs sort to the end, so each index's valid entries are a prefix
+        self._order = {}
+        self._sorted = {}
+        for name in INDEXED_COLUMNS:
+            order = np.argsort(self.columns[name], kind='stable')
+            self._order[name] = order
+            self._sorted[name] = self.columns[name][order]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def range_mask(self, column, low=None, high=None):
+        """Boolean mask of symbols with low <= column <= high (None = open)"""
+        values = self.columns[column]
+        if column not in self._sorted:
+            mask = ~np.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            return mask
+
+        sorted_values = self._sorted[column]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        if high is None:
+            stop = len(sorted_values) - int(np.isnan(sorted_values).sum())
+        else:
+            stop = np.searchsorted(sorted_values, high, side='right')
+        mask = np.zeros(len(values), dtype=bool)
+        mask[self._order[column][start:stop]] = True
+        return mask
+
+    def query(self, filters=None, sectors=None, sort_by='score', top=None, descending=True):
+        """Symbols matching every filter, best first, as a list of row dicts
+
+        filters maps a column to a (low, high) range (either bound may be
+        None); sectors restricts to the given sector names. With `top` only
+        the best `top` rows by sort_by are returned.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, (low, high) in (filters or {}).items():
+            mask &= self.range_mask(column, low, high)
+        if sectors:
+            mask &= np.isin(self.sectors, list(sectors))
+
+        keys = self.columns[sort_by]
+        mask &= ~np.isnan(keys)
+        matches = np.flatnonzero(mask)
+        keys = -keys[matches] if descending else keys[matches]
+
+        if top is not None and top < len(matches):
+            best = np.argpartition(keys, top)[:top]
+            matches, keys = matches[best], keys[best]
+        matches = matches[np.argsort(keys, kind='stable')]
+        return [self.row(i) for i in matches]
+
+    def row(self, i):
+        values = {name: (None if np.isnan(column[i]) else float(column[i]))
+                  for name, column in self.columns.items()}
+        values.update(symbol=self.symbols[i], sector=self.sectors[i], prediction=self.predictions[i])
+        return values
+
+def build_snapshot(symbols=None, fetch_missing=False, params=None):
+    """Snapshot of the latest stored features for each symbol
+
+    Symbols without stored features are filled from the bar cache, and with
+    fetch_missing also from the network. Symbols with no data are left out.
+    """
+    p = dict(SCORING_PARAMS, **(params or {}))
+    universe = list(symbols or DEFAULT_UNIVERSE)
+    names, rows, deviations = [], [], []
+    for symbol in universe:
+        frame = ensure_features(symbol, fetch_missing)
+        if frame is None or frame.empty:
+            continue
+        names.append(symbol)
+        rows.append(np.asarray(frame.iloc[-1]))
+        closes = frame['close'].dropna()
+        deviations.append(price_deviation(symbol, closes.to_numpy(), closes.index)[0] if len(closes) else np.nan)
+
+    if not rows:
+        return Snapshot([], {name: [] for name in SNAPSHOT_COLUMNS}, [], [], universe)
+
+    latest = pd.DataFrame(np.vstack(rows), index=names, columns=frame.columns)
+    close = latest['close']
+    # Scored like predict_stock scores the same stored row
+    score, predictions, _ = score_latest(latest, p)
+
+    # The detail page's target rule, on the same regime-scaled deviation
+    sma_20 = latest['sma_20'].fillna(close).to_numpy()
+    target = target_price(predictions, close.to_numpy(), sma_20, deviations)
+
+    columns = {
+        'price': close.to_numpy(),
+        'volume': latest['volume'].to_numpy(),
+        'rsi': latest['rsi'].to_numpy(),
+        'score': score.to_numpy(),
+        'target_price': target,
+    }
+    # Percentiles against the screened universe (see relative_strength)
+    strength = latest_relative_strength(names).reindex(names)
+    for name in SNAPSHOT_COLUMNS:
+        if name not in columns:
+            source = strength if name.startswith('rs_') else latest
+            columns[name] = source[name].to_numpy() if name in source else np.full(len(names), np.nan)
+    sectors = [SECTORS.get(symbol, "Other") for symbol in names]
+    return Snapshot(names, columns, sectors, predictions, universe)
+
+def get_snapshot(symbols=None, max_age=CACHE_DURATION, fetch_missing=False):
+    """Shared snapshot, rebuilt when older than max_age or for a new universe"""
+    global _snapshot
+    symbols = list(symbols or DEFAULT_UNIVERSE)
+    with _snapshot_lock:
+        snapshot = _snapshot
+    if (snapshot is not None and time.time() - snapshot.created < max_age
+            and snapshot.universe == symbols):
+        return snapshot
+
+    snapshot = build_snapshot(symbols, fetch_missing)
+    with _snapshot_lock:
+        _snapshot = snapshot
+    return snapshot
+
+def screen(filters=None, sectors=None, sort_by='score', top=None, descending=True, symbols=None):
+    """Run a screener query against the shared snapshot (see Snapshot.query)
+
+    Example: screen({'rsi': (None, 35), 'volume': (1e6, None)}, sort_by='score', top=10)
+    """
+    return get_snapshot(symbols).query(filters, sectors, sort_by, top, descending)
+
+def clear_snapshot():
+    """Drop the shared snapshot (e.g. after new bars were fetched)"""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for row in screen({'score': (SCORING_PARAMS['buy_cutoff'], None)}, top=10):
+        print(f"{row['symbol']:<15} {row['sector']:<12} {row['price']:>10.2f} {row['score']:+.2f} {row['prediction']}")
+    print(f"Screened in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,37 @@
+"""
+The signed-in user, shared by every window
+
+Windows and database calls that act for "the user" read the user_id from
+here instead of assuming user 1. A process acts for PORTFOLIO_USER_ID (from
+the environment or .env, default 1) for its whole life; windows launched in
+a new process inherit it through the environment (see child_environment).
+There is no sign-in screen, so the user does not change while windows that
+captured it are open.
+"""
+import os
+
+DEFAULT_USER_ID = 1
+
+class Session:
+    """Current user context"""
+
+    def __init__(self, user_id=None, username=None):
+        self._user_id = user_id
+        self.username = username
+
+    @property
+    def user_id(self):
+        if self._user_id is None:
+            # Read on first use, after db_manager has loaded .env
+            self._user_id = int(os.getenv("PORTFOLIO_USER_ID", DEFAULT_USER_ID))
+        return self._user_id
+
+    def child_environment(self):
+        """Environment for a subprocess that should act for the same user"""
+        return dict(os.environ, PORTFOLIO_USER_ID=str(self.user_id))
+
+# Process-wide session
+session = Session()
+
+def current_user_id():
+    return session.user_id
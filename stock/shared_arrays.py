@@ -0,0 +1,67 @@
+"""
+Shared-memory numpy matrices for process-pool workers
+
+The parent copies a matrix into a named shared memory block once; workers
+attach to it by name instead of receiving a pickled copy with every task.
+"""
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+# Per-worker state set up by init_worker
+worker_state = {}
+
+class SharedMatrix:
+    """A numpy array backed by multiprocessing.shared_memory"""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        self.array[...] = array
+
+    @property
+    def spec(self):
+        """Picklable handle that workers pass to attach()"""
+        return (self.shm.name, self.shape, self.dtype)
+
+    def release(self):
+        """Free the shared block (call once, from the creating process)"""
+        self.array = None
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+def attach(spec):
+    """Attach to a SharedMatrix from a worker; returns (handle, read-only array)
+
+    Keep the handle alive for as long as the array is used.
+    """
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
+
+def init_worker(specs, index, columns):
+    """Process-pool initializer: attach {name: spec} matrices once per worker
+
+    They are kept in worker_state['matrices'] as read-only DataFrames
+    (dates x symbols) sharing the parent's memory.
+    """
+    worker_state['handles'] = []
+    worker_state['matrices'] = {}
+    for name, spec in specs.items():
+        shm, values = attach(spec)
+        worker_state['handles'].append(shm)
+        worker_state['matrices'][name] = pd.DataFrame(values, index=index, columns=columns, copy=False)
@@ -1,14 +1,39 @@
+import threading
 import numpy as np
 import pandas as pd
-from stock.stockapi import fetch_stock_data
+from stock.stockapi import fetch_stock_data, load_cached_bars, load_cached_data
+from stock import indicators
 
-def calculate_bollinger_bands(prices, window=20):
+# Weights, cutoffs and windows used by predict_stock and its vectorized
+# counterpart score_matrix (the backtester replays these exact rules)
+SCORING_PARAMS = {
+    'bb_window': 20,
+    'bb_std': 2,
+    'bb_weight': 0.3,
+    'rsi_window': 14,
+    'rsi_oversold': 30,
+    'rsi_overbought': 70,
+    'rsi_weight': 0.25,
+    'ma_fast': 50,
+    'ma_slow': 200,
+    'ma_weight': 0.25,
+    'volume_window': 10,
+    'volume_multiplier': 1.5,
+    'volume_weight': 0.2,
+    'buy_cutoff': 0.15,
+    'strong_cutoff': 0.5,
+}
+
+# Target price offset, in price standard deviations, per prediction
+TARGET_OFFSETS = {"Strong Buy": 0.7, "Buy": 0.3, "Sell": -0.3, "Strong Sell": -0.7}
+
+# Closes the target band's standard deviation is measured over (about the
+# one month of bars predict_stock is given)
+TARGET_LOOKBACK = 22
+
+def calculate_bollinger_bands(prices, window=20, num_std=2):
     """Calculate Bollinger Bands for a price series"""
-    prices_series = pd.Series(prices)
-    sma = prices_series.rolling(window=window).mean()
-    std = prices_series.rolling(window=window).std()
-    upper_band = sma + (2 * std)
-    lower_band = sma - (2 * std)
+    upper_band, lower_band = indicators.bollinger_bands(pd.Series(prices), window=window, num_std=num_std)
     
     if len(upper_band) > 0 and len(lower_band) > 0:
         return upper_band.iloc[-1], lower_band.iloc[-1]
@@ -17,25 +42,192 @@ def calculate_bollinger_bands(prices, window=20):
 def calculate_rsi(prices, window=14):
     """Calculate RSI for a price series"""
     prices_series = pd.Series(prices)
-    delta = prices_series.diff()
-    
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-  
-    avg_gain = gain.rolling(window=window).mean()
-    avg_loss = loss.rolling(window=window).mean()
-    
-    
-    rs = avg_gain / avg_loss
-    
-    rsi = 100 - (100 / (1 + rs))
+    rsi = indicators.rsi(prices_series, window=window)
     
     if len(rsi) > 0:
         return round(rsi.iloc[-1], 2)
     return 50  
 
-def predict_stock(symbol="RELIANCE.NS"):
-    """Generate stock prediction based on technical indicators"""
+def score_components(close, volume=None, params=None):
+    """Per-bar score contribution of each rule over the full history
+
+    close and volume are Series or DataFrames (one column per symbol).
+    Returns a dict of the same shape per component: 'bollinger', 'rsi',
+    'ma_cross' and 'volume'.
+    """
+    p = dict(SCORING_PARAMS, **(params or {}))
+
+    upper_band, lower_band = indicators.bollinger_bands(close, p['bb_window'], p['bb_std'])
+    rsi_values = indicators.rsi(close, p['rsi_window'])
+    sma_fast = indicators.sma(close, p['ma_fast'])
+    sma_slow = indicators.sma(close, p['ma_slow'])
+    ratio = indicators.volume_ratio(volume, p['volume_window']) if volume is not None else None
+
+    return components_from_indicators(close, upper_band, lower_band, rsi_values,
+                                      sma_fast, sma_slow, ratio, p)
+
+def components_from_indicators(close, upper_band, lower_band, rsi_values,
+                               sma_fast, sma_slow, volume_ratio=None, params=None):
+    """Apply the scoring rules to precomputed indicators (e.g. the feature store)"""
+    p = dict(SCORING_PARAMS, **(params or {}))
+
+    bollinger = (close <= lower_band) * p['bb_weight'] - (close >= upper_band) * p['bb_weight']
+    # predict_stock checks the lower band first, so a bar touching both counts as bullish
+    bollinger = bollinger.where(~(close <= lower_band), p['bb_weight'])
+
+    rsi_score = (rsi_values < p['rsi_oversold']) * p['rsi_weight'] - (rsi_values > p['rsi_overbought']) * p['rsi_weight']
+
+    # Missing SMAs fall back to the current price, as in predict_stock
+    sma_fast = sma_fast.fillna(close)
+    sma_slow = sma_slow.fillna(close)
+    ma_cross = (sma_fast > sma_slow) * p['ma_weight'] - (sma_fast < sma_slow) * p['ma_weight']
+
+    if volume_ratio is not None:
+        volume_score = (volume_ratio > p['volume_multiplier']) * p['volume_weight']
+    else:
+        volume_score = close * 0.0
+
+    return {
+        'bollinger': bollinger.astype(float),
+        'rsi': rsi_score.astype(float),
+        'ma_cross': ma_cross.astype(float),
+        'volume': volume_score.astype(float),
+    }
+
+# Latest-bar inputs of the rules, named as in the feature store
+LATEST_COLUMNS = ('close', 'bb_upper', 'bb_lower', 'rsi', 'sma_50', 'sma_200', 'volume_ratio')
+
+def score_latest(latest, params=None):
+    """Score, prediction and rule contributions of the latest bar
+
+    latest is a DataFrame with one row per symbol, or a dict for a single
+    symbol, holding the LATEST_COLUMNS (None or NaN when unknown).
+    predict_stock and the screener both score through here, from the same
+    stored feature row whenever the store is up to date, so the detail
+    page and the Top Buy/Sell tab agree. Returns (score Series,
+    predictions array, dict of component Series).
+    """
+    if isinstance(latest, dict):
+        latest = pd.DataFrame([{name: latest.get(name) for name in LATEST_COLUMNS}], dtype=float)
+    close = latest['close']
+    components = components_from_indicators(close, latest['bb_upper'], latest['bb_lower'], latest['rsi'],
+                                            latest['sma_50'], latest['sma_200'], latest['volume_ratio'], params)
+    score = sum(components.values()).where(close.notna())
+    return score, classify_scores(score, params), components
+
+def score_matrix(close, volume=None, params=None):
+    """Vectorized predict_stock score for every bar (and every symbol)"""
+    components = score_components(close, volume, params)
+    score = components['bollinger'] + components['rsi'] + components['ma_cross'] + components['volume']
+    return score.where(close.notna())
+
+def classify_scores(scores, params=None):
+    """Map scores to prediction labels (same cutoffs as predict_stock)"""
+    p = dict(SCORING_PARAMS, **(params or {}))
+    values = np.asarray(scores, dtype=float)
+    labels = np.select(
+        [values >= p['strong_cutoff'], values >= p['buy_cutoff'],
+         values > -p['buy_cutoff'], values > -p['strong_cutoff']],
+        ["Strong Buy", "Buy", "Hold", "Sell"],
+        default="Strong Sell"
+    )
+    return np.where(np.isnan(values), None, labels)
+
+# (symbol, params) -> (last bar date, bar count, history DataFrame)
+_history_cache = {}
+_history_lock = threading.Lock()
+
+def score_history(symbol, params=None, dates=None):
+    """Per-bar score, prediction and rule contributions for one symbol
+
+    Computed in one vectorized pass over the longest cached bar history
+    (never fetched: the chart calls this on the UI thread) and cached until
+    a new bar arrives. Returns a DataFrame indexed by date with 'bollinger',
+    'rsi', 'ma_cross', 'volume', 'score', 'prediction' and 'close' columns,
+    or None when no bars are cached. With dates (e.g. a chart's x values)
+    the rows are aligned to them, so bars missing from the history come
+    back with NaN values and a None prediction.
+    """
+    bars = load_cached_bars(symbol)
+    if bars is None or bars.empty:
+        return None
+
+    key = (symbol, tuple(sorted((params or {}).items())))
+    with _history_lock:
+        entry = _history_cache.get(key)
+    if entry is not None and entry[0] == bars.index[-1] and entry[1] == len(bars):
+        history = entry[2]
+    else:
+        close = bars['Close']
+        components = score_components(close, bars.get('Volume'), params)
+        history = pd.DataFrame(components)
+        history['score'] = sum(components.values()).where(close.notna())
+        history['prediction'] = classify_scores(history['score'], params)
+        history['close'] = close
+        with _history_lock:
+            _history_cache[key] = (bars.index[-1], len(bars), history)
+
+    if dates is not None:
+        history = history.reindex(pd.DatetimeIndex(pd.to_datetime([str(d)[:10] for d in dates])))
+        # Bars missing from the history have no prediction, as for NaN scores
+        history['prediction'] = history['prediction'].astype(object).where(history['prediction'].notna(), None)
+    return history
+
+def price_deviation(symbol, closes, dates=None):
+    """Price standard deviation for the target band, and the volatility profile
+
+    The deviation of the last TARGET_LOOKBACK closes, widened or narrowed
+    by the current volatility regime when closes holds enough history for
+    one (see volatility.volatility_profile). Returns (deviation, profile).
+    """
+    from stock.volatility import volatility_profile
+    closes = np.asarray(closes, dtype=float)
+    recent = pd.Series(closes[-TARGET_LOOKBACK:])
+    deviation = recent.std() if recent.count() > 1 else (closes[-1] if len(closes) else 0.0) * 0.05
+    profile = volatility_profile(symbol, closes, dates)
+    if profile:
+        deviation *= profile['ratio']
+    return deviation, profile
+
+def _with_cached_history(symbol, prices, dates):
+    """prices (and dates) preceded by the older cached closes, without any fetch
+
+    The volatility regime needs far more bars than the 1mo payload holds.
+    The older closes are only used when the cached history reaches the
+    payload, so no gap is bridged.
+    """
+    bars = load_cached_bars(symbol)
+    if bars is None or 'Close' not in bars or not dates or len(dates) != len(prices):
+        return prices, dates
+    first = pd.Timestamp(str(dates[0])[:10])
+    if bars.index[-1] < first:
+        return prices, dates
+    older = bars['Close'][bars.index < first].dropna()
+    return (list(older.to_numpy()) + list(prices),
+            [d.strftime('%Y-%m-%d') for d in older.index] + [str(d)[:10] for d in dates])
+
+def target_price(prediction, price, sma_20, deviation):
+    """SMA 20 shifted by a share of the deviation, or the current price for a Hold
+
+    Takes one prediction, or arrays with one entry per symbol.
+    """
+    offsets = np.array([TARGET_OFFSETS.get(label, 0.0) for label in np.ravel(prediction)])
+    target = np.where(offsets == 0.0, price, np.asarray(sma_20, dtype=float) + offsets * np.asarray(deviation, dtype=float))
+    return float(target[0]) if np.ndim(prediction) == 0 else target
+
+def predict_stock(symbol="RELIANCE.NS", probabilistic=False, mc_options=None):
+    """Generate stock prediction based on technical indicators
+
+    With probabilistic=True the result also carries a Monte Carlo
+    'target_distribution' (see monte_carlo.target_distribution); mc_options
+    are passed through to it. The target band and the simulated paths are
+    scaled by the current volatility regime (see volatility), reported as
+    'volatility_regime'. When a trained model exists (see ml_predictor)
+    its probability of a rise is added as 'ml_probability', and once a
+    calibration table is built (see calibration) the historical hit rate of
+    similar signals as 'confidence'.
+    """
+    p = SCORING_PARAMS
     data = fetch_stock_data(symbol)
     if data is None:
         return None
@@ -44,11 +236,10 @@ def predict_stock(symbol="RELIANCE.NS"):
     if not prices:
         return None
         
-    volumes = data.get("volumes", [])
+    # fetch_stock_data keeps the daily volumes with the other OHLC columns
+    volumes = data.get("volumes") or data.get("ohlc_data", {}).get("Volume", [])
     
    
-    prices_series = pd.Series(prices)
-    
     current_price = data.get('price', 0)
     if current_price is None:
         current_price = 0
@@ -66,71 +257,74 @@ def predict_stock(symbol="RELIANCE.NS"):
         sma_200 = current_price
     
     
-    rsi = data.get('rsi')
-    if rsi is None:
-        rsi = calculate_rsi(prices)
-    
-    
-    upper_band, lower_band = calculate_bollinger_bands(prices)
-    if upper_band is None or lower_band is None:
-        upper_band = sma_20 * 1.05  
-        lower_band = sma_20 * 0.95  
-    
-    score = 0
-    
-    if current_price <= lower_band:
-        score += 0.3  
-    elif current_price >= upper_band:
-        score -= 0.3  
-    
-
-    if rsi < 30:
-        score += 0.25  
-    elif rsi > 70:
-        score -= 0.25  
-    
-    if sma_50 > sma_200:
-        score += 0.25 
-    elif sma_50 < sma_200:
-        score -= 0.25  
-    
-    if volumes and len(volumes) > 10:
-        avg_volume = sum(volumes[-10:]) / 10
-        latest_volume = volumes[-1]
-        if latest_volume > (1.5 * avg_volume):
-            score += 0.2  # Bullish - high volume
-    
-
-    if score >= 0.5:
-        prediction = "Strong Buy"
-    elif score >= 0.15:
-        prediction = "Buy"
-    elif score > -0.15:
-        prediction = "Hold"
-    elif score > -0.5:
-        prediction = "Sell"
+    # Score the stored feature row when the store has the payload's last
+    # bar: the screener scores the same row (see score_latest)
+    from stock.feature_store import latest_features
+    features = latest_features(symbol)
+    dates = data.get("historical_dates") or []
+    if features and dates and str(dates[-1])[:10] == features['date'] and features['bb_upper'] is not None:
+        latest = features
     else:
-        prediction = "Strong Sell"
-    
+        rsi = data.get('rsi')
+        if rsi is None:
+            rsi = calculate_rsi(prices, window=p['rsi_window'])
+        upper_band, lower_band = calculate_bollinger_bands(prices, window=p['bb_window'], num_std=p['bb_std'])
+        if upper_band is None or lower_band is None:
+            upper_band = sma_20 * 1.05
+            lower_band = sma_20 * 0.95
+        window = p['volume_window']
+        average_volume = sum(volumes[-window:]) / window if volumes and len(volumes) > window else 0
+        latest = {
+            'close': current_price, 'bb_upper': upper_band, 'bb_lower': lower_band, 'rsi': rsi,
+            'sma_50': sma_50, 'sma_200': sma_200,
+            'volume_ratio': volumes[-1] / average_volume if average_volume else None,
+        }
+
+    scores, predictions, components = score_latest(latest, p)
+    score, prediction = float(scores.iloc[0]), predictions[0]
+    # Direction of each rule that fired, for the calibration lookup
+    signals = {name: int(np.sign(values.iloc[0])) for name, values in components.items() if values.iloc[0]}
 
-    price_std = prices_series.std() if len(prices_series) > 1 else current_price * 0.05
-
-    if prediction == "Strong Buy":
-        target_price = sma_20 + (0.7 * price_std)
-    elif prediction == "Buy":
-        target_price = sma_20 + (0.3 * price_std)
-    elif prediction == "Hold":
-        target_price = current_price
-    elif prediction == "Sell":
-        target_price = sma_20 - (0.3 * price_std)
-    else: 
-        target_price = sma_20 - (0.7 * price_std)
+    # Widen or narrow the band with the current volatility regime, fitted
+    # over the longest cached history
+    closes, close_dates = _with_cached_history(symbol, prices, dates)
+    price_std, volatility = price_deviation(symbol, closes, close_dates or None)
+    target = target_price(prediction, current_price, sma_20, price_std)
     
-    return {
+    result = {
         "prediction": prediction,
         "score": score,
-        "target_price": target_price
+        "target_price": target,
+        "volatility_regime": volatility['regime'] if volatility else None
     }
+    
+    if probabilistic:
+        from stock.monte_carlo import target_distribution
+        # Prefer a year of cached closes for the return distribution
+        history = load_cached_data(symbol, "1y")
+        history_prices = history.get("historical_prices") if history else None
+        if not history_prices or len(history_prices) < len(prices):
+            history_prices = prices
+        history_prices = list(history_prices[:-1]) + [current_price or history_prices[-1]]
+        options = dict(mc_options or {})
+        if volatility:
+            options.setdefault('volatility_scale', volatility['ratio'])
+        result["target_distribution"] = target_distribution(history_prices, target, **options)
+    
+    # Hit rate of similar past signals, from the precomputed table. The
+    # table's rule combinations come from the stored indicators, so a row
+    # built from the short payload is only matched on its prediction bucket
+    from stock.calibration import confidence
+    calibrated = confidence(symbol, prediction, signals if latest is features else None)
+    if calibrated is not None:
+        result["confidence"] = calibrated
+    
+    from stock.ml_predictor import predict_universe
+    ml_probability = predict_universe([symbol]).get(symbol)
+    if ml_probability is not None:
+        result["ml_probability"] = ml_probability
+    
+    return result
 
 if __name__ == "__main__":
     result = predict_stock("RELIANCE.NS")
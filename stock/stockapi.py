@@ -12,6 +12,38 @@ from datetime import datetime, timedelta
 CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache')
 CACHE_DURATION = 600  # Cache validity in seconds (10 minutes)
 
+# Periods the bar cache may hold for a symbol, longest first
+CACHED_PERIODS = ("5y", "1y", "6mo", "3mo", "1mo")
+
+# How far back from its last bar each period reaches
+PERIOD_OFFSETS = {
+    "5y": pd.DateOffset(years=5), "1y": pd.DateOffset(years=1),
+    "6mo": pd.DateOffset(months=6), "3mo": pd.DateOffset(months=3), "1mo": pd.DateOffset(months=1),
+}
+
+# Symbols used by batch analytics when no explicit universe is given
+DEFAULT_UNIVERSE = [
+    "RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS", "ICICIBANK.NS",
+    "HINDUNILVR.NS", "ITC.NS", "SBIN.NS", "BHARTIARTL.NS", "BAJFINANCE.NS",
+    "KOTAKBANK.NS", "AXISBANK.NS", "LT.NS", "MARUTI.NS", "TATASTEEL.NS",
+    "HDFC.NS", "WIPRO.NS", "ONGC.NS", "ADANIENT.NS", "SUNPHARMA.NS"
+]
+
+# Sector of each known symbol (anything else is screened as "Other")
+SECTORS = {
+    "RELIANCE.NS": "Energy", "ONGC.NS": "Energy",
+    "TCS.NS": "IT", "INFY.NS": "IT", "WIPRO.NS": "IT",
+    "HDFCBANK.NS": "Financials", "ICICIBANK.NS": "Financials", "SBIN.NS": "Financials",
+    "BAJFINANCE.NS": "Financials", "KOTAKBANK.NS": "Financials", "AXISBANK.NS": "Financials",
+    "HDFC.NS": "Financials",
+    "HINDUNILVR.NS": "Consumer", "ITC.NS": "Consumer",
+    "BHARTIARTL.NS": "Telecom",
+    "LT.NS": "Industrials", "ADANIENT.NS": "Industrials",
+    "MARUTI.NS": "Auto",
+    "TATASTEEL.NS": "Materials",
+    "SUNPHARMA.NS": "Healthcare",
+}
+
 # Create cache directory if it doesn't exist
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
@@ -188,6 +220,13 @@ def fetch_stock_data(symbol, period="1mo", validate_only=False):
         # Cache the result for future use
         _cache_data(symbol, period, result)
         
+        # Keep the stored indicator columns in step with the new bars
+        try:
+            from stock.feature_store import update_features
+            update_features(symbol, to_ohlcv_frame(result))
+        except Exception as e:
+            print(f"Error updating features for {symbol}: {e}")
+        
         return result
         
     except Exception as e:
@@ -279,6 +318,98 @@ def generate_fallback_data(symbol, period="1mo"):
     
     return result
 
+def load_cached_data(symbol, period="5y"):
+    """Load cached stock data regardless of age (for offline analysis)"""
+    cache_key = f"{symbol}_{period}"
+
+    with _cache_lock:
+        if cache_key in _memory_cache:
+            return _memory_cache[cache_key]['data']
+
+    cache_path = _get_cache_path(symbol, period)
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with open(cache_path, 'r') as f:
+            cache_entry = json.load(f)
+        data = cache_entry.get('data')
+        if not data or 'ohlc_data' not in data:
+            return None
+        return data
+    except Exception as e:
+        print(f"Error reading cache for {symbol}: {e}")
+        return None
+
+def to_ohlcv_frame(data):
+    """Convert a fetch_stock_data payload into a daily OHLCV DataFrame"""
+    if not data or 'ohlc_data' not in data:
+        return None
+
+    ohlc = data['ohlc_data']
+    # Dates are stored as strings, sometimes with a time and UTC offset
+    index = pd.DatetimeIndex(pd.to_datetime([str(d)[:10] for d in ohlc['index']]))
+    columns = {}
+    for field in ('Open', 'High', 'Low', 'Close', 'Volume'):
+        values = ohlc.get(field)
+        if values is not None and len(values) == len(index):
+            columns[field] = np.asarray(values, dtype=float)
+    frame = pd.DataFrame(columns, index=index)
+    return frame[~frame.index.duplicated(keep='last')]
+
+def load_cached_bars(symbol):
+    """Daily OHLCV bars from every cached period of a symbol, without any fetch
+
+    Starts from the longest cached history and appends the newer bars of
+    shorter, more recently fetched periods when they continue it without a
+    gap. Returns None when nothing is cached.
+    """
+    bars = None
+    for period in CACHED_PERIODS:
+        frame = to_ohlcv_frame(load_cached_data(symbol, period))
+        if frame is None or frame.empty:
+            continue
+        if bars is None:
+            bars = frame
+        elif frame.index[0] <= bars.index[-1] < frame.index[-1]:
+            bars = pd.concat([bars, frame[frame.index > bars.index[-1]]])
+    return bars
+
+def load_ohlcv_matrices(symbols, period="5y", fetch_missing=False):
+    """Build date-aligned OHLCV matrices (dates x symbols) from cached bars
+
+    Returns a dict of DataFrames keyed by 'Open', 'High', 'Low', 'Close' and
+    'Volume'. With period=None each symbol's longest cached history is used
+    (see load_cached_bars). Symbols without cached bars are skipped unless
+    fetch_missing is set, in which case fetch_stock_data is used to fill the
+    cache first.
+    """
+    frames = {field: {} for field in ('Open', 'High', 'Low', 'Close', 'Volume')}
+
+    for symbol in symbols:
+        if period is None:
+            bars = load_cached_bars(symbol)
+            if bars is None and fetch_missing:
+                bars = to_ohlcv_frame(fetch_stock_data(symbol, CACHED_PERIODS[0]))
+        else:
+            data = load_cached_data(symbol, period)
+            if data is None and fetch_missing:
+                data = fetch_stock_data(symbol, period)
+            bars = to_ohlcv_frame(data)
+        if bars is None:
+            continue
+        for field in frames:
+            if field in bars:
+                frames[field][symbol] = bars[field]
+
+    matrices = {}
+    for field, columns in frames.items():
+        if columns:
+            matrices[field] = pd.DataFrame(columns).sort_index()
+        else:
+            matrices[field] = pd.DataFrame(dtype=float)
+    return matrices
+
 def clear_cache():
     """Clear all cached stock data"""
     with _cache_lock:
@@ -0,0 +1,104 @@
+"""
+Multi-timeframe indicators derived from one daily base series
+
+Weekly and monthly bars are aggregated from the cached daily bars instead of
+being fetched separately; nothing here touches the network. Aggregations
+are cached per symbol and extended incrementally: when new daily bars
+arrive only the last (open) period is re-aggregated.
+"""
+import threading
+import pandas as pd
+from stock import indicators
+from stock.stockapi import load_cached_bars
+from stock.stock_prediction import score_matrix, classify_scores
+
+TIMEFRAMES = ('daily', 'weekly', 'monthly')
+
+# (symbol, timeframe) -> {'last_daily': Timestamp, 'bars': DataFrame}
+_resample_cache = {}
+_resample_lock = threading.Lock()
+
+def load_daily_bars(symbol):
+    """Daily OHLCV bars of the longest cached history (None when nothing is cached)
+
+    Called from the UI thread, so it never fetches: a 5y history (long
+    enough for monthly RSI and SMA 50) is only there once something else
+    fetched it.
+    """
+    return load_cached_bars(symbol)
+
+def resampled_bars(symbol, timeframe, daily=None):
+    """Weekly/monthly bars for a symbol, re-aggregating only what changed"""
+    if daily is None:
+        daily = load_daily_bars(symbol)
+    if daily is None or daily.empty or timeframe == 'daily':
+        return daily
+
+    key = (symbol, timeframe)
+    last_daily = daily.index[-1]
+    with _resample_lock:
+        entry = _resample_cache.get(key)
+
+    first_daily = daily.index[0]
+    if entry is not None and entry['first_daily'] == first_daily and entry['last_daily'] == last_daily:
+        return entry['bars']
+
+    if entry is not None and entry['first_daily'] <= first_daily and entry['last_daily'] <= last_daily:
+        # Only the first period (the base window may have rolled forward) and
+        # the last, still-open period can differ; everything between is reused
+        cached = entry['bars']
+        keys = indicators.period_keys(cached.index, timeframe)
+        daily_keys = indicators.period_keys(daily.index, timeframe)
+        head_key, tail_key = daily_keys[0], keys[-1]
+        middle = cached[(keys > head_key) & (keys < tail_key)]
+        head = indicators.resample_ohlcv(daily[daily_keys == head_key], timeframe)
+        tail = indicators.resample_ohlcv(daily[(daily_keys >= tail_key) & (daily_keys > head_key)], timeframe)
+        bars = pd.concat([head, middle, tail])
+    else:
+        bars = indicators.resample_ohlcv(daily, timeframe)
+
+    with _resample_lock:
+        _resample_cache[key] = {'first_daily': first_daily, 'last_daily': last_daily, 'bars': bars}
+    return bars
+
+def summarize_bars(bars, params=None):
+    """Latest RSI, SMAs, score and prediction for one timeframe's bars"""
+    if bars is None or bars.empty:
+        return None
+
+    close = bars['Close']
+    rsi = indicators.rsi(close, 14).iloc[-1]
+    sma_20 = indicators.sma(close, 20).iloc[-1]
+    sma_50 = indicators.sma(close, 50).iloc[-1]
+    score = score_matrix(close, bars['Volume'], params).iloc[-1]
+
+    return {
+        'date': str(bars.index[-1].date()),
+        'close': float(close.iloc[-1]),
+        'rsi': None if pd.isna(rsi) else float(rsi),
+        'sma_20': None if pd.isna(sma_20) else float(sma_20),
+        'sma_50': None if pd.isna(sma_50) else float(sma_50),
+        'bars': len(bars),
+        'score': None if pd.isna(score) else float(score),
+        'prediction': classify_scores([score], params)[0],
+    }
+
+def timeframe_indicators(symbol, timeframes=TIMEFRAMES, params=None):
+    """Indicators for each timeframe from a single daily series
+
+    Returns {timeframe: summary} (see summarize_bars), or None when no daily
+    bars are available.
+    """
+    daily = load_daily_bars(symbol)
+    if daily is None or daily.empty:
+        return None
+    return {timeframe: summarize_bars(resampled_bars(symbol, timeframe, daily), params)
+            for timeframe in timeframes}
+
+def clear_timeframe_cache():
+    """Drop all cached aggregations"""
+    with _resample_lock:
+        _resample_cache.clear()
+
+if __name__ == "__main__":
+    print(timeframe_indicators("RELIANCE.NS"))
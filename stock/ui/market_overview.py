@@ -8,7 +8,8 @@ from stock.ui.market_widgets import MarketSummaryWidget
 from stock.ui.delegates import StockTableDelegate
 from stock.models.utils import format_large_number
 from stock.stockapi import fetch_stock_data
-from stock.stock_prediction import predict_stock
+from stock.stock_prediction import predict_stock, SCORING_PARAMS
+from stock.screener import get_snapshot
 from stock.ui.stock_chart import StockChart
 
 class MarketOverviewPage(QWidget):
@@ -455,30 +456,29 @@ class MarketOverviewPage(QWidget):
     def get_top_recommendation(self, recommendation_type="buy"):
         """Get the top buy or sell recommendation"""
         try:
-            # Use your top stocks list from the existing code
-            stock_list = self.nifty_stocks
+            snapshot = get_snapshot(self.nifty_stocks, fetch_missing=True)
+            cutoff = SCORING_PARAMS['buy_cutoff']
             
-            results = []
-            for symbol in stock_list[:15]:  # Check the first 15 stocks
-                data = fetch_stock_data(symbol)
-                if data:
-                    prediction = predict_stock(symbol)
-                    if prediction:
-                        data['prediction'] = prediction
-                        score = prediction['score']
-                        
-                        if recommendation_type == "buy" and score > 0.15:
-                            results.append((symbol, data))
-                        elif recommendation_type == "sell" and score < -0.15:
-                            results.append((symbol, data))
-            
-            # Sort by score (absolute value for sell recommendations)
             if recommendation_type == "buy":
-                results.sort(key=lambda x: x[1]['prediction']['score'], reverse=True)
+                rows = snapshot.query({'score': (cutoff, None)}, sort_by='score', top=1)
             else:
-                results.sort(key=lambda x: abs(x[1]['prediction']['score']), reverse=True)
-            
-            return results[0] if results else None
+                rows = snapshot.query({'score': (None, -cutoff)}, sort_by='score', top=1, descending=False)
+            # Scores right at the cutoff are not recommended (query ranges include it)
+            rows = [row for row in rows if abs(row['score']) > cutoff]
+            if not rows:
+                return None
+            
+            # Only the winner needs its full price history for the mini chart
+            row = rows[0]
+            data = fetch_stock_data(row['symbol'])
+            if not data:
+                return None
+            data['prediction'] = {
+                'prediction': row['prediction'],
+                'score': row['score'],
+                'target_price': row['target_price'],
+            }
+            return row['symbol'], data
         
         except Exception as e:
             print(f"Error getting recommendations: {e}")
@@ -531,9 +531,6 @@ class MarketOverviewPage(QWidget):
     def populate_recommendation_table(self, table, table_type):
         """Populate the recommendation table with data"""
         try:
-            stock_list = self.nifty_stocks
-            results = []
-            
             # Show loading indicator
             table.setRowCount(1)
             loading_item = QTableWidgetItem("Loading recommendations...")
@@ -542,34 +539,23 @@ class MarketOverviewPage(QWidget):
             table.setItem(0, 0, loading_item)
             QApplication.processEvents()
             
-            # Process stocks for recommendations
-            for symbol in stock_list[:30]:  # Check top 30 stocks
-                data = fetch_stock_data(symbol)
-                if data:
-                    prediction = predict_stock(symbol)
-                    if prediction:
-                        prediction_type = prediction['prediction']
-                        score = prediction['score']
-                        
-                        if (table_type == "BUY" and score > 0.15) or \
-                           (table_type == "SELL" and score < -0.15):
-                            results.append((symbol, data, prediction))
-            
-            # Sort by score
+            snapshot = get_snapshot(self.nifty_stocks, fetch_missing=True)
+            cutoff = SCORING_PARAMS['buy_cutoff']
             if table_type == "BUY":
-                results.sort(key=lambda x: x[2]['score'], reverse=True)
+                results = snapshot.query({'score': (cutoff, None)}, sort_by='score', top=10)
             else:
-                results.sort(key=lambda x: x[2]['score'])
-            
-            # Take top 10
-            results = results[:10]
+                results = snapshot.query({'score': (None, -cutoff)}, sort_by='score', top=10, descending=False)
+            # Scores right at the cutoff are not recommended (query ranges include it)
+            results = [row for row in results if abs(row['score']) > cutoff]
             
             # Clear loading indicator
             table.clearSpans()
             table.setRowCount(len(results))
             
             # Fill the table
-            for row, (symbol, data, prediction) in enumerate(results):
+            for row, prediction in enumerate(results):
+                symbol = prediction['symbol']
+                
                 # Symbol
                 symbol_item = QTableWidgetItem(symbol)
                 table.setItem(row, 0, symbol_item)
@@ -580,7 +566,7 @@ class MarketOverviewPage(QWidget):
                 table.setItem(row, 1, name_item)
                 
                 # Price
-                price = data.get('price', 0)
+                price = prediction['price']
                 price_item = QTableWidgetItem(f"₹{price:.2f}")
                 price_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
                 table.setItem(row, 2, price_item)
@@ -135,16 +135,11 @@ class MarketSummaryWidget(QFrame):
                 self.market_status.setText("Market Status: Closed")
                 self.market_status.setStyleSheet("color: #ff5252; font-weight: bold;")
             
-            # Market index symbols - should be replaced with actual index symbols when available
-            # For now, we'll calculate indices based on baskets of stocks
-            nifty_stocks = ["RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS", "ICICIBANK.NS"]
-            sensex_stocks = ["HDFCBANK.NS", "INFY.NS", "ITC.NS", "KOTAKBANK.NS", "AXISBANK.NS"]
-            bank_stocks = ["HDFCBANK.NS", "SBIN.NS", "ICICIBANK.NS", "KOTAKBANK.NS", "AXISBANK.NS"]
-            
-            # Calculate index values based on stock performance
-            self.update_index_from_stocks("NIFTY 50", nifty_stocks, self.nifty_value)
-            self.update_index_from_stocks("SENSEX", sensex_stocks, self.sensex_value)
-            self.update_index_from_stocks("NIFTY BANK", bank_stocks, self.nifty_bank_value)
+            # Index values are approximated by equal-weight baskets of stocks
+            from stock.relative_strength import INDEX_BASKETS
+            self.update_index_from_stocks("NIFTY 50", INDEX_BASKETS["NIFTY 50"], self.nifty_value)
+            self.update_index_from_stocks("SENSEX", INDEX_BASKETS["SENSEX"], self.sensex_value)
+            self.update_index_from_stocks("NIFTY BANK", INDEX_BASKETS["NIFTY BANK"], self.nifty_bank_value)
             
             # List of all top Indian stocks to analyze for sentiment
             top_stocks = [
@@ -167,22 +162,14 @@ class MarketSummaryWidget(QFrame):
     def update_index_from_stocks(self, index_name, stocks, label_widget):
         """Calculate and update index value based on a basket of stocks"""
         try:
-            from stock.stockapi import fetch_stock_data
-            
-            prices_change = []
+            from stock.relative_strength import basket_performance
             
-            for symbol in stocks:
-                data = fetch_stock_data(symbol)
-                if data and 'historical_prices' in data and len(data['historical_prices']) > 1:
-                    current = data['historical_prices'][-1]
-                    previous = data['historical_prices'][-2]
-                    if previous > 0:  # Avoid division by zero
-                        change_pct = ((current - previous) / previous) * 100
-                        prices_change.append(change_pct)
+            # One matrix operation over the stored closes of the basket,
+            # after the quotes have brought in today's bar
+            performance = basket_performance(stocks, fetch_missing=True, refresh=True)
             
-            if prices_change:
-                # Average percentage change across stocks
-                avg_change = sum(prices_change) / len(prices_change)
+            if 1 in performance:
+                avg_change = performance[1] * 100
                 
                 # Format with proper sign and color
                 change_text = f"{'+' if avg_change >= 0 else ''}{avg_change:.2f}%"
@@ -198,6 +185,8 @@ class MarketSummaryWidget(QFrame):
                 value = f"{base:,.2f} ({change_text})"
                 
                 label_widget.setText(value)
+                label_widget.setToolTip("\n".join(
+                    f"{window}-day: {change:+.2%}" for window, change in performance.items()))
                 
                 # Set color based on change direction
                 if avg_change >= 0:
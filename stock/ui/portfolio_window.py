@@ -3,15 +3,19 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt
 from stock.db_manager import db
+from stock.session import session
 from stock.stockapi import fetch_stock_data
 from PyQt6.QtWidgets import QMenuBar, QMenu 
 from PyQt6.QtGui import QAction
 from stock.ui.transaction import TransactionDialog  # Import the TransactionDialog for selling stocks
+from stock.ui.stock_chart import StockChart
 
 
 class PortfolioWindow(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, user_id=None):
         super().__init__(parent)
+        # The portfolio shown; defaults to the signed-in user
+        self.user_id = user_id if user_id is not None else session.user_id
         self.setWindowTitle("Portfolio")
         self.resize(900, 600)  # Set an initial size
         self.setStyleSheet("background-color: #2a2e39; color: #e0e0e0;")
@@ -44,11 +48,15 @@ class PortfolioWindow(QDialog):
         # Balance and Total Assets Section
         self.balance_label = QLabel()
         self.total_assets_label = QLabel()
+        self.realized_pnl_label = QLabel()
+        self.unrealized_pnl_label = QLabel()
         self.update_balance_and_assets()
 
         balance_layout = QHBoxLayout()
         balance_layout.addWidget(self.balance_label)
         balance_layout.addWidget(self.total_assets_label)
+        balance_layout.addWidget(self.realized_pnl_label)
+        balance_layout.addWidget(self.unrealized_pnl_label)
         layout.addLayout(balance_layout)
 
         # Create tab widget for Portfolio and Favorites
@@ -80,8 +88,8 @@ class PortfolioWindow(QDialog):
         
         # Portfolio Table
         self.portfolio_table = QTableWidget()
-        self.portfolio_table.setColumnCount(7)  # Add columns for "Add Note" and "View Note"
-        self.portfolio_table.setHorizontalHeaderLabels(["Stock", "Current Price", "Change", "Quantity", "Sell", "Add Note", "View Note"])
+        self.portfolio_table.setColumnCount(9)  # Add columns for "Add Note" and "View Note"
+        self.portfolio_table.setHorizontalHeaderLabels(["Stock", "Current Price", "Change", "Quantity", "Avg Cost", "P&L", "Sell", "Add Note", "View Note"])
         self.portfolio_table.horizontalHeader().setStretchLastSection(True)
         self.portfolio_table.setStyleSheet(
             "QTableWidget { background-color: #2a2e39; gridline-color: #616161; }"
@@ -121,9 +129,69 @@ class PortfolioWindow(QDialog):
         
         favorites_layout.addWidget(self.favorites_table)
         
+        # Create Diversification Tab
+        diversification_tab = QWidget()
+        diversification_layout = QVBoxLayout(diversification_tab)
+        
+        self.diversification_label = QLabel()
+        self.diversification_label.setStyleSheet("font-size: 16px; color: #e0e0e0; margin-bottom: 10px;")
+        diversification_layout.addWidget(self.diversification_label)
+        
+        # Correlation matrix of the holdings
+        self.correlation_table = QTableWidget()
+        self.correlation_table.setStyleSheet(
+            "QTableWidget { background-color: #2a2e39; gridline-color: #616161; }"
+            "QHeaderView::section { background-color: #3a3f48; color: #e0e0e0; }"
+            "QTableWidget::item { color: #e0e0e0; font-size: 14px; }"
+        )
+        self.correlation_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        diversification_layout.addWidget(self.correlation_table)
+        
+        # Create History Tab
+        history_tab = QWidget()
+        history_layout = QVBoxLayout(history_tab)
+        
+        # Transaction history, loaded one page at a time
+        self.history_table = QTableWidget()
+        self.history_table.setColumnCount(6)
+        self.history_table.setHorizontalHeaderLabels(["Date", "Stock", "Action", "Quantity", "Price", "Amount"])
+        self.history_table.setStyleSheet(
+            "QTableWidget { background-color: #2a2e39; gridline-color: #616161; }"
+            "QHeaderView::section { background-color: #3a3f48; color: #e0e0e0; }"
+            "QTableWidget::item { color: #e0e0e0; font-size: 14px; }"
+        )
+        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        history_layout.addWidget(self.history_table)
+        
+        self.load_more_button = QPushButton("Load More")
+        self.load_more_button.setStyleSheet(
+            "background-color: #3a3f48; color: white; font-weight: bold; padding: 8px; border-radius: 5px;"
+        )
+        self.load_more_button.clicked.connect(lambda: self.load_history())
+        history_layout.addWidget(self.load_more_button)
+        self.history_cursor = None
+        
+        # Create Performance Tab
+        performance_tab = QWidget()
+        performance_layout = QVBoxLayout(performance_tab)
+        
+        self.performance_label = QLabel()
+        self.performance_label.setStyleSheet("font-size: 16px; color: #e0e0e0; margin-bottom: 10px;")
+        performance_layout.addWidget(self.performance_label)
+        
+        # Daily portfolio value from the stored snapshots
+        self.performance_chart = StockChart(self, width=8, height=4)
+        performance_layout.addWidget(self.performance_chart)
+        
         # Add tabs to tab widget
         self.tab_widget.addTab(portfolio_tab, "Portfolio")
         self.tab_widget.addTab(favorites_tab, "Favorites")
+        self.tab_widget.addTab(diversification_tab, "Diversification")
+        self.tab_widget.addTab(history_tab, "History")
+        self.tab_widget.addTab(performance_tab, "Performance")
+        self.tab_widget.currentChanged.connect(
+            lambda index: self.load_performance() if self.tab_widget.widget(index) is performance_tab else None)
+        self.performance_tab = performance_tab
         
         layout.addWidget(self.tab_widget)
 
@@ -154,37 +222,45 @@ class PortfolioWindow(QDialog):
 
     def update_balance_and_assets(self):
         """Update the balance and total assets labels."""
-        user_id = 1  # Replace with dynamic user ID if needed
+        user_id = self.user_id
         balance = db.get_user_balance(user_id)
         holdings = db.get_user_holdings(user_id)
 
         # Calculate total assets
         total_assets = balance
+        unrealized_pnl = 0.0
         for holding in holdings:
             stock_ticker = holding['stock_ticker']
             quantity = holding['shares']
             current_price = self.get_current_price(stock_ticker)
             total_assets += quantity * current_price
+            unrealized_pnl += quantity * current_price - holding['cost_basis']
+        realized_pnl = db.get_realized_pnl(user_id)
 
         # Update labels
         self.balance_label.setText(f"Balance: ₹{balance:,.2f}")
         self.total_assets_label.setText(f"Total Assets: ₹{total_assets:,.2f}")
+        self.realized_pnl_label.setText(f"Realized P&L: ₹{realized_pnl:+,.2f}")
+        self.unrealized_pnl_label.setText(f"Unrealized P&L: ₹{unrealized_pnl:+,.2f}")
 
         # Style the labels
         self.balance_label.setStyleSheet("font-size: 18px; font-weight: bold; color: #00ff00;")
         self.total_assets_label.setStyleSheet("font-size: 18px; font-weight: bold; color: #00ff00;")
+        for label, value in ((self.realized_pnl_label, realized_pnl), (self.unrealized_pnl_label, unrealized_pnl)):
+            color = "#00ff00" if value >= 0 else "#ff5252"
+            label.setStyleSheet(f"font-size: 18px; font-weight: bold; color: {color};")
 
     def deposit_money(self):
         """Open a dialog to deposit money into the account."""
-        user_id = 1  # Replace with dynamic user ID if needed
+        user_id = self.user_id
         try:
             # Open an input dialog to get the deposit amount
             amount, ok = QInputDialog.getDouble(self, "Deposit Money", "Enter amount to deposit:", 0, 0, 1_000_000, 2)
             if ok and amount > 0:
                 # Update the user's balance in the database
-                current_balance = db.get_user_balance(user_id)
-                new_balance = current_balance + amount
-                db.update_user_balance(user_id, new_balance)
+                with db.transaction():
+                    current_balance = db.get_user_balance(user_id)
+                    db.update_user_balance(user_id, current_balance + amount)
 
                 # Show a success message
                 QMessageBox.information(self, "Success", f"₹{amount:,.2f} deposited successfully!")
@@ -197,13 +273,15 @@ class PortfolioWindow(QDialog):
     def load_portfolio(self):
         """Load user's portfolio data into the table."""
         self.portfolio_table.setRowCount(0)  # Clear existing rows
-        holdings = db.get_user_holdings()
+        holdings = db.get_user_holdings(self.user_id)
+        position_values = {}
 
         for row, holding in enumerate(holdings):
             stock_ticker = holding['stock_ticker']
             quantity = holding['shares']
             current_price = self.get_current_price(stock_ticker)
             change = self.get_price_change(stock_ticker)
+            position_values[stock_ticker] = quantity * current_price
 
             # Add data to the table
             self.portfolio_table.insertRow(row)
@@ -220,13 +298,21 @@ class PortfolioWindow(QDialog):
 
             self.portfolio_table.setItem(row, 3, QTableWidgetItem(str(quantity)))
 
+            # Cost basis comes from the open lots, so P&L needs no ledger replay
+            cost_basis = holding['cost_basis']
+            self.portfolio_table.setItem(row, 4, QTableWidgetItem(f"₹{cost_basis / quantity:.2f}"))
+            pnl = quantity * current_price - cost_basis
+            pnl_item = QTableWidgetItem(f"₹{pnl:+,.2f} ({pnl / cost_basis:+.2%})" if cost_basis else f"₹{pnl:+,.2f}")
+            pnl_item.setForeground(Qt.GlobalColor.green if pnl >= 0 else Qt.GlobalColor.red)
+            self.portfolio_table.setItem(row, 5, pnl_item)
+
             # Add "Sell" button
             sell_button = QPushButton("Sell")
             sell_button.setStyleSheet(
                 "background-color: #d32f2f; color: white; font-weight: bold; padding: 5px 10px; border-radius: 3px;"
             )
             sell_button.clicked.connect(lambda _, s=stock_ticker, q=quantity, p=current_price: self.open_sell_dialog(s, q, p))
-            self.portfolio_table.setCellWidget(row, 4, sell_button)
+            self.portfolio_table.setCellWidget(row, 6, sell_button)
 
             # Add "Add Note" button
             add_note_button = QPushButton("Add Note")
@@ -234,7 +320,7 @@ class PortfolioWindow(QDialog):
                 "background-color: #007bff; color: white; font-weight: bold; padding: 5px 10px; border-radius: 3px;"
             )
             add_note_button.clicked.connect(lambda _, s=stock_ticker: self.add_note_for_stock(s))
-            self.portfolio_table.setCellWidget(row, 5, add_note_button)
+            self.portfolio_table.setCellWidget(row, 7, add_note_button)
 
             # Add "View Note" button
             view_note_button = QPushButton("View Note")
@@ -242,19 +328,101 @@ class PortfolioWindow(QDialog):
                 "background-color: #6c757d; color: white; font-weight: bold; padding: 5px 10px; border-radius: 3px;"
             )
             view_note_button.clicked.connect(lambda _, s=stock_ticker: self.view_note_for_stock(s))
-            self.portfolio_table.setCellWidget(row, 6, view_note_button)
+            self.portfolio_table.setCellWidget(row, 8, view_note_button)
 
         # Update balance and total assets after loading portfolio
         self.update_balance_and_assets()
+        self.load_diversification(position_values)
+        self.load_history(reset=True)
+        if self.tab_widget.currentWidget() is self.performance_tab:
+            self.load_performance()
+
+    def load_history(self, reset=False, page_size=50):
+        """Append the next page of transactions (or start again from the newest)."""
+        user_id = self.user_id
+        if reset:
+            self.history_table.setRowCount(0)
+            self.history_cursor = None
+        elif self.history_cursor is None:
+            return
+
+        rows, self.history_cursor = db.get_transactions_page(user_id, page_size, self.history_cursor)
+        for transaction in rows:
+            row = self.history_table.rowCount()
+            self.history_table.insertRow(row)
+            amount = transaction.quantity * transaction.price
+            values = [transaction.transaction_date, transaction.stock_ticker, transaction.action.capitalize(),
+                      str(transaction.quantity), f"₹{transaction.price:,.2f}", f"₹{amount:,.2f}"]
+            for column, value in enumerate(values):
+                self.history_table.setItem(row, column, QTableWidgetItem(value))
+        self.load_more_button.setEnabled(self.history_cursor is not None)
+
+    def load_performance(self):
+        """Chart the daily portfolio value, extending the stored history first."""
+        from stock.portfolio_history import load_history
+        
+        user_id = self.user_id
+        history = load_history(user_id)
+        nav = history['nav']
+        if len(nav) < 2 or nav.iloc[0] <= 0:
+            self.performance_label.setText("Performance appears here once the portfolio has some history.")
+            return
+        
+        returns = nav.pct_change(fill_method=None).dropna()
+        peak = nav.cummax()
+        self.performance_label.setText(
+            f"Value: ₹{nav.iloc[-1]:,.2f}   |   "
+            f"Since {nav.index[0]:%b %Y}: {nav.iloc[-1] / nav.iloc[0] - 1:+.1%}   |   "
+            f"Max drawdown: {(nav / peak - 1).min():.1%}   |   "
+            f"Volatility: {returns.std() * 252 ** 0.5:.1%} a year"
+        )
+        self.performance_chart.plot_stock_data(nav.to_numpy(), list(nav.index.to_pydatetime()), "Portfolio",
+                                               title="Portfolio Value")
+
+    def load_diversification(self, position_values):
+        """Show how correlated the holdings are, weighted by market value."""
+        from stock.correlation import diversification
+        
+        self.correlation_table.clear()
+        self.correlation_table.setRowCount(0)
+        self.correlation_table.setColumnCount(0)
+        
+        summary = diversification(position_values) if len(position_values) > 1 else None
+        if not summary:
+            self.diversification_label.setText("Hold at least two stocks to see how they move together.")
+            return
+            
+        self.diversification_label.setText(
+            f"Portfolio volatility: {summary['volatility']:.1%} a year   |   "
+            f"Average correlation: {summary['average_correlation']:.2f}   |   "
+            f"Diversification ratio: {summary['diversification_ratio']:.2f}"
+        )
+        
+        correlation = summary['correlation']
+        symbols = list(correlation.index)
+        self.correlation_table.setRowCount(len(symbols))
+        self.correlation_table.setColumnCount(len(symbols))
+        self.correlation_table.setHorizontalHeaderLabels(symbols)
+        self.correlation_table.setVerticalHeaderLabels(symbols)
+        for row in range(len(symbols)):
+            for column in range(len(symbols)):
+                value = correlation.iat[row, column]
+                item = QTableWidgetItem(f"{value:.2f}")
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                if row != column and value >= 0.7:
+                    item.setForeground(Qt.GlobalColor.red)
+                elif row != column and value <= 0.3:
+                    item.setForeground(Qt.GlobalColor.green)
+                self.correlation_table.setItem(row, column, item)
 
     def get_balance(self):
         """Return the current balance value."""
-        user_id = 1  # Replace with dynamic ID if needed
+        user_id = self.user_id
         return db.get_user_balance(user_id)
 
     def get_total_assets(self):
         """Calculate and return total assets."""
-        user_id = 1  # Replace with dynamic ID if needed
+        user_id = self.user_id
         balance = db.get_user_balance(user_id)
         holdings = db.get_user_holdings(user_id)
 
@@ -268,7 +436,7 @@ class PortfolioWindow(QDialog):
         return total_assets
     def add_note_for_stock(self, stock_ticker):
         """Add a note for a specific stock."""
-        user_id = 1  # Replace with dynamic user ID if needed
+        user_id = self.user_id
         note, ok = QInputDialog.getText(self, "Add Note", f"Enter a note for {stock_ticker}:")
         if ok and note:
             # Save the note to the database
@@ -280,7 +448,7 @@ class PortfolioWindow(QDialog):
 
     def view_note_for_stock(self, stock_ticker):
         """View the note for a specific stock."""
-        user_id = 1  # Replace with dynamic user ID if needed
+        user_id = self.user_id
         # Retrieve the note from the database
         note = db.get_stock_note(user_id, stock_ticker)
         if note:
@@ -289,19 +457,29 @@ class PortfolioWindow(QDialog):
             QMessageBox.information(self, f"Note for {stock_ticker}", "No notes available for this stock.")
     def open_sell_dialog(self, stock_ticker, max_quantity, current_price):
         """Open a dialog to specify the quantity of stocks to sell."""
-        success = TransactionDialog.show_dialog(self, stock_ticker, current_price, "sell")
+        success = TransactionDialog.show_dialog(self, stock_ticker, current_price, "sell", user_id=self.user_id)
         if success:
             # Reload portfolio to reflect changes
             self.load_portfolio()
 
     def sell_all_stocks(self):
         """Sell all stocks in the portfolio."""
-        holdings = db.get_user_holdings()
-        for holding in holdings:
-            stock_ticker = holding['stock_ticker']
-            quantity = holding['shares']
-            current_price = self.get_current_price(stock_ticker)
-            db.record_transaction(1, stock_ticker, "sell", quantity, current_price)
+        # Fetch prices first so the database is locked only for the writes
+        prices = {holding['stock_ticker']: self.get_current_price(holding['stock_ticker'])
+                  for holding in db.get_user_holdings(self.user_id)}
+        with db.transaction():
+            # Re-read the shares inside the transaction: a trade made while
+            # the prices were fetched must not leave the sale too large.
+            # A position opened meanwhile has no price yet and is kept.
+            proceeds = 0.0
+            for holding in db.get_user_holdings(self.user_id):
+                stock_ticker = holding['stock_ticker']
+                if stock_ticker not in prices:
+                    continue
+                quantity = holding['shares']
+                db.record_transaction(self.user_id, stock_ticker, "sell", quantity, prices[stock_ticker])
+                proceeds += quantity * prices[stock_ticker]
+            db.update_user_balance(self.user_id, db.get_user_balance(self.user_id) + proceeds)
         QMessageBox.information(self, "Success", "All stocks sold successfully!")
         
         # Reload portfolio to reflect changes
@@ -335,7 +513,7 @@ class PortfolioWindow(QDialog):
     def load_favorites(self):
         """Load user's favorite stocks data into the table."""
         self.favorites_table.setRowCount(0)  # Clear existing rows
-        user_id = 1  # Default user ID
+        user_id = self.user_id
         favorites = db.get_user_favorites(user_id)
 
         for row, stock_ticker in enumerate(favorites):
@@ -396,7 +574,7 @@ class PortfolioWindow(QDialog):
 
     def remove_favorite(self, stock_ticker):
         """Remove a stock from the favorites list."""
-        user_id = 1  # Default user ID
+        user_id = self.user_id
         success = db.remove_from_favorites(user_id, stock_ticker)
         if success:
             QMessageBox.information(self, "Success", f"{stock_ticker} removed from favorites!")
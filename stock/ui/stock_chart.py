@@ -14,6 +14,7 @@ class StockChart(FigureCanvas):
         self.fig = Figure(figsize=(width, height), dpi=dpi)
         self.fig.patch.set_facecolor('#1e222a')
         self.axes = self.fig.add_subplot(111)
+        self.score_axes = None
         super(StockChart, self).__init__(self.fig)
         self.setParent(parent)
         
@@ -26,8 +27,26 @@ class StockChart(FigureCanvas):
         self.price_tracker = None
         self.mpl_connect('motion_notify_event', self.on_mouse_move)
         
-    def plot_stock_data(self, prices, dates, symbol, currency="₹"):
-        self.axes.clear()
+    def plot_stock_data(self, prices, dates, symbol, currency="₹", signals=None, annotations=None, title=None):
+        """Plot a price history (or any value series, with a title of its own)
+
+        signals is an optional DataFrame aligned row for row with prices,
+        with 'score' and 'prediction' columns (see score_history); it adds
+        buy/sell markers and a score subplot under the prices. annotations
+        (see patterns.chart_annotations) adds candlestick pattern markers and
+        support/resistance lines.
+        """
+        if signals is not None or self.score_axes is not None:
+            self.fig.clear()
+            if signals is not None:
+                grid = self.fig.add_gridspec(2, 1, height_ratios=[3, 1], hspace=0.08)
+                self.axes = self.fig.add_subplot(grid[0])
+                self.score_axes = self.fig.add_subplot(grid[1], sharex=self.axes)
+            else:
+                self.axes = self.fig.add_subplot(111)
+                self.score_axes = None
+        else:
+            self.axes.clear()
         x = np.arange(len(prices))
         self.prices = prices
         self.dates = dates
@@ -121,6 +140,11 @@ class StockChart(FigureCanvas):
         self.axes.tick_params(axis='x', pad=8)
         self.axes.tick_params(axis='y', colors='#e0e0e0', labelsize=9)
         
+        if self.score_axes is not None:
+            self.plot_signals(x, prices, signals)
+        if annotations:
+            self.plot_annotations(prices, annotations)
+        
         if date_range > 365:
             # For yearly view
             self.fig.subplots_adjust(left=0.1, right=0.95, top=0.9, bottom=0.15)
@@ -139,7 +163,7 @@ class StockChart(FigureCanvas):
         y_padding = (y_max - y_min) * 0.05
         self.axes.set_ylim(y_min - y_padding, y_max + y_padding)
         
-        self.axes.set_title(f"{symbol} Price History", 
+        self.axes.set_title(title or f"{symbol} Price History", 
                           fontweight='bold', color='#e0e0e0', 
                           fontsize=12, pad=10)
         
@@ -207,6 +231,63 @@ class StockChart(FigureCanvas):
         
         self.draw()
         
+    def plot_signals(self, x, prices, signals):
+        """Buy/sell markers on the price axes and the score below them"""
+        scores = np.asarray(signals['score'], dtype=float)
+        labels = np.asarray(signals['prediction'], dtype=object)
+        prices = np.asarray(prices, dtype=float)
+        
+        # Mark the bars where the prediction turns into a buy or a sell
+        # Anything but a label (None, NaN) is a bar without a signal
+        is_buy = np.array([isinstance(label, str) and "Buy" in label for label in labels], dtype=bool)
+        is_sell = np.array([isinstance(label, str) and "Sell" in label for label in labels], dtype=bool)
+        buy_starts = is_buy & ~np.concatenate([[False], is_buy[:-1]])
+        sell_starts = is_sell & ~np.concatenate([[False], is_sell[:-1]])
+        offset = (prices.max() - prices.min()) * 0.03
+        self.axes.scatter(x[buy_starts], prices[buy_starts] - offset, marker='^', s=40,
+                          color='#00c853', edgecolors='#1e222a', zorder=5, label='Buy signal')
+        self.axes.scatter(x[sell_starts], prices[sell_starts] + offset, marker='v', s=40,
+                          color='#ff5252', edgecolors='#1e222a', zorder=5, label='Sell signal')
+        
+        axes = self.score_axes
+        axes.set_facecolor('#2a2e39')
+        axes.plot(x, scores, linewidth=1.5, color='#40c4ff', zorder=3)
+        axes.fill_between(x, scores, 0, where=scores >= 0, color='#00c853', alpha=0.25, zorder=2)
+        axes.fill_between(x, scores, 0, where=scores < 0, color='#ff5252', alpha=0.25, zorder=2)
+        from stock.stock_prediction import SCORING_PARAMS
+        for cutoff in (SCORING_PARAMS['buy_cutoff'], -SCORING_PARAMS['buy_cutoff']):
+            axes.axhline(cutoff, color='#bbbbbb', linestyle='--', alpha=0.4, lw=1)
+        axes.set_ylim(-1.05, 1.05)
+        axes.set_ylabel("Score", color='#e0e0e0', fontsize=9)
+        axes.grid(True, linestyle='--', alpha=0.2, color='#e0e0e0', zorder=1)
+        axes.tick_params(axis='both', colors='#e0e0e0', labelsize=9)
+        for spine in axes.spines.values():
+            spine.set_visible(False)
+        
+        # The date labels belong under the score subplot
+        self.axes.tick_params(axis='x', labelbottom=False)
+        
+    def plot_annotations(self, prices, annotations):
+        """Candlestick pattern markers and support/resistance levels"""
+        prices = np.asarray(prices, dtype=float)
+        y_min, y_max = prices.min(), prices.max()
+        
+        for level, color in ([(level, '#00c853') for level in annotations.get('support', [])] +
+                             [(level, '#ff5252') for level in annotations.get('resistance', [])]):
+            # Levels far outside the visible range would squash the chart
+            if y_min * 0.95 <= level <= y_max * 1.05:
+                self.axes.axhline(level, color=color, linestyle=':', alpha=0.6, lw=1, zorder=2)
+        
+        marks = [(position, direction) for position, _, direction in annotations.get('patterns', [])
+                 if position < len(prices)]
+        if marks:
+            positions = np.array([position for position, _ in marks])
+            directions = np.array([direction for _, direction in marks])
+            bullish = positions[directions > 0]
+            bearish = positions[directions < 0]
+            self.axes.scatter(bullish, prices[bullish], marker='D', s=14, color='#69f0ae', alpha=0.8, zorder=4)
+            self.axes.scatter(bearish, prices[bearish], marker='D', s=14, color='#ff8a80', alpha=0.8, zorder=4)
+        
     def resizeEvent(self, event):
         super().resizeEvent(event)
         self.fig.tight_layout(pad=2.0)
@@ -9,13 +9,20 @@ from PyQt6 import QtWidgets
 import os
 
 class StockDetailPage(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, user_id=None):
         super().__init__(parent)
+        self._user_id = user_id
         self.symbol = ""
         self.currency = "₹"
         self.current_price = 0
         self.init_ui()
         
+    @property
+    def user_id(self):
+        """The user trading on this page: the signed-in one unless fixed"""
+        from stock.session import session
+        return self._user_id if self._user_id is not None else session.user_id
+        
     def init_ui(self):
         main_layout = QVBoxLayout()
         main_layout.setSpacing(20)
@@ -55,7 +62,7 @@ class StockDetailPage(QWidget):
         header_layout.addWidget(self.favorite_button)
         
         from stock.db_manager import db
-        user_balance = db.get_user_balance()
+        user_balance = db.get_user_balance(self.user_id)
         self.balance_display = QLabel(f"Account: ₹{user_balance:,.2f}")
         self.balance_display.setStyleSheet("color: #e0e0e0;")
         header_layout.addWidget(self.balance_display)
@@ -222,6 +229,10 @@ class StockDetailPage(QWidget):
         self.prediction_card = InfoCard("Recommendation")
         self.target_card = InfoCard("Target Price")
         self.score_card = InfoCard("Confidence Score")
+        self.weekly_rsi_card = InfoCard("RSI (Weekly)")
+        self.monthly_rsi_card = InfoCard("RSI (Monthly)")
+        self.weekly_sma_card = InfoCard("SMA 20 (Weekly)")
+        self.monthly_sma_card = InfoCard("SMA 20 (Monthly)")
 
         cards_layout.addWidget(self.rsi_card, 0, 0)
         cards_layout.addWidget(self.sma20_card, 0, 1)
@@ -231,6 +242,10 @@ class StockDetailPage(QWidget):
         cards_layout.addWidget(self.prediction_card, 1, 1)
         cards_layout.addWidget(self.target_card, 1, 2)
         cards_layout.addWidget(self.score_card, 1, 3)
+        cards_layout.addWidget(self.weekly_rsi_card, 2, 0)
+        cards_layout.addWidget(self.monthly_rsi_card, 2, 1)
+        cards_layout.addWidget(self.weekly_sma_card, 2, 2)
+        cards_layout.addWidget(self.monthly_sma_card, 2, 3)
 
         metrics_layout.addLayout(cards_layout)
 
@@ -252,7 +267,7 @@ class StockDetailPage(QWidget):
             
         try:
             from stock.db_manager import db
-            holdings = db.get_user_holdings()
+            holdings = db.get_user_holdings(self.user_id)
             
             user_shares = 0
             if holdings:
@@ -278,7 +293,7 @@ class StockDetailPage(QWidget):
     
     def update_user_balance_display(self):
         from stock.db_manager import db
-        user_balance = db.get_user_balance()
+        user_balance = db.get_user_balance(self.user_id)
         self.balance_display.setText(f"Account: ₹{user_balance:,.2f}")
     
     def update_chart_period(self, index):
@@ -288,7 +303,7 @@ class StockDetailPage(QWidget):
     def buy_stock(self):
         if self.symbol and self.current_price > 0:
             from stock.ui.transaction import TransactionDialog
-            success = TransactionDialog.show_dialog(self, self.symbol, self.current_price, "buy")
+            success = TransactionDialog.show_dialog(self, self.symbol, self.current_price, "buy", user_id=self.user_id)
             if success:
                 self.update_user_balance_display()
                 self.update_holdings_info()
@@ -296,7 +311,7 @@ class StockDetailPage(QWidget):
     def sell_stock(self):
         if self.symbol and self.current_price > 0:
             from stock.ui.transaction import TransactionDialog
-            success = TransactionDialog.show_dialog(self, self.symbol, self.current_price, "sell")
+            success = TransactionDialog.show_dialog(self, self.symbol, self.current_price, "sell", user_id=self.user_id)
             if success:
                 self.update_user_balance_display()
                 self.update_holdings_info()
@@ -400,12 +415,23 @@ class StockDetailPage(QWidget):
                 
             self.volume_card.update_value(format_large_number(volume))
             
+            self.update_timeframe_cards()
+            
             
             if hist_prices and hist_dates:
-                self.chart.plot_stock_data(hist_prices, hist_dates, self.symbol, self.currency)
+                # Score history comes from the long base series, so the
+                # 200-day average is defined even on short chart periods
+                from stock.stock_prediction import score_history
+                signals = score_history(self.symbol, dates=hist_dates)
+                
+                from stock.patterns import chart_annotations
+                ohlc = data.get('ohlc_data') or {}
+                annotations = chart_annotations(ohlc.get('Open'), ohlc.get('High'), ohlc.get('Low'), hist_prices)
+                self.chart.plot_stock_data(hist_prices, hist_dates, self.symbol, self.currency,
+                                           signals=signals, annotations=annotations)
                 
             
-            prediction = predict_stock(self.symbol)
+            prediction = predict_stock(self.symbol, probabilistic=True)
             if prediction:
                 pred_text = prediction.get("prediction", "Hold")
                 if pred_text is None:
@@ -419,6 +445,8 @@ class StockDetailPage(QWidget):
                     pred_color = "#ffab40"
                     
                 self.prediction_card.update_value(pred_text, pred_color)
+                regime = prediction.get("volatility_regime")
+                self.prediction_card.setToolTip(f"Volatility regime: {regime}" if regime else "")
                 
                 target_price = prediction.get('target_price')
                 if target_price is None:
@@ -430,6 +458,7 @@ class StockDetailPage(QWidget):
                     target_color = "#ff5252"  # Red
                     
                 self.target_card.update_value(f"{self.currency}{target_price:.2f}", target_color)
+                self.update_target_distribution(prediction.get('target_distribution'))
                 
                 
                 score = prediction.get("score", 0)
@@ -444,7 +473,21 @@ class StockDetailPage(QWidget):
                 else:
                     score_color = "#ffab40"
                     
-                self.score_card.update_value(f"{score:+.2f}", score_color)
+                # Show the calibrated hit rate next to the raw score when available
+                confidence = prediction.get("confidence")
+                tooltip = []
+                if confidence:
+                    self.score_card.update_value(f"{score:+.2f} ({confidence['hit_rate']:.0%})", score_color)
+                    tooltip.append(f"Past hit rate of similar signals: {confidence['hit_rate']:.0%} "
+                                   f"over {confidence['horizon']} days, average return "
+                                   f"{confidence['avg_return']:+.2%} ({confidence['samples']} cases)")
+                else:
+                    self.score_card.update_value(f"{score:+.2f}", score_color)
+                
+                ml_probability = prediction.get("ml_probability")
+                if ml_probability is not None:
+                    tooltip.append(f"Trained model: {ml_probability:.0%} chance of a rise")
+                self.score_card.setToolTip("\n".join(tooltip))
                 
         except Exception as e:
             print(f"Error updating stock data: {e}")
@@ -454,6 +497,51 @@ class StockDetailPage(QWidget):
             self.price_label.setText("--")
             self.change_label.setText(f"Could not load {self.symbol}. Please check the symbol and try again.")
     
+    def update_target_distribution(self, distribution):
+        """Show the Monte Carlo odds of reaching the target on the target card"""
+        if not distribution:
+            self.target_card.title_label.setText("Target Price")
+            self.target_card.setToolTip("")
+            return
+            
+        percentiles = distribution['percentiles']
+        self.target_card.title_label.setText(f"Target Price ({distribution['prob_hit']:.0%} chance)")
+        self.target_card.setToolTip(
+            f"{distribution['horizon']}-day outlook from {distribution['paths']:,} simulated paths\n"
+            f"5th-95th percentile: {self.currency}{percentiles[5]:.2f} - {self.currency}{percentiles[95]:.2f}\n"
+            f"Median: {self.currency}{percentiles[50]:.2f}\n"
+            f"Touches target: {distribution['prob_hit']:.0%}, ends beyond it: {distribution['prob_beyond']:.0%}"
+        )
+    
+    def update_timeframe_cards(self):
+        """Fill the weekly/monthly cards from the cached daily bars"""
+        from stock.timeframes import timeframe_indicators
+        
+        summaries = timeframe_indicators(self.symbol, timeframes=("weekly", "monthly")) or {}
+        cards = [
+            ("weekly", self.weekly_rsi_card, self.weekly_sma_card),
+            ("monthly", self.monthly_rsi_card, self.monthly_sma_card),
+        ]
+        for timeframe, rsi_card, sma_card in cards:
+            summary = summaries.get(timeframe)
+            if not summary:
+                rsi_card.update_value("--")
+                sma_card.update_value("--")
+                continue
+                
+            rsi_value = summary['rsi']
+            if rsi_value is None:
+                rsi_card.update_value("--")
+            elif safe_compare(rsi_value, 70, "gt"):
+                rsi_card.update_value(f"{rsi_value:.1f}", "#ff5252")
+            elif safe_compare(rsi_value, 30, "lt"):
+                rsi_card.update_value(f"{rsi_value:.1f}", "#00c853")
+            else:
+                rsi_card.update_value(f"{rsi_value:.1f}", "#e0e0e0")
+                
+            sma_value = summary['sma_20']
+            sma_card.update_value("--" if sma_value is None else f"{self.currency}{sma_value:.2f}")
+    
     def toggle_favorite(self):
         """Toggle the favorite status of the current stock"""
         if not self.symbol:
@@ -461,7 +549,7 @@ class StockDetailPage(QWidget):
             
         try:
             from stock.db_manager import db
-            user_id = 1  # Default user ID
+            user_id = self.user_id
             
             # Check current favorite status
             is_favorite = db.is_favorite(user_id, self.symbol)
@@ -490,7 +578,7 @@ class StockDetailPage(QWidget):
             
         try:
             from stock.db_manager import db
-            user_id = 1  # Default user ID
+            user_id = self.user_id
             
             # Check favorite status
             is_favorite = db.is_favorite(user_id, self.symbol)
@@ -5,9 +5,12 @@ from PyQt6.QtGui import QPixmap
 import os
 
 class TransactionDialog(QWidget):
-    def __init__(self, parent=None, stock_symbol="", stock_price=0, action="buy"):
+    def __init__(self, parent=None, stock_symbol="", stock_price=0, action="buy", user_id=None):
         super().__init__(parent, Qt.WindowType.Window)
         
+        from stock.session import session
+        # Trade for the given user, or the signed-in one
+        self.user_id = user_id if user_id is not None else session.user_id
         self.stock_symbol = stock_symbol
         self.stock_price = stock_price
         self.action = action
@@ -15,7 +18,7 @@ class TransactionDialog(QWidget):
         self.result = False
         
         from stock.db_manager import db
-        self.user_balance = db.get_user_balance()
+        self.user_balance = db.get_user_balance(self.user_id)
         
         self.parent_stock_page = parent
         
@@ -165,45 +168,42 @@ class TransactionDialog(QWidget):
         from stock.db_manager import db
         
         try:
-            if self.action == "buy":
+            # Balance check, ledger, holdings and balance update commit as one unit
+            with db.transaction():
+                balance = db.get_user_balance(self.user_id)
+                total_amount = self.quantity * self.stock_price
                 
-                total_cost = self.quantity * self.stock_price
-                if total_cost > self.user_balance:
-                    print(f"Error: Insufficient balance to buy {self.quantity} shares of {self.stock_symbol}")
-                    self.result = False
-                    self.close()
-                    return
+                if self.action == "buy":
+                    if total_amount > balance:
+                        print(f"Error: Insufficient balance to buy {self.quantity} shares of {self.stock_symbol}")
+                        self.result = False
+                        self.close()
+                        return
                     
-                # Record the transaction
-                db.record_transaction(1, self.stock_symbol, "buy", self.quantity, self.stock_price)
-                
-                # Update user balance
-                db.update_user_balance(1, self.user_balance - total_cost)
-                
-                print(f"Successfully bought {self.quantity} shares of {self.stock_symbol} for ₹{total_cost:.2f}")
-            else:
-                # Check if user has enough shares to sell
-                holdings = db.get_user_holdings()
-                user_shares = 0
-                
-                for holding in holdings:
-                    if holding['stock_ticker'] == self.stock_symbol:
-                        user_shares = holding['shares']
-                        break
-                        
-                if user_shares < self.quantity:
-                    print(f"Error: You only have {user_shares} shares of {self.stock_symbol} to sell")
-                    self.result = False
-                    self.close()
-                    return
+                    db.record_transaction(self.user_id, self.stock_symbol, "buy", self.quantity, self.stock_price)
+                    db.update_user_balance(self.user_id, balance - total_amount)
+                else:
+                    # Check if user has enough shares to sell
+                    holdings = db.get_user_holdings(self.user_id)
+                    user_shares = 0
                     
-                # Record the transaction
-                total_amount = self.quantity * self.stock_price
-                db.record_transaction(1, self.stock_symbol, "sell", self.quantity, self.stock_price)
-                
-                # Update user balance
-                db.update_user_balance(1, self.user_balance + total_amount)
-                
+                    for holding in holdings:
+                        if holding['stock_ticker'] == self.stock_symbol:
+                            user_shares = holding['shares']
+                            break
+                            
+                    if user_shares < self.quantity:
+                        print(f"Error: You only have {user_shares} shares of {self.stock_symbol} to sell")
+                        self.result = False
+                        self.close()
+                        return
+                    
+                    db.record_transaction(self.user_id, self.stock_symbol, "sell", self.quantity, self.stock_price)
+                    db.update_user_balance(self.user_id, balance + total_amount)
+            
+            if self.action == "buy":
+                print(f"Successfully bought {self.quantity} shares of {self.stock_symbol} for ₹{total_amount:.2f}")
+            else:
                 print(f"Successfully sold {self.quantity} shares of {self.stock_symbol} for ₹{total_amount:.2f}")
             
             self.result = True
@@ -224,8 +224,8 @@ class TransactionDialog(QWidget):
         self.close()
         
     @staticmethod
-    def show_dialog(parent, stock_symbol, stock_price, action="buy"):
-        dialog = TransactionDialog(parent, stock_symbol, stock_price, action)
+    def show_dialog(parent, stock_symbol, stock_price, action="buy", user_id=None):
+        dialog = TransactionDialog(parent, stock_symbol, stock_price, action, user_id)
         dialog.setWindowModality(Qt.WindowModality.ApplicationModal)
         dialog.show()
         
@@ -0,0 +1,212 @@
+"""
+EWMA and GARCH(1,1) volatility with regime labels
+
+GARCH parameters are fitted by maximum likelihood over a grid of (alpha,
+beta) pairs: the variance recursion runs once over the returns for every
+pair at the same time (one NumPy vector per bar), so the whole grid costs
+about as much as a single Python-level fit. A finer grid around the best
+pair refines it. Fits are cached per symbol; new bars only extend the
+variance recursion with the cached parameters (a revised last bar reruns
+one step of it), and the model is refit after REFIT_BARS new bars.
+"""
+import threading
+import numpy as np
+import pandas as pd
+
+EWMA_LAMBDA = 0.94  # RiskMetrics daily decay
+
+REFIT_BARS = 20
+MIN_BARS = 60
+
+# Conditional volatility percentile (within its own history) bounding the regimes
+REGIME_PERCENTILES = (25, 75)
+
+# Bounds on how far the current regime may stretch the target price band
+RATIO_BOUNDS = (0.5, 2.0)
+
+_fits = {}  # symbol -> fit state (see _fit_state)
+_fits_lock = threading.Lock()
+
+def log_returns(prices):
+    prices = np.asarray(prices, dtype=float)
+    prices = prices[np.isfinite(prices) & (prices > 0)]
+    return np.diff(np.log(prices))
+
+def ewma_volatility(returns, lam=EWMA_LAMBDA):
+    """Per-bar EWMA volatility of a return Series or (dates x symbols) DataFrame"""
+    return (returns ** 2).ewm(alpha=1 - lam, adjust=False).mean() ** 0.5
+
+def garch_variances(returns, omega, alpha, beta, initial):
+    """Conditional variances for many parameter sets at once
+
+    omega/alpha/beta are arrays of shape (K,); returns (T + 1, K) where row t
+    is the variance forecast for return t (the last row is the next bar).
+    """
+    squared = np.asarray(returns, dtype=float) ** 2
+    variances = np.empty((len(squared) + 1, len(omega)))
+    variances[0] = initial
+    for t, value in enumerate(squared):
+        variances[t + 1] = omega + alpha * value + beta * variances[t]
+    return variances
+
+def _log_likelihood(returns, variances):
+    variances = variances[:-1]
+    return -0.5 * (np.log(variances) + (returns ** 2)[:, None] / variances).sum(axis=0)
+
+def _grid(alpha_range, beta_range, size):
+    alphas, betas = np.meshgrid(np.linspace(*alpha_range, size), np.linspace(*beta_range, size))
+    alphas, betas = alphas.ravel(), betas.ravel()
+    stationary = alphas + betas < 0.999
+    return alphas[stationary], betas[stationary]
+
+def fit_garch(returns, size=30):
+    """Fit GARCH(1,1) with variance targeting; returns a params dict
+
+    omega is tied to the sample variance (omega = var * (1 - alpha - beta)),
+    leaving a two-dimensional grid search that is refined once.
+    """
+    returns = np.asarray(returns, dtype=float)
+    mean = returns.mean()
+    returns = returns - mean
+    long_run = returns.var()
+
+    alpha_range, beta_range = (0.01, 0.3), (0.5, 0.98)
+    for _ in range(2):
+        alphas, betas = _grid(alpha_range, beta_range, size)
+        omegas = long_run * (1 - alphas - betas)
+        variances = garch_variances(returns, omegas, alphas, betas, long_run)
+        best = int(np.argmax(_log_likelihood(returns, variances)))
+        alpha_step = (alpha_range[1] - alpha_range[0]) / (size - 1)
+        beta_step = (beta_range[1] - beta_range[0]) / (size - 1)
+        alpha_range = (max(1e-4, alphas[best] - alpha_step), alphas[best] + alpha_step)
+        beta_range = (max(0.0, betas[best] - beta_step), min(0.998, betas[best] + beta_step))
+
+    return {
+        'omega': float(omegas[best]),
+        'alpha': float(alphas[best]),
+        'beta': float(betas[best]),
+        'long_run_variance': float(long_run),
+        'mean': float(mean),
+        'variances': variances[:, best],
+    }
+
+def forecast_variance(params, next_variance, horizon):
+    """Total variance of the return over the next `horizon` bars"""
+    persistence = params['alpha'] + params['beta']
+    steps = persistence ** np.arange(horizon)
+    long_run = params['long_run_variance']
+    return float((long_run + steps * (next_variance - long_run)).sum())
+
+def regime_label(volatility, history):
+    """'low', 'normal' or 'high' by where volatility sits in its own history"""
+    low, high = np.nanpercentile(history, REGIME_PERCENTILES)
+    if volatility < low:
+        return "low"
+    if volatility > high:
+        return "high"
+    return "normal"
+
+def _fit_state(prices, dates):
+    returns = log_returns(prices)
+    fitted = fit_garch(returns)
+    variances = fitted.pop('variances')
+    return {
+        'params': fitted,
+        'last_date': dates[-1] if dates is not None else None,
+        'last_price': float(prices[-1]),
+        'previous_price': float(prices[-2]),
+        'variances': variances,
+        'bars_since_fit': 0,
+    }
+
+def _extend_state(state, new_prices, last_date):
+    """Run the cached recursion over bars added since the state was built"""
+    prices = np.concatenate([[state['last_price']], new_prices])
+    returns = log_returns(prices) - state['params']['mean']
+    p = state['params']
+    extension = garch_variances(returns, np.array([p['omega']]), np.array([p['alpha']]),
+                                np.array([p['beta']]), state['variances'][-1])[1:, 0]
+    return dict(state,
+                variances=np.concatenate([state['variances'], extension]),
+                last_date=last_date,
+                last_price=float(prices[-1]),
+                previous_price=float(prices[-2]),
+                bars_since_fit=state['bars_since_fit'] + len(new_prices))
+
+def _rewind_state(state, previous_date):
+    """The state as it was one bar earlier, to run a revised last bar again"""
+    return dict(state,
+                variances=state['variances'][:-1],
+                last_date=previous_date,
+                last_price=state['previous_price'],
+                previous_price=None,
+                bars_since_fit=max(state['bars_since_fit'] - 1, 0))
+
+def volatility_profile(symbol, prices, dates=None, horizon=20):
+    """Current volatility estimates and regime for one symbol
+
+    prices is the close history (oldest first) and dates, if given, the
+    matching dates used to tell new bars from a different history. Returns
+    daily 'ewma', 'garch' and 'long_run' volatilities, the 'horizon'
+    volatility, 'ratio' (GARCH over long-run volatility, clipped to
+    RATIO_BOUNDS), the 'regime' label and the fitted 'params'; or None when
+    there are fewer than MIN_BARS prices.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if len(prices) < MIN_BARS or not np.all(np.isfinite(prices)) or np.any(prices <= 0):
+        return None
+    dates = [str(d)[:10] for d in dates] if dates is not None else None
+
+    with _fits_lock:
+        state = _fits.get(symbol)
+
+    # Locate the last bar the cached fit has seen; everything after it is new
+    position = None
+    if state is not None and state['last_date'] is not None and dates is not None:
+        try:
+            position = dates.index(state['last_date'])
+        except ValueError:
+            position = None
+    if position is not None and not np.isclose(prices[position], state['last_price']):
+        # Only the last bar the fit has seen moved (today's, still forming
+        # during the session): run the recursion over it again instead of
+        # refitting
+        if (position > 0 and state['previous_price'] is not None
+                and np.isclose(prices[position - 1], state['previous_price'])):
+            state = _rewind_state(state, dates[position - 1])
+            position -= 1
+        else:
+            position = None
+
+    if position is None:
+        state = _fit_state(prices, dates)
+    elif position < len(prices) - 1:
+        new_prices = prices[position + 1:]
+        if state['bars_since_fit'] + len(new_prices) >= REFIT_BARS:
+            state = _fit_state(prices, dates)
+        else:
+            state = _extend_state(state, new_prices, dates[-1])
+    with _fits_lock:
+        _fits[symbol] = state
+
+    params = state['params']
+    variances = state['variances']
+    garch_vol = float(np.sqrt(variances[-1]))
+    long_run_vol = float(np.sqrt(params['long_run_variance']))
+    ewma_vol = float(ewma_volatility(pd.Series(log_returns(prices))).iloc[-1])
+    ratio = garch_vol / long_run_vol if long_run_vol > 0 else 1.0
+
+    return {
+        'ewma': ewma_vol,
+        'garch': garch_vol,
+        'long_run': long_run_vol,
+        'horizon': float(np.sqrt(forecast_variance(params, variances[-1], horizon))),
+        'ratio': float(np.clip(ratio, *RATIO_BOUNDS)),
+        'regime': regime_label(garch_vol, np.sqrt(variances)),
+        'params': {name: params[name] for name in ('omega', 'alpha', 'beta')},
+    }
+
+def clear_volatility_cache():
+    """Drop all cached fits"""
+    with _fits_lock:
+        _fits.clear()
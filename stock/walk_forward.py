@@ -0,0 +1,176 @@
+"""
+Walk-forward validation of the predict_stock rules
+
+History is split into rolling train/test windows (optimizer.walk_forward_splits)
+and each fold is scored and simulated in its own worker process. The OHLCV
+matrices are copied into shared memory once, so a task only carries its fold
+boundaries. Per-fold in-sample and out-of-sample metrics are aggregated into
+stability figures: how much the Sharpe decays out of sample, how often a
+fold is profitable, and how consistently the score ranks forward returns.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from stock.stockapi import load_ohlcv_matrices, DEFAULT_UNIVERSE
+from stock.stock_prediction import SCORING_PARAMS, score_matrix
+from stock.scoring_rules import load_profile
+from stock.backtest import (generate_signals, simulate, equal_weight_returns, warmup_bars,
+                            performance_metrics, trade_statistics)
+from stock.optimizer import walk_forward_splits
+from stock.shared_arrays import SharedMatrix, init_worker, worker_state
+
+# Horizon (bars) of the forward return the score is ranked against
+IC_HORIZON = 5
+
+def information_coefficient(scores, close, horizon=IC_HORIZON):
+    """Daily rank correlation between scores and the next `horizon`-bar returns"""
+    forward = close.shift(-horizon) / close - 1
+    valid = scores.notna() & forward.notna()
+    score_ranks = scores.where(valid).rank(axis=1)
+    return_ranks = forward.where(valid).rank(axis=1)
+    score_ranks = score_ranks.sub(score_ranks.mean(axis=1), axis=0)
+    return_ranks = return_ranks.sub(return_ranks.mean(axis=1), axis=0)
+    numerator = (score_ranks * return_ranks).sum(axis=1)
+    denominator = np.sqrt((score_ranks ** 2).sum(axis=1) * (return_ranks ** 2).sum(axis=1))
+    return (numerator / denominator.replace(0, np.nan)).where(valid.sum(axis=1) > 2)
+
+def _window_metrics(returns, strategy_returns, held, ic):
+    metrics = performance_metrics(returns)
+    trades = trade_statistics(strategy_returns, held)
+    return {
+        'sharpe': float(metrics['sharpe'][0]),
+        'cagr': float(metrics['cagr'][0]),
+        'max_drawdown': float(metrics['max_drawdown'][0]),
+        'hit_rate': trades['total_hit_rate'],
+        'trades': trades['total_trades'],
+        'exposure': float((held != 0).to_numpy().mean()),
+        'ic': float(ic.mean()) if ic.notna().any() else np.nan,
+    }
+
+def _evaluate_fold(train, test, params, profile, cost_bps, slippage_bps):
+    """Train and test metrics (and test returns) for one fold in a worker
+
+    Indicators are computed from `warmup` bars before the train window, and
+    positions carry over from the train window into the test window as they
+    would in live trading.
+    """
+    matrices = worker_state['matrices']
+    start = max(0, train.start - warmup_bars(params))
+    window = {field: frame.iloc[start:test.stop] for field, frame in matrices.items()}
+    close, volume = window['Close'], window.get('Volume')
+
+    if profile is not None:
+        scores = load_profile(profile).score(close, volume, bars=window)
+    else:
+        scores = score_matrix(close, volume, params)
+    positions = generate_signals(scores, params['buy_cutoff'], -params['buy_cutoff'])
+    strategy_returns, held = simulate(close, positions, cost_bps, slippage_bps)
+    portfolio = equal_weight_returns(strategy_returns, close)
+    ic = information_coefficient(scores, close)
+
+    result = {}
+    for name, part in (('train', train), ('test', test)):
+        rows = slice(part.start - start, part.stop - start)
+        # Forward returns of the last train bars reach into the test window
+        part_ic = ic.iloc[rows].iloc[:-IC_HORIZON] if name == 'train' else ic.iloc[rows]
+        result[name] = _window_metrics(portfolio.iloc[rows], strategy_returns.iloc[rows],
+                                       held.iloc[rows], part_ic)
+    result['returns'] = portfolio.iloc[test.start - start:test.stop - start].to_numpy()
+    return result
+
+def stability(folds):
+    """Stability summary of a folds DataFrame (one row per fold)"""
+    test_sharpe = folds['test_sharpe']
+    ic = folds['test_ic'].dropna()
+    return {
+        'folds': len(folds),
+        'mean_test_sharpe': float(test_sharpe.mean()),
+        'std_test_sharpe': float(test_sharpe.std(ddof=1)) if len(folds) > 1 else 0.0,
+        'worst_test_sharpe': float(test_sharpe.min()),
+        'positive_folds': float((test_sharpe > 0).mean()),
+        # In-sample minus out-of-sample: large values point to overfitting
+        'sharpe_decay': float((folds['train_sharpe'] - test_sharpe).mean()),
+        'mean_ic': float(ic.mean()) if len(ic) else np.nan,
+        'ic_ir': float(ic.mean() / ic.std(ddof=1)) if len(ic) > 1 and ic.std(ddof=1) > 0 else np.nan,
+    }
+
+def validate(symbols=None, period=None, params=None, profile=None, matrices=None,
+             train_bars=504, test_bars=126, max_workers=None, cost_bps=10.0, slippage_bps=5.0):
+    """Walk-forward validation of one rule set over the cached history
+
+    params override SCORING_PARAMS, or profile (a name, path or dict; see
+    scoring_rules) replaces the built-in rules. matrices, if given, is an
+    OHLCV dict as returned by load_ohlcv_matrices; by default each symbol's
+    longest cached history is used (period=None).
+
+    Returns a dict with:
+      'folds'     - DataFrame with train/test metrics per fold
+      'stability' - summary across folds (see stability)
+      'metrics'   - CAGR, Sharpe and drawdown of the stitched test returns
+      'returns'   - the stitched out-of-sample daily returns
+    or None when there is not enough history for a single fold.
+    """
+    if matrices is None:
+        matrices = load_ohlcv_matrices(symbols or DEFAULT_UNIVERSE, period)
+    close = matrices['Close']
+    if close.empty:
+        return None
+
+    if profile is not None:
+        p = dict(load_profile(profile).params, **(params or {}))
+    else:
+        p = dict(SCORING_PARAMS, **(params or {}))
+
+    splits = walk_forward_splits(len(close), train_bars, test_bars)
+    if not splits:
+        return None
+
+    shared = {field: SharedMatrix(frame.reindex_like(close).to_numpy(dtype=float))
+              for field, frame in matrices.items() if not frame.empty}
+    max_workers = min(max_workers or os.cpu_count() or 1, len(splits))
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=({field: matrix.spec for field, matrix in shared.items()},
+                                           close.index, close.columns)) as pool:
+            futures = [pool.submit(_evaluate_fold, train, test, p, profile, cost_bps, slippage_bps)
+                       for train, test in splits]
+            results = [future.result() for future in futures]
+    finally:
+        for matrix in shared.values():
+            matrix.release()
+
+    rows = []
+    for (train, test), result in zip(splits, results):
+        row = {
+            'train_start': close.index[train.start],
+            'test_start': close.index[test.start],
+            'test_end': close.index[test.stop - 1],
+        }
+        for name in ('train', 'test'):
+            row.update({f'{name}_{metric}': value for metric, value in result[name].items()})
+        rows.append(row)
+    folds = pd.DataFrame(rows)
+
+    test_index = close.index[splits[0][1].start:splits[-1][1].stop]
+    stitched = pd.Series(np.concatenate([result['returns'] for result in results]), index=test_index)
+    metrics = performance_metrics(stitched)
+    return {
+        'folds': folds,
+        'stability': stability(folds),
+        'metrics': {name: float(values[0]) for name, values in metrics.items()},
+        'returns': stitched,
+    }
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    result = validate(DEFAULT_UNIVERSE)
+    if result is None:
+        print("Not enough cached history for a walk-forward fold; open the stocks once in the dashboard")
+    else:
+        columns = ['test_start', 'test_end', 'train_sharpe', 'test_sharpe', 'test_hit_rate', 'test_ic']
+        print(result['folds'][columns].to_string(index=False))
+        for name, value in result['stability'].items():
+            print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
+        print(f"Validated in {time.perf_counter() - start:.1f}s")
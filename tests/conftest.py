@@ -0,0 +1,21 @@
+import pytest
+from stock.db_manager import DatabaseManager, MEMORY
+from stock.lots import COST_METHOD
+
+INSERT_USER = "INSERT INTO user (user_id, username, password, total_assets) VALUES (?, ?, ?, ?)"
+
+@pytest.fixture
+def database(request):
+    """A throwaway in-memory portfolio database with one user (user_id 1)
+
+    Parametrize it indirectly with a cost method to replace the default.
+    """
+    database = DatabaseManager(MEMORY, cost_method=getattr(request, 'param', COST_METHOD)).init()
+    database.execute_query(INSERT_USER, (1, "tester", "", 100000.0))
+    yield database
+    database.close()
+
+@pytest.fixture
+def add_user(database):
+    """add_user(user_id, username) adds another user to the database fixture"""
+    return lambda user_id, username: database.execute_query(INSERT_USER, (user_id, username, "", 100000.0))
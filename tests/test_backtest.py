@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from stock import backtest, feature_store
+from stock.backtest import equal_weight_returns, simulate
+from stock.stock_prediction import score_matrix
+
+@pytest.fixture
+def close():
+    index = pd.bdate_range('2024-01-01', periods=6)
+    return pd.DataFrame({'A.NS': [100.0, 110.0, 99.0, 99.0, 120.0, 132.0],
+                         'B.NS': [np.nan, np.nan, 50.0, 55.0, 55.0, 44.0]}, index=index)
+
+def test_positions_are_held_from_the_next_bar(close):
+    # A perfect-foresight signal on day 1 must not earn day 1's return
+    positions = pd.DataFrame(0.0, index=close.index, columns=close.columns)
+    positions.iloc[1, 0] = 1.0
+    returns, held = simulate(close, positions, cost_bps=0.0, slippage_bps=0.0)
+    assert held['A.NS'].tolist() == [0.0, 0.0, 1.0, 0.0, 0.0, 0.0]
+    assert returns['A.NS'].tolist() == pytest.approx([0.0, 0.0, 99.0 / 110.0 - 1.0, 0.0, 0.0, 0.0])
+
+def test_turnover_pays_costs(close):
+    positions = pd.DataFrame(1.0, index=close.index, columns=close.columns)
+    free, _ = simulate(close, positions, cost_bps=0.0, slippage_bps=0.0)
+    costly, _ = simulate(close, positions, cost_bps=10.0, slippage_bps=5.0)
+    friction = (costly - free)['A.NS']
+    # One entry on the day after the first signal, then no turnover
+    assert friction.tolist() == pytest.approx([0.0, -0.0015, 0.0, 0.0, 0.0, 0.0])
+
+def test_no_returns_before_a_symbol_trades(close):
+    positions = pd.DataFrame(1.0, index=close.index, columns=close.columns)
+    returns, _ = simulate(close, positions, cost_bps=0.0, slippage_bps=0.0)
+    assert returns['B.NS'].iloc[:2].tolist() == [0.0, 0.0]
+    portfolio = equal_weight_returns(returns, close)
+    assert portfolio.iloc[1] == pytest.approx(returns['A.NS'].iloc[1])
+    assert portfolio.iloc[3] == pytest.approx(returns.iloc[3].mean())
+
+def test_feature_scores_honour_period_and_fill_missing_symbols(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_store, "load_cached_bars", lambda symbol: None)
+    feature_store._loaded.clear()
+
+    index = pd.bdate_range('2023-01-02', periods=400)
+    rng = np.random.default_rng(0)
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (400, 2)), axis=0)),
+                         index=index, columns=['A.NS', 'B.NS'])
+    volume = pd.DataFrame(rng.integers(1000, 5000, (400, 2)).astype(float), index=index, columns=close.columns)
+    feature_store.update_features('A.NS', pd.DataFrame({'Close': close['A.NS'], 'Volume': volume['A.NS']}))
+    # B.NS has no stored features, only cached bars
+    monkeypatch.setattr(backtest, "load_ohlcv_matrices",
+                        lambda symbols, period: {'Close': close[symbols], 'Volume': volume[symbols]})
+
+    stored_close, scores = backtest.feature_scores(['A.NS', 'B.NS'], period="3mo")
+    assert list(scores.columns) == ['A.NS', 'B.NS']
+    assert stored_close.index[0] > index[-1] - pd.DateOffset(months=3)
+    assert stored_close.index[-1] == index[-1]
+    expected = score_matrix(close, volume).loc[scores.index]
+    np.testing.assert_allclose(scores.to_numpy(), expected.to_numpy())
+
+    _, everything = backtest.feature_scores(['A.NS', 'B.NS'])
+    assert len(everything) == len(index)
+    feature_store._loaded.clear()
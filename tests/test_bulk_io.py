@@ -0,0 +1,72 @@
+import random
+import pytest
+from stock.bulk_io import export_holdings, export_transactions, import_transactions
+from stock.db_manager import DatabaseManager, MEMORY
+
+LEDGER = ("SELECT transaction_id, user_id, stock_ticker, action, quantity, price, transaction_date "
+          "FROM stock_transactions ORDER BY transaction_id")
+HOLDINGS = "SELECT user_id, stock_ticker, shares, cost_basis FROM holdings WHERE shares != 0 ORDER BY user_id, stock_ticker"
+GAINS = "SELECT user_id, stock_ticker, sale_date, quantity, proceeds, cost, pnl FROM realized_gains ORDER BY transaction_id"
+
+def _rows(database, query):
+    return list(database.iter_query(query, row_type="tuple"))
+
+def _assert_same(actual, expected):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got == pytest.approx(want)
+
+@pytest.fixture
+def traded(database, add_user):
+    """The database fixture with two users' random trades"""
+    add_user(2, "second")
+    rng = random.Random(1)
+    for _ in range(200):
+        database.record_transaction(rng.choice([1, 2]), rng.choice(["ABC.NS", "XYZ.NS"]),
+                                    rng.choice(["buy", "buy", "sell"]), rng.randint(1, 20),
+                                    round(rng.uniform(10, 500), 2))
+    return database
+
+@pytest.fixture
+def empty():
+    """Another in-memory database with the same two users and no trades"""
+    database = DatabaseManager(MEMORY).init()
+    database.connections.write(lambda connection: connection.executemany(
+        "INSERT INTO user (user_id, username, password, total_assets) VALUES (?, ?, ?, ?)",
+        [(1, "first", "", 100000.0), (2, "second", "", 100000.0)]))
+    yield database
+    database.close()
+
+def test_ledger_export_imports_back_unchanged(traded, empty, tmp_path):
+    path = str(tmp_path / "ledger.csv")
+    assert export_transactions(path, database=traded, batch_size=64) == 200
+    assert import_transactions(path, user_id=None, database=empty, batch_size=64) == 200
+
+    assert _rows(empty, LEDGER) == _rows(traded, LEDGER)
+    _assert_same(_rows(empty, HOLDINGS), _rows(traded, HOLDINGS))
+    _assert_same(_rows(empty, GAINS), _rows(traded, GAINS))
+    for user_id in (1, 2):
+        assert empty.get_realized_pnl(user_id) == pytest.approx(traded.get_realized_pnl(user_id))
+
+def test_one_users_export_imports_into_another_user(traded, empty, tmp_path):
+    path = str(tmp_path / "user1.csv")
+    count = export_transactions(path, user_id=1, database=traded)
+    assert import_transactions(path, user_id=2, database=empty) == count
+
+    source = [row[2:] for row in _rows(traded, LEDGER) if row[1] == 1]
+    assert [row[2:] for row in _rows(empty, LEDGER)] == source
+    assert {row[1] for row in _rows(empty, LEDGER)} == {2}
+    _assert_same([row[1:] for row in _rows(empty, HOLDINGS)],
+                 [row[1:] for row in _rows(traded, HOLDINGS) if row[0] == 1])
+
+def test_holdings_export(traded, tmp_path):
+    path = tmp_path / "holdings.csv"
+    assert export_holdings(str(path), database=traded) == len(_rows(traded, HOLDINGS))
+    assert path.read_text().splitlines()[0] == "user_id,stock_ticker,shares,cost_basis"
+
+def test_unrecognized_file_leaves_the_ledger_alone(empty, tmp_path):
+    path = tmp_path / "unknown.csv"
+    path.write_text("when,what\n2024-01-01,ABC\n")
+    with pytest.raises(ValueError):
+        import_transactions(str(path), database=empty)
+    assert _rows(empty, LEDGER) == []
@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+class Abort(Exception):
+    pass
+
+def test_transaction_rolls_back_on_error(database):
+    assert database.get_user_balance(1) == 100000.0   # now cached
+    with pytest.raises(Abort):
+        with database.transaction():
+            assert database.record_transaction(1, "ABC.NS", "buy", 10, 50.0)
+            database.update_user_balance(1, 99500.0)
+            # The transaction sees its own writes
+            assert database.get_user_balance(1) == 99500.0
+            assert database.get_user_holdings(1)
+            raise Abort()
+
+    assert database.get_user_balance(1) == 100000.0
+    assert database.get_user_transactions(1) == []
+    assert database.get_user_holdings(1) == []
+    assert database.get_open_lots(1) == []
+
+def test_transaction_commits_once(database):
+    with database.transaction():
+        database.record_transaction(1, "ABC.NS", "buy", 10, 50.0)
+        database.update_user_balance(1, 99500.0)
+    assert database.get_user_balance(1) == 99500.0
+    assert len(database.get_user_transactions(1)) == 1
+
+def test_nested_transaction_rolls_back_with_the_outer_one(database):
+    with pytest.raises(Abort):
+        with database.transaction():
+            with database.transaction():
+                database.update_user_balance(1, 1.0)
+            raise Abort()
+    assert database.get_user_balance(1) == 100000.0
+
+def _balance_read(database):
+    # Straight from a read connection, past the user cache
+    return database.connections.read(
+        lambda connection: connection.execute("SELECT total_assets FROM user WHERE user_id = 1").fetchone()[0])
+
+@pytest.mark.parametrize("commit", [True, False])
+def test_readers_during_a_write_never_see_it_uncommitted(database, commit):
+    writing, finish = threading.Event(), threading.Event()
+
+    def write():
+        with database.transaction():
+            database.update_user_balance(1, 5.0)
+            database.record_transaction(1, "ABC.NS", "buy", 1, 5.0)
+            writing.set()
+            finish.wait(5)
+            if not commit:
+                raise Abort()
+
+    with ThreadPoolExecutor(5) as pool:
+        writer = pool.submit(write)
+        assert writing.wait(5)
+        readers = [pool.submit(_balance_read, database) for _ in range(4)]
+        time.sleep(0.1)
+        finish.set()
+        if not commit:
+            with pytest.raises(Abort):
+                writer.result()
+        balances = {reader.result() for reader in readers}
+
+    # Each reader saw either the state before or after, never a half
+    assert balances <= {100000.0, 5.0 if commit else 100000.0}
+    assert database.get_user_balance(1) == (5.0 if commit else 100000.0)
+    assert len(database.get_user_transactions(1)) == (1 if commit else 0)
+
+def test_writes_from_many_threads_are_serialized(database):
+    def buy(i):
+        # Read-modify-write: interleaved transactions would lose updates
+        with database.transaction():
+            balance = database.get_user_balance(1)
+            database.record_transaction(1, f"T{i % 4}.NS", "buy", 1, 10.0)
+            database.update_user_balance(1, balance - 10.0)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(buy, range(40)))
+
+    assert database.get_user_balance(1) == 100000.0 - 400.0
+    assert len(database.get_user_transactions(1)) == 40
+    assert sorted((h['stock_ticker'], h['shares']) for h in database.get_user_holdings(1)) == [
+        (f"T{i}.NS", 10) for i in range(4)]
+
+def test_failed_transaction_on_another_thread_rolls_back(database):
+    def fail():
+        with database.transaction():
+            database.update_user_balance(1, 0.0)
+            database.record_transaction(1, "ABC.NS", "buy", 10, 50.0)
+            raise Abort()
+
+    with ThreadPoolExecutor(1) as pool:
+        with pytest.raises(Abort):
+            pool.submit(fail).result()
+
+    assert not database.connections.in_transaction()
+    assert _balance_read(database) == 100000.0
+    assert database.get_user_balance(1) == 100000.0
+    assert database.get_user_holdings(1) == []
+    # The writer is free again for the next transaction
+    with database.transaction():
+        database.update_user_balance(1, 1.0)
+    assert database.get_user_balance(1) == 1.0
+
+def _insert_ledger(database, rows):
+    database.connections.write(lambda connection: connection.executemany(
+        "INSERT INTO stock_transactions (user_id, stock_ticker, action, quantity, price, transaction_date) "
+        "VALUES (?, ?, ?, ?, ?, ?)", rows))
+
+def _all_pages(database, user_id, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = database.get_transactions_page(user_id, limit, before=cursor)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 12, 13, 50])
+def test_transactions_pages_cover_the_history_once(database, add_user, limit):
+    add_user(2, "other")
+    # Several trades share a timestamp, so the id must break the ties
+    dates = ["2024-01-01 10:00:00"] * 5 + ["2024-01-02 10:00:00"] * 4 + ["2024-01-03 09:00:00"] * 3
+    _insert_ledger(database, [(1, "ABC.NS", "buy", i + 1, 10.0, date) for i, date in enumerate(dates)])
+    _insert_ledger(database, [(2, "ABC.NS", "buy", 1, 10.0, date) for date in dates])
+
+    pages = _all_pages(database, 1, limit)
+    ids = [row.transaction_id for page in pages for row in page]
+    expected = [row['transaction_id'] for row in database.get_user_transactions(1)]
+    assert ids == expected
+    assert len(expected) == len(dates)
+    assert all(len(page) == limit for page in pages[:-1])
+    assert len(pages[-1]) <= limit
+    assert {row.user_id for page in pages for row in page} == {1}
+
+def test_transactions_page_cursor_at_the_end(database):
+    _insert_ledger(database, [(1, "ABC.NS", "buy", 1, 10.0, "2024-01-01 10:00:00")] * 4)
+    rows, cursor = database.get_transactions_page(1, 4)
+    assert len(rows) == 4
+    assert cursor == (rows[-1].transaction_date, rows[-1].transaction_id)
+    # A full last page only learns it was the last on the next, empty one
+    assert database.get_transactions_page(1, 4, before=cursor) == ([], None)
+
+    rows, cursor = database.get_transactions_page(1, 5)
+    assert len(rows) == 4 and cursor is None
+
+def test_transactions_page_of_an_empty_history(database):
+    assert database.get_transactions_page(1, 10) == ([], None)
@@ -0,0 +1,75 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from stock import feature_store
+from stock.feature_store import FEATURE_COLUMNS, compute_features, update_features
+
+SYMBOL = "TEST.NS"
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    """Keep the store in a temporary directory, with no cached bars"""
+    monkeypatch.setattr(feature_store, "FEATURE_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_store, "load_cached_bars", lambda symbol: None)
+    feature_store._loaded.clear()
+    yield tmp_path
+    feature_store._loaded.clear()
+
+def _bars(count, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2022-01-03', periods=count)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    volume = rng.integers(1000, 5000, count).astype(float)
+    return pd.DataFrame({'Close': close, 'Volume': volume}, index=index)
+
+def _expected(bars):
+    return compute_features(bars['Close'], bars['Volume'])
+
+def _version(store):
+    with open(store / f"{SYMBOL}.json") as f:
+        return json.load(f)['version']
+
+def _assert_matches(stored, bars):
+    expected = _expected(bars)
+    assert list(stored.index) == list(expected.index)
+    np.testing.assert_allclose(np.asarray(stored), expected[FEATURE_COLUMNS].to_numpy(), rtol=1e-9)
+
+def test_unchanged_bars_are_not_rewritten(store):
+    bars = _bars(300)
+    update_features(SYMBOL, bars)
+    version = _version(store)
+    _assert_matches(update_features(SYMBOL, bars.iloc[-22:]), bars)
+    assert _version(store) == version
+
+def test_forming_bar_is_recomputed(store):
+    bars = _bars(300)
+    update_features(SYMBOL, bars)
+    # The last bar moved during the session: no new date, new close and volume
+    bars.iloc[-1] = [bars['Close'].iloc[-1] * 1.03, bars['Volume'].iloc[-1] * 2]
+    _assert_matches(update_features(SYMBOL, bars.iloc[-22:]), bars)
+
+def test_new_bars_after_a_revised_one(store):
+    full = _bars(305)
+    update_features(SYMBOL, full.iloc[:300])
+    full.iloc[299, 0] *= 0.98
+    _assert_matches(update_features(SYMBOL, full.iloc[-22:]), full)
+
+def test_adjusted_history_is_rebuilt(store):
+    bars = _bars(300)
+    update_features(SYMBOL, bars)
+    adjusted = bars.copy()
+    adjusted.loc[adjusted.index[-22:], 'Close'] *= 0.5
+    stored = update_features(SYMBOL, adjusted.iloc[-22:])
+    # Every overlapping close disagrees: rebuilt over the older stored
+    # closes followed by the new bars
+    _assert_matches(stored, adjusted)
+
+def test_older_bars_leave_the_store_alone(store):
+    bars = _bars(300)
+    update_features(SYMBOL, bars)
+    version = _version(store)
+    older = bars.iloc[:250].copy()
+    older.iloc[-1, 0] *= 1.1
+    _assert_matches(update_features(SYMBOL, older), bars)
+    assert _version(store) == version
@@ -0,0 +1,72 @@
+import random
+import pytest
+
+def _random_trades(count, seed=0):
+    """Buys and sells over a few positions, some selling more than is held"""
+    rng = random.Random(seed)
+    return [(rng.choice([1, 2]), rng.choice(["ABC.NS", "XYZ.NS", "PQR.BO"]),
+             rng.choice(["buy", "buy", "sell"]), rng.randint(1, 40), round(rng.uniform(50, 150), 2))
+            for _ in range(count)]
+
+def _state(database):
+    """Holdings, open lots, realized gains and profit_loss, without surrogate keys"""
+    queries = {
+        'holdings': "SELECT user_id, stock_ticker, shares, cost_basis FROM holdings "
+                    "WHERE shares != 0 OR cost_basis != 0 ORDER BY user_id, stock_ticker",
+        'lots': "SELECT user_id, stock_ticker, transaction_id, acquired_date, quantity, remaining, price "
+                "FROM lots ORDER BY transaction_id",
+        'gains': "SELECT user_id, stock_ticker, transaction_id, sale_date, quantity, proceeds, cost, pnl "
+                 "FROM realized_gains ORDER BY transaction_id",
+        'profit_loss': "SELECT user_id, profit_loss FROM user ORDER BY user_id",
+    }
+    return {name: list(database.iter_query(query, row_type="tuple")) for name, query in queries.items()}
+
+def _assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        assert len(actual[name]) == len(expected[name]), name
+        for got, want in zip(actual[name], expected[name]):
+            assert got == pytest.approx(want), name
+
+@pytest.mark.parametrize("database", ["fifo", "average"], indirect=True)
+def test_rebuild_matches_incremental_trades(database, add_user):
+    add_user(2, "second")
+    for trade in _random_trades(300):
+        assert database.record_transaction(*trade)
+    incremental = _state(database)
+    assert incremental['gains'], "the trades should realize some P&L"
+
+    assert database.rebuild_holdings()
+    _assert_same(_state(database), incremental)
+    # Rebuilding one user leaves the other alone and changes nothing
+    assert database.rebuild_holdings(2)
+    _assert_same(_state(database), incremental)
+
+def test_fifo_sale_closes_the_oldest_lots(database):
+    database.record_transaction(1, "ABC.NS", "buy", 10, 100.0)
+    database.record_transaction(1, "ABC.NS", "buy", 10, 200.0)
+    database.record_transaction(1, "ABC.NS", "sell", 15, 300.0)
+
+    gain = database.get_realized_gains(1)[0]
+    assert gain['quantity'] == 15
+    assert gain['cost'] == pytest.approx(10 * 100.0 + 5 * 200.0)
+    assert gain['pnl'] == pytest.approx(15 * 300.0 - 2000.0)
+    assert [lot['remaining'] for lot in database.get_open_lots(1)] == [5]
+    holding = database.get_user_holdings(1)[0]
+    assert holding['shares'] == 5 and holding['cost_basis'] == pytest.approx(1000.0)
+
+@pytest.mark.parametrize("database", ["average"], indirect=True)
+def test_average_cost_sale(database):
+    database.record_transaction(1, "ABC.NS", "buy", 10, 100.0)
+    database.record_transaction(1, "ABC.NS", "buy", 10, 200.0)
+    database.record_transaction(1, "ABC.NS", "sell", 15, 300.0)
+    gain = database.get_realized_gains(1)[0]
+    assert gain['cost'] == pytest.approx(15 * 150.0)
+    assert database.get_user_holdings(1)[0]['cost_basis'] == pytest.approx(5 * 150.0)
+
+def test_selling_more_than_held_books_only_the_known_lots(database):
+    database.record_transaction(1, "ABC.NS", "buy", 5, 100.0)
+    database.record_transaction(1, "ABC.NS", "sell", 8, 120.0)
+    gain = database.get_realized_gains(1)[0]
+    assert gain['quantity'] == 5 and gain['pnl'] == pytest.approx(100.0)
+    assert database.get_open_lots(1) == []
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+from stock import portfolio_history
+from stock.portfolio_history import HISTORY_COLUMNS, compute_nav, load_history, update_history
+
+DAYS = pd.bdate_range('2024-01-01', '2024-01-05')
+CLOSES = [95.0, 101.0, 110.0, 118.0, 125.0]
+
+# Buy 10 at 100 on the 2nd, sell 4 at 120 on the 4th
+EXPECTED = pd.DataFrame({
+    'cash': [100000.0, 99000.0, 99000.0, 99480.0, 99480.0],
+    'market_value': [0.0, 1010.0, 1100.0, 708.0, 750.0],
+    'nav': [100000.0, 100010.0, 100100.0, 100188.0, 100230.0],
+}, index=DAYS)
+
+@pytest.fixture
+def traded(database, monkeypatch):
+    """The database fixture after the two trades, over known closes"""
+    close = pd.DataFrame({'ABC.NS': CLOSES}, index=DAYS)
+    monkeypatch.setattr(portfolio_history, "load_ohlcv_matrices",
+                        lambda symbols, period=None: {'Close': close.reindex(columns=symbols)})
+    for action, quantity, price, date in (("buy", 10, 100.0, "2024-01-02 10:00:00"),
+                                          ("sell", 4, 120.0, "2024-01-04 11:00:00")):
+        database.record_transaction(1, "ABC.NS", action, quantity, price)
+        database.execute_query("UPDATE stock_transactions SET transaction_date = ? "
+                               "WHERE transaction_id = (SELECT MAX(transaction_id) FROM stock_transactions)",
+                               (date,))
+    database.update_user_balance(1, 100000.0 - 10 * 100.0 + 4 * 120.0)
+    return database
+
+def _stored(database):
+    return load_history(1, update=False, database=database)
+
+def test_nav_of_a_buy_and_a_partial_sell(traded):
+    nav = compute_nav(1, start='2024-01-01', end='2024-01-05', database=traded)
+    pd.testing.assert_frame_equal(nav[list(HISTORY_COLUMNS)], EXPECTED, check_freq=False, check_names=False)
+
+def test_update_history_only_recomputes_from_the_last_stored_day(traded, monkeypatch):
+    update_history(1, database=traded)
+    stored = _stored(traded)
+    assert stored.index[0] == DAYS[1]
+    pd.testing.assert_frame_equal(stored.loc[DAYS[1]:DAYS[-1]], EXPECTED.iloc[1:], check_freq=False, check_names=False)
+    # Later days hold the last close
+    assert (stored['nav'].iloc[len(DAYS) - 1:] == EXPECTED['nav'].iloc[-1]).all()
+
+    # Stored up to the 4th, with the 3rd marked to tell a recompute apart
+    traded.execute_query("DELETE FROM portfolio_daily WHERE date > '2024-01-04'")
+    traded.execute_query("UPDATE portfolio_daily SET nav = -1 WHERE date = '2024-01-03'")
+    traded.execute_query("UPDATE portfolio_daily SET nav = -1 WHERE date = '2024-01-04'")
+    starts = []
+    compute = portfolio_history.compute_nav
+    monkeypatch.setattr(portfolio_history, "compute_nav",
+                        lambda user_id, start=None, **kwargs: starts.append(start) or compute(user_id, start, **kwargs))
+
+    count = update_history(1, database=traded)
+    assert starts == ['2024-01-04']
+    assert count == len(stored) - 2
+    again = _stored(traded)
+    assert again.loc['2024-01-03', 'nav'] == -1
+    pd.testing.assert_frame_equal(again.loc[DAYS[3]:DAYS[-1]], EXPECTED.iloc[3:], check_freq=False, check_names=False)
+    pd.testing.assert_frame_equal(again, stored.assign(nav=stored['nav'].where(stored.index != DAYS[2], -1)))
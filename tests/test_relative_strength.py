@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from stock import feature_store, relative_strength
+from stock.relative_strength import basket_performance
+
+SYMBOLS = ["AAA.NS", "BBB.NS"]
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    """Keep the store in a temporary directory, with no cached bars"""
+    monkeypatch.setattr(feature_store, "FEATURE_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_store, "load_cached_bars", lambda symbol: None)
+    monkeypatch.setattr(feature_store, "_loaded", {})
+
+def _bars(closes):
+    index = pd.bdate_range('2024-01-01', periods=len(closes))
+    return pd.DataFrame({'Close': closes, 'Volume': 1000.0}, index=index)
+
+def test_refresh_picks_up_the_latest_bar(monkeypatch):
+    closes = {symbol: list(100.0 + np.arange(30)) for symbol in SYMBOLS}
+    for symbol in SYMBOLS:
+        feature_store.update_features(symbol, _bars(closes[symbol]))
+    stored = basket_performance(SYMBOLS)
+    assert stored[1] == pytest.approx(129 / 128 - 1)
+
+    # The quote fetch writes today's bar to the store, as fetch_stock_data does
+    fetched = []
+    def fetch(symbol):
+        fetched.append(symbol)
+        feature_store.update_features(symbol, _bars(closes[symbol] + [141.9]))
+    monkeypatch.setattr(relative_strength, "fetch_stock_data", fetch)
+
+    assert basket_performance(SYMBOLS) == stored
+    assert basket_performance(SYMBOLS, refresh=True)[1] == pytest.approx(141.9 / 129 - 1)
+    assert fetched == SYMBOLS
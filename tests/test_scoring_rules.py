@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from stock.scoring_rules import compile_expression, load_profile
+
+UNSAFE_EXPRESSIONS = [
+    "__import__('os').system('echo hi')",
+    "close.__class__",
+    "(lambda: 1)()",
+    "close[0]",
+    "open('portfolio.db')",
+    "abs(close, key=1)",
+    "[close for close in range(3)]",
+    "'text'",
+    "close if rsi < 30 else 0",
+    "close ** 2",
+    "rsi in (1, 2)",
+    "close = 1",
+]
+
+@pytest.mark.parametrize("text", UNSAFE_EXPRESSIONS)
+def test_compile_expression_rejects_unsafe_input(text):
+    with pytest.raises(ValueError):
+        compile_expression(text)
+
+@pytest.mark.parametrize("text", UNSAFE_EXPRESSIONS)
+def test_load_profile_rejects_unsafe_rules(text):
+    with pytest.raises(ValueError):
+        load_profile({'name': 'unsafe', 'rules': [{'when': text, 'score': '1'}]})
+    with pytest.raises(ValueError):
+        load_profile({'name': 'unsafe', 'rules': [{'when': 'rsi < 30', 'score': text}]})
+
+def test_compile_expression_evaluates_allowed_elements():
+    func, names = compile_expression("close > max(sma_20, 10) and not rsi >= 70")
+    assert names == {'close', 'sma_20', 'rsi'}
+    env = {'close': np.array([5.0, 12.0, 30.0]), 'sma_20': np.array([4.0, 11.0, 20.0]),
+           'rsi': np.array([50.0, 40.0, 80.0])}
+    assert func(env).tolist() == [False, True, False]
+
+def test_unknown_name_is_rejected_when_scored():
+    profile = load_profile({'name': 'typo', 'rules': ["clsoe > 1 -> 1"]})
+    close = pd.DataFrame({'A.NS': np.linspace(100, 120, 30)},
+                         index=pd.bdate_range('2024-01-01', periods=30))
+    with pytest.raises(ValueError, match="clsoe"):
+        profile.score(close)
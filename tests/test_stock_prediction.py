@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+from stock import stock_prediction
+from stock.stock_prediction import SCORING_PARAMS, predict_stock, score_history, score_matrix
+
+def _payload(volumes):
+    """A fetch_stock_data payload whose prices fire none of the price rules"""
+    dates = pd.bdate_range('2024-01-01', periods=len(volumes))
+    closes = [100.0 + (i % 2) * 0.5 for i in range(len(volumes))]
+    return {
+        'symbol': 'TEST.NS', 'price': closes[-1], 'currency': '₹',
+        'historical_prices': closes, 'historical_dates': [str(d) for d in dates],
+        'sma_20': None, 'sma_50': None, 'sma_200': None, 'rsi': 50.0, 'volume': int(volumes[-1]),
+        'ohlc_data': {'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+                      'Volume': volumes, 'index': [str(d) for d in dates]},
+    }
+
+@pytest.fixture
+def payload(monkeypatch):
+    """Serve predict_stock a given payload instead of fetching one"""
+    def serve(volumes):
+        data = _payload(volumes)
+        monkeypatch.setattr(stock_prediction, "fetch_stock_data", lambda symbol: data)
+        return data
+    return serve
+
+def test_volume_spike_counts_as_bullish(payload):
+    data = payload([1000.0] * 29 + [5000.0])
+    result = predict_stock('TEST.NS')
+    assert result['score'] == pytest.approx(SCORING_PARAMS['volume_weight'])
+    assert result['prediction'] == "Buy"
+
+    # The backtester's vectorized rules agree on the same bars
+    ohlc = data['ohlc_data']
+    scores = score_matrix(pd.Series(ohlc['Close']), pd.Series(ohlc['Volume']))
+    assert scores.iloc[-1] == pytest.approx(result['score'])
+
+def test_ordinary_volume_scores_nothing(payload):
+    payload([1000.0] * 30)
+    result = predict_stock('TEST.NS')
+    assert result['score'] == 0
+    assert result['prediction'] == "Hold"
+
+def test_short_volume_history_scores_nothing(payload):
+    payload([1000.0] * 9 + [5000.0])
+    assert predict_stock('TEST.NS')['score'] == 0
+
+def test_score_history_on_chart_dates_missing_from_the_cache(monkeypatch):
+    index = pd.bdate_range('2024-01-01', periods=60)
+    closes = pd.Series([100.0 + (i % 7) for i in range(60)], index=index)
+    # The cache has a gap, and the chart also shows bars fetched after it
+    cached = pd.DataFrame({'Close': closes, 'Volume': 1000.0}, index=index).drop(index[40:43])
+    monkeypatch.setattr(stock_prediction, "load_cached_bars", lambda symbol: cached)
+    monkeypatch.setattr(stock_prediction, "_history_cache", {})
+
+    chart_dates = [str(d) for d in index[30:]] + ['2024-03-25 00:00:00+05:30', '2024-03-26 00:00:00+05:30']
+    history = score_history('TEST.NS', dates=chart_dates)
+    assert len(history) == len(chart_dates)
+    missing = [10, 11, 12, len(chart_dates) - 2, len(chart_dates) - 1]
+    assert all(history['prediction'].iloc[i] is None for i in missing)
+    assert history['score'].iloc[missing].isna().all()
+    present = history.drop(history.index[missing])
+    assert all(isinstance(label, str) for label in present['prediction'])
+
+@pytest.fixture
+def stored_uptrend(tmp_path, monkeypatch):
+    """A stored long uptrend and a 1mo payload of its last bars
+
+    SMA50 above SMA200 only shows in the stored history.
+    """
+    from stock import feature_store
+    monkeypatch.setattr(feature_store, "FEATURE_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_store, "_loaded", {})
+
+    index = pd.bdate_range('2023-01-02', periods=300)
+    closes = [100.0 * 1.002 ** i + (i % 3) for i in range(300)]
+    bars = pd.DataFrame({'Close': closes, 'Volume': 1000.0}, index=index)
+    feature_store.update_features('TEST.NS', bars)
+
+    data = _payload([1000.0] * 22)
+    data.update(price=closes[-1], historical_prices=closes[-22:],
+                historical_dates=[str(d) for d in index[-22:]])
+    monkeypatch.setattr(stock_prediction, "fetch_stock_data", lambda symbol: data)
+    return data
+
+def test_screener_and_predict_stock_score_the_same_stored_row(stored_uptrend, monkeypatch):
+    from stock import screener
+    monkeypatch.setattr(screener, "latest_relative_strength", lambda symbols: pd.DataFrame(dtype=float))
+
+    result = predict_stock('TEST.NS')
+    row = screener.build_snapshot(['TEST.NS']).query(top=1)[0]
+    assert row['score'] == pytest.approx(result['score'])
+    assert row['prediction'] == result['prediction']
+    assert result['score'] >= SCORING_PARAMS['ma_weight']
+
+def test_confidence_matches_combinations_only_on_the_stored_row(stored_uptrend, monkeypatch):
+    from stock import calibration
+    stats = {'hit_rate': 0.6, 'avg_return': 0.01, 'samples': 100}
+    table = {'horizon': 5, 'classes': {},
+             'buckets': {'all': {label: stats for label in ("Buy", "Hold", "Strong Buy")}},
+             'combinations': {'all': {key: stats for key in ("ma_cross+", "none")}}}
+    monkeypatch.setattr(calibration, "load_table", lambda: table)
+
+    assert predict_stock('TEST.NS')['confidence']['basis'] == 'combination'
+
+    # One more bar than the store holds: the row comes from the payload
+    stored_uptrend['historical_dates'][-1] = '2024-03-01 00:00:00'
+    assert predict_stock('TEST.NS')['confidence']['basis'] == 'bucket'